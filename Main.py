@@ -1,5 +1,5 @@
 import streamlit as st
-from finance.db import init_db, get_or_create_settings
+from finance.db import get_or_create_settings
 from finance.auth import require_login
 
 # Streamlit page config
@@ -13,8 +13,7 @@ st.set_page_config(
 require_login()
 
 
-# Init DB / settings
-init_db()
+# Init settings (require_login already ran init_db)
 settings = get_or_create_settings()
 
 st.title("💶 The Bakwenye's Family Finance Dashboard")
@@ -0,0 +1,183 @@
+"""
+Meal-plan batch benchmark against a local fake OpenAI server.
+
+A stdlib HTTP server answers POST /v1/chat/completions with a valid 7-day plan,
+streamed over --latency seconds (optionally failing a share of requests with a
+500 to exercise the retries, or sending a share of days without fruit to
+exercise the per-day re-requests). The same batch of --weeks plans is generated one at a
+time (concurrency 1) and concurrently; with enough concurrency the batch
+should take about one request's latency.
+
+    python -m benchmarks.bench_meals
+    python -m benchmarks.bench_meals --weeks 8 --latency 0.5 --fail-rate 0.3 --json meals.json
+    python -m benchmarks.bench_meals --bad-day-rate 0.15
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from finance.meals import DAYS, MAX_CONCURRENCY, MEALS, PlanRequest, build_prompt, generate_plans_sync, week_starts
+
+
+def fake_day(day: str) -> dict:
+    meals = {
+        meal: {"name": "Oats", "key_ingredients": ["oats", "milk"], "fruit_included": ["apple"], "prep_time_minutes": 10}
+        for meal in MEALS
+    }
+    return {"day": day, **meals, "nutrition_notes": []}
+
+
+def fake_plan(week_start: str) -> dict:
+    return {"week_start": week_start, "days": [fake_day(d) for d in DAYS], "overall_tips": ["Drink water."]}
+
+
+def fake_server(latency: float, fail_rate: float = 0.0, bad_day_rate: float = 0.0, seed: int = 0) -> ThreadingHTTPServer:
+    """
+    Started server on a free localhost port; .shutdown() when done. Weeks are
+    streamed (SSE) over `latency` seconds when asked to; a single re-requested
+    day takes a seventh of that. `bad_day_rate` drops the fruit from that
+    share of streamed days.
+    """
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    def chance(rate: float) -> bool:
+        with lock:
+            return rng.random() < rate
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            prompt = body["messages"][-1]["content"]
+            day = re.search(r"Return ONLY the JSON object for (\w+)", prompt)
+            if day:
+                time.sleep(latency / len(DAYS))
+                content = json.dumps(fake_day(day.group(1)))
+            else:
+                plan = fake_plan(prompt.split('"week_start": "')[1][:10])
+                for d in plan["days"]:
+                    if chance(bad_day_rate):
+                        for meal in MEALS:
+                            d[meal]["fruit_included"] = []
+                content = json.dumps(plan)
+            usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4}
+            usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+            if chance(fail_rate):
+                time.sleep(latency)
+                self._send(500, {"error": {"message": "injected failure", "type": "server_error"}})
+            elif body.get("stream") and not day:
+                try:
+                    self._stream(body["model"], content, usage if body.get("stream_options", {}).get("include_usage") else None)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client timed out mid-stream
+            else:
+                time.sleep(0 if day else latency)
+                self._send(200, {
+                    "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()),
+                    "model": body["model"],
+                    "choices": [{
+                        "index": 0, "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": content},
+                    }],
+                    "usage": usage,
+                })
+
+        def _stream(self, model: str, content: str, usage: dict | None, pieces: int = 50):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            size = -(-len(content) // pieces)
+            for i in range(0, len(content), size):
+                time.sleep(latency / pieces)
+                chunk = {
+                    "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": content[i:i + size]}, "finish_reason": None}],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+            if usage is not None:
+                chunk = {
+                    "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                    "model": model, "choices": [], "usage": usage,
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.write(b"data: [DONE]\n\n")
+
+        def _send(self, status: int, payload: dict):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_batch(requests, base_url: str, concurrency: int, backoff: float) -> dict:
+    t0 = time.perf_counter()
+    results = generate_plans_sync(
+        requests, "fake-model", api_key="test", base_url=base_url,
+        concurrency=concurrency, timeout=30, backoff=backoff, use_cache=False,
+    )
+    return {
+        "concurrency": concurrency,
+        "seconds": round(time.perf_counter() - t0, 3),
+        "ok": sum(r.ok for r in results),
+        "attempts": sum(r.attempts for r in results),
+        "days_redone": sum(len(r.redone) for r in results),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--weeks", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=1.0, help="seconds per fake completion")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of requests answered with a 500")
+    parser.add_argument("--bad-day-rate", type=float, default=0.0, help="share of streamed days sent without fruit")
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENCY)
+    parser.add_argument("--backoff", type=float, default=0.1)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args(argv)
+
+    requests = [
+        PlanRequest(week, build_prompt(4, "Mediterranean", "", "Normal (20–40 min)", "Medium", "", week))
+        for week in week_starts(date.today(), args.weeks)
+    ]
+    import openai  # noqa: F401  (keep the one-off import out of the first timing)
+
+    server = fake_server(args.latency, args.fail_rate, args.bad_day_rate)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    try:
+        rows = [run_batch(requests, base_url, c, args.backoff) for c in (1, args.concurrency)]
+    finally:
+        server.shutdown()
+
+    print(
+        f"{args.weeks} plans, {args.latency:.2f}s per week, fail rate {args.fail_rate:.0%}, "
+        f"bad day rate {args.bad_day_rate:.0%}"
+    )
+    print(f"{'concurrency':>11} {'seconds':>8} {'ok':>4} {'attempts':>8} {'days redone':>11}")
+    for r in rows:
+        print(f"{r['concurrency']:>11} {r['seconds']:>8.2f} {r['ok']:>4} {r['attempts']:>8} {r['days_redone']:>11}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "weeks": args.weeks, "latency": args.latency, "fail_rate": args.fail_rate,
+                "bad_day_rate": args.bad_day_rate, "runs": rows,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
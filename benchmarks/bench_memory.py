@@ -0,0 +1,130 @@
+"""
+Per-session memory benchmark.
+
+Seeds a local database with a synthetic household, then keeps --sessions
+AppTest sessions of the Dashboard, Forecast and Weekly Plan pages alive at the
+same time and records traced Python memory after each one. The first session
+pays for the process-wide store of memoized frames (finance.cache); every
+further session should only add its own widget state and element tree. Each
+mode runs in its own interpreter:
+  - frozen: memoized frames as stored by the app (text columns as Arrow strings)
+  - objects: the same with finance.cache.freeze disabled (plain object columns)
+
+    python -m benchmarks.bench_memory
+    python -m benchmarks.bench_memory --scenario 20:100 --sessions 10 --json memory.json
+"""
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PAGES = ["pages/2_Dashboard.py", "pages/3_Forecast.py", "pages/6_Weekly_Plan.py"]
+MODES = ["objects", "frozen"]
+
+
+def _traced_mb() -> float:
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0] / 2**20
+
+
+def run_sessions(years: int, n_categories: int, url: str, sessions: int, mode: str) -> dict:
+    """Seed `url` and open the sessions; runs inside the worker interpreter."""
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    os.environ["FINANCE_DATABASE_URL"] = url
+
+    from streamlit.testing.v1 import AppTest
+
+    from benchmarks.synthetic import seed_database
+    from finance import cache
+    from finance.context import get_context
+
+    if mode == "objects":
+        cache.freeze = lambda value: value
+    counts = seed_database(get_context().storage, years, n_categories)
+
+    tracemalloc.start()
+    start = _traced_mb()
+    alive, after = [], []
+    for _ in range(sessions):
+        for page in PAGES:
+            at = AppTest.from_file(page, default_timeout=600)
+            at.session_state["auth_ok"] = True
+            at.session_state["user_email"] = "bench@example.com"
+            at.run()
+            if at.exception:
+                raise RuntimeError(at.exception[0].value)
+            alive.append(at)
+        after.append(_traced_mb())
+    tracemalloc.stop()
+
+    frames = get_context().cache.memory_usage()
+    steps = [b - a for a, b in zip(after, after[1:])]
+    return {
+        "mode": mode,
+        "years": years,
+        "categories": n_categories,
+        "lines": counts["lines"],
+        "sessions": sessions,
+        "store_mb": round(sum(frames.values()) / 2**20, 2),
+        "frames_mb": {name: round(n / 2**20, 3) for name, n in sorted(frames.items(), key=lambda kv: -kv[1])},
+        "first_session_mb": round(after[0] - start, 2),
+        "per_session_mb": round(sum(steps) / len(steps), 2) if steps else None,
+        "total_mb": round(after[-1] - start, 2),
+    }
+
+
+def _spawn(years: int, n_categories: int, sessions: int, mode: str) -> dict:
+    tmp = tempfile.mkdtemp(prefix="finance-bench-")
+    url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    code = (
+        "import json, sys; sys.path.insert(0, %r)\n"
+        "from benchmarks.bench_memory import run_sessions\n"
+        "print('RESULT' + json.dumps(run_sessions(%d, %d, %r, %d, %r)))\n"
+    ) % (ROOT, years, n_categories, url, sessions, mode)
+    proc = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+    out = [line for line in proc.stdout.splitlines() if line.startswith("RESULT")]
+    if proc.returncode or not out:
+        raise RuntimeError(f"{mode} {years}y/{n_categories}c failed:\n{proc.stderr[-3000:]}")
+    return json.loads(out[-1][len("RESULT"):])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", default="20:100", metavar="YEARS:CATEGORIES")
+    parser.add_argument("--sessions", type=int, default=8, help="sessions kept open at the same time")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args(argv)
+    years, cats = (int(x) for x in args.scenario.split(":"))
+
+    results = [_spawn(years, cats, args.sessions, mode) for mode in MODES]
+    print(f"{years} years, {cats} categories, {results[0]['lines']} lines, {args.sessions} sessions (traced MB)")
+    print(f"{'mode':<8}{'store':>8}{'first session':>15}{'per session':>13}{'total':>8}")
+    for r in results:
+        print(
+            f"{r['mode']:<8}{r['store_mb']:>8.1f}{r['first_session_mb']:>15.1f}"
+            f"{r['per_session_mb'] or 0:>13.2f}{r['total_mb']:>8.1f}"
+        )
+    print("\nlargest frames in the store (MB, objects -> frozen)")
+    frozen = results[-1]["frames_mb"]
+    for name, mb in list(results[0]["frames_mb"].items())[:8]:
+        print(f"  {name:<40}{mb:>8.2f}{frozen.get(name, 0):>8.2f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "python": sys.version.split()[0],
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "results": results,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Micro-benchmarks for the pure finance.metrics and finance.analytics functions.
+
+    python -m benchmarks.bench_metrics                 # default sizes
+    python -m benchmarks.bench_metrics --json out.json # machine-readable
+"""
+import argparse
+import json
+import timeit
+
+import pandas as pd
+
+from benchmarks.synthetic import make_fx, make_lines, month_keys
+from finance import analytics, metrics
+from finance.money import CENTS, FX_SCALE
+
+SIZES = [(1, 10), (5, 50), (20, 100), (50, 500)]  # (years, categories)
+CURRENCIES = 8  # apply_fx[8 ccy]: same lines spread over this many foreign currencies
+
+
+def float_summary(lines: pd.DataFrame, fx: pd.DataFrame, starting_savings: float) -> pd.DataFrame:
+    """
+    The float path metrics used before integer cents (float amounts x float
+    rates, float sums), kept as the baseline for monthly_summary+fx[float].
+    """
+    amount = lines["amount"].to_numpy()
+    month_codes, months = pd.factorize(lines["month"])
+    currency_codes, currencies = pd.factorize(lines["currency"])
+    grid = (
+        fx.pivot_table(index="month", columns="currency", values="rate_to_base", aggfunc="last")
+        .reindex(columns=currencies)
+    )
+    grid = grid.reindex(grid.index.union(months)).ffill().reindex(months)
+    if metrics.BASE_CURRENCY in grid.columns:
+        grid[metrics.BASE_CURRENCY] = 1.0
+    rate = grid.fillna(0.0).to_numpy()[month_codes, currency_codes]
+    totals = (
+        lines.assign(amount_eur=amount * rate)[lines["line_type"].isin(["income", "expense"])]
+        .groupby(["month", "line_type"])["amount_eur"].sum()
+        .unstack("line_type", fill_value=0.0)
+        .sort_index()
+    )
+    net = totals["income"] - totals["expense"]
+    return pd.DataFrame({"net": net, "savings_end": starting_savings + net.cumsum()})
+
+
+def bench_case(years: int, n_categories: int, repeat: int = 5) -> list[dict]:
+    lines = make_lines(years, n_categories)
+    fx = make_fx(month_keys(years), missing_every=11)
+    lines_eur = metrics.apply_fx(lines, fx)
+    multi_lines = make_lines(years, n_categories, n_currencies=CURRENCIES)
+    multi_fx = make_fx(month_keys(years), missing_every=11, n_currencies=CURRENCIES)
+    float_lines = lines.drop(columns="amount_cents").assign(amount=lines["amount_cents"] / CENTS)
+    float_fx = fx.drop(columns="rate_e8").assign(rate_to_base=fx["rate_e8"] / FX_SCALE)
+
+    cases = {
+        "apply_fx": lambda: metrics.apply_fx(lines, fx),
+        f"apply_fx[{CURRENCIES} ccy]": lambda: metrics.apply_fx(multi_lines, multi_fx),
+        "monthly_summary": lambda: metrics.monthly_summary(lines_eur, 1000.0),
+        "monthly_summary+fx": lambda: metrics.monthly_summary(lines, 1000.0, fx=fx),
+        "monthly_summary+fx[float]": lambda: float_summary(float_lines, float_fx, 1000.0),
+        "category_breakdown": lambda: metrics.category_breakdown(lines_eur, "expense"),
+        "unusual_spending": lambda: analytics.unusual_spending(lines_eur),
+        "trends": lambda: analytics.trends(analytics.month_totals(lines_eur)),
+    }
+    out = []
+    for name, fn in cases.items():
+        number = 3
+        best = min(timeit.repeat(fn, number=number, repeat=repeat)) / number
+        out.append({
+            "function": name, "years": years, "categories": n_categories,
+            "rows": len(lines), "best_ms": round(best * 1000, 3),
+        })
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    results = []
+    for years, cats in SIZES:
+        results.extend(bench_case(years, cats, repeat=args.repeat))
+
+    print(f"{'function':<28}{'years':>6}{'cats':>6}{'rows':>10}{'best ms':>12}")
+    for r in results:
+        print(f"{r['function']:<28}{r['years']:>6}{r['categories']:>6}{r['rows']:>10}{r['best_ms']:>12.3f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+End-to-end page benchmark.
+
+For each scenario (years of history x number of categories) a fresh local
+database is seeded with a synthetic household, then the Dashboard, Forecast and
+Add Month scripts are driven headlessly with Streamlit's AppTest. Every scenario
+runs in its own interpreter so caches and memory start cold. Per page it records
+latency of a cold and a warm rerun, DB query/connect counts (finance.instrument),
+peak traced Python memory and process max RSS. Add Month also saves the first
+month of a new, empty household (no earlier totals of any line type), and the
+scenario fails if that save raises. With --tenants N the database
+also holds N-1 other households of the same size, to check that a household's
+page cost does not grow with the number of tenants.
+
+    python -m benchmarks.bench_pages --json bench_pages.json
+    python -m benchmarks.bench_pages --full --backend duckdb
+    python -m benchmarks.bench_pages --scenario 20:100 --tenants 10
+    python -m benchmarks.compare old.json new.json
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = [(1, 10), (5, 50), (20, 100), (50, 500)]  # (years, categories)
+FULL_YEARS = [1, 5, 20, 50]
+FULL_CATEGORIES = [10, 50, 100, 500]
+
+PAGES = {
+    "Dashboard": "pages/2_Dashboard.py",
+    "Forecast": "pages/3_Forecast.py",
+    "Add Month": "pages/1_Add_Month.py",
+}
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _measure(at, action=None) -> dict:
+    """Run one rerun of `at` and collect latency, counters and memory."""
+    tracemalloc.reset_peak()
+    t0 = time.perf_counter()
+    (action or at.run)()
+    latency = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    run = at.session_state["_perf_rerun"]
+    return {
+        "latency_ms": round(latency * 1000, 2),
+        "queries": run.counters.get("db.query", 0),
+        "connects": run.counters.get("db.connect", 0),
+        "cache_hits": run.counters.get("cache.hit", 0),
+        "peak_traced_mb": round(peak / 2**20, 2),
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def run_scenario(years: int, n_categories: int, url: str, tenants: int = 1) -> list[dict]:
+    """Seed `url` and drive every page; runs inside the worker interpreter."""
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    os.environ["FINANCE_DATABASE_URL"] = url
+
+    from streamlit.testing.v1 import AppTest
+
+    from benchmarks.synthetic import category_names, month_keys, seed_database
+    from finance.context import get_context, use_tenant
+    from finance.db import init_db, save_categories
+
+    storage = get_context().storage
+    for i in range(1, tenants):
+        seed_database(storage, years, n_categories, seed=i, tenant_id=f"neighbour-{i}")
+    t0 = time.perf_counter()
+    counts = seed_database(storage, years, n_categories)
+    seed_ms = round((time.perf_counter() - t0) * 1000, 1)
+
+    tracemalloc.start()
+    results = []
+    base = {
+        "years": years, "categories": n_categories, "tenants": tenants, "lines": counts["lines"], "seed_ms": seed_ms,
+    }
+    for page, path in PAGES.items():
+        at = AppTest.from_file(path, default_timeout=600)
+        at.session_state["auth_ok"] = True
+        at.session_state["user_email"] = "bench@example.com"
+
+        results.append({**base, "page": page, "phase": "cold", **_measure(at)})
+        if page == "Add Month":
+            at.text_input[0].set_value(month_keys(years)[-1])
+            results.append({**base, "page": page, "phase": "load month", **_measure(at)})
+            save = next(b for b in at.button if "Save month" in b.label)
+            results.append({**base, "page": page, "phase": "save", **_measure(at, save.click().run)})
+        else:
+            results.append({**base, "page": page, "phase": "warm", **_measure(at)})
+
+    # A new household's first month: nothing to carry its trends or budgets yet.
+    init_db()
+    with use_tenant("new-household"):
+        for kind in ("income", "expense"):
+            save_categories(kind, [{"name": name, "id": None} for name in category_names(3, kind)])
+    at = AppTest.from_file(PAGES["Add Month"], default_timeout=600)
+    at.session_state["auth_ok"] = True
+    at.session_state["user_email"] = "bench@example.com"
+    at.session_state["tenant_id"] = "new-household"
+    at.run()
+    at.text_input[0].set_value(month_keys(1)[0]).run()
+    save = next(b for b in at.button if "Save month" in b.label)
+    results.append({**base, "page": "Add Month", "phase": "first save", **_measure(at, save.click().run)})
+    tracemalloc.stop()
+    return results
+
+
+def _spawn(years: int, n_categories: int, backend: str, tenants: int = 1) -> list[dict]:
+    tmp = tempfile.mkdtemp(prefix="finance-bench-")
+    ext = "duckdb" if backend == "duckdb" else "db"
+    url = f"{backend}:///{os.path.join(tmp, f'bench.{ext}')}"
+    code = (
+        "import json, sys; sys.path.insert(0, %r)\n"
+        "from benchmarks.bench_pages import run_scenario\n"
+        "print('RESULT' + json.dumps(run_scenario(%d, %d, %r, %d)))\n"
+    ) % (ROOT, years, n_categories, url, tenants)
+    proc = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+    out = [line for line in proc.stdout.splitlines() if line.startswith("RESULT")]
+    if proc.returncode or not out:
+        raise RuntimeError(f"scenario {years}y/{n_categories}c failed:\n{proc.stderr[-3000:]}")
+    return json.loads(out[-1][len("RESULT"):])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--backend", choices=["sqlite", "duckdb"], default="sqlite")
+    parser.add_argument("--full", action="store_true", help="every years x categories combination")
+    parser.add_argument("--scenario", action="append", metavar="YEARS:CATEGORIES", help="e.g. 5:50 (repeatable)")
+    parser.add_argument("--tenants", type=int, default=1, help="households in the database (pages run as one)")
+    args = parser.parse_args(argv)
+
+    if args.scenario:
+        scenarios = [tuple(int(x) for x in s.split(":")) for s in args.scenario]
+    elif args.full:
+        scenarios = [(y, c) for y in FULL_YEARS for c in FULL_CATEGORIES]
+    else:
+        scenarios = SCENARIOS
+
+    results = []
+    header = f"{'years':>5}{'cats':>6}{'lines':>9}  {'page':<11}{'phase':<12}{'ms':>10}{'queries':>9}{'peak MB':>9}{'rss MB':>8}"
+    print(header)
+    for years, cats in scenarios:
+        for r in _spawn(years, cats, args.backend, args.tenants):
+            results.append(r)
+            print(
+                f"{r['years']:>5}{r['categories']:>6}{r['lines']:>9}  {r['page']:<11}{r['phase']:<12}"
+                f"{r['latency_ms']:>10.1f}{r['queries']:>9}{r['peak_traced_mb']:>9.1f}{r['max_rss_mb']:>8.0f}"
+            )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "commit": _git_commit(),
+                "backend": args.backend,
+                "python": sys.version.split()[0],
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "results": results,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
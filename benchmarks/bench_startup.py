@@ -0,0 +1,100 @@
+"""
+Startup-cost benchmark.
+
+1. Import profile: runs `python -X importtime -c "import <module>"` in a fresh
+   interpreter for each finance module and reports its cumulative import time
+   plus which heavy third-party packages it drags in.
+2. Cold start: runs Main.py and the login screen once with Streamlit's AppTest
+   in a fresh interpreter (empty module cache) against a throwaway SQLite DB.
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --json startup.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ["finance.db", "finance.auth", "finance.metrics", "finance.forecast", "finance.views"]
+HEAVY = ["pandas", "numpy", "statsmodels", "plotly", "openai", "bcrypt", "psycopg2", "duckdb"]
+
+_COLD_START = """
+import os, sys, time
+sys.path.insert(0, {root!r})
+os.chdir({root!r})
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({page!r}, default_timeout=120)
+at.session_state["auth_ok"] = {logged_in!r}
+at.run()
+assert not at.exception, at.exception
+print(time.perf_counter() - t0)
+"""
+
+
+def import_profile(module: str) -> dict:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cum, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        cumulative[name] = max(cumulative.get(name, 0), int(cum))
+    return {
+        "module": module,
+        "import_ms": round(cumulative.get(module, 0) / 1000, 1),
+        "heavy": sorted(h for h in HEAVY if h in cumulative),
+    }
+
+
+def cold_start(page: str, logged_in: bool, env: dict) -> float:
+    code = _COLD_START.format(root=ROOT, page=page, logged_in=logged_in)
+    proc = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True)
+    if proc.returncode:
+        raise RuntimeError(proc.stderr[-2000:])
+    return round(float(proc.stdout.strip().splitlines()[-1]) * 1000, 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--repeat", type=int, default=3, help="cold starts per page (best is reported)")
+    args = parser.parse_args(argv)
+
+    imports = [import_profile(m) for m in MODULES]
+
+    tmp = tempfile.mkdtemp()
+    env = dict(os.environ, FINANCE_DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+    pages = {
+        "Main.py (logged in)": ("Main.py", True),
+        "Login screen": ("Main.py", False),
+    }
+    starts = {
+        name: min(cold_start(page, logged_in, env) for _ in range(args.repeat))
+        for name, (page, logged_in) in pages.items()
+    }
+
+    print(f"{'module':<20}{'import ms':>12}  heavy deps")
+    for r in imports:
+        print(f"{r['module']:<20}{r['import_ms']:>12.1f}  {', '.join(r['heavy']) or '-'}")
+    print()
+    print(f"{'page':<22}{'cold start ms':>14}")
+    for name, ms in starts.items():
+        print(f"{name:<22}{ms:>14.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"imports": imports, "cold_start_ms": starts}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
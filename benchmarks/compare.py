@@ -0,0 +1,55 @@
+"""
+Compare two bench_pages JSON files (e.g. from two commits).
+
+    python -m benchmarks.compare base.json new.json [--threshold 10]
+
+Prints latency / query / memory deltas per (scenario, page, phase) and exits
+with status 1 if any latency regressed by more than --threshold percent.
+"""
+import argparse
+import json
+import sys
+
+METRICS = ["latency_ms", "queries", "peak_traced_mb"]
+
+
+def _key(r: dict) -> tuple:
+    return r["years"], r["categories"], r.get("tenants", 1), r["page"], r["phase"]
+
+
+def _pct(old: float, new: float) -> float:
+    return 0.0 if old == new else (float("inf") if not old else (new - old) * 100.0 / old)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=10.0, help="latency regression limit in percent")
+    args = parser.parse_args(argv)
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    old_rows = {_key(r): r for r in base["results"]}
+
+    print(f"base {base.get('commit')} -> new {new.get('commit')}")
+    print(f"{'years':>5}{'cats':>6}  {'page':<11}{'phase':<12}" + "".join(f"{m:>22}" for m in METRICS))
+    regressed = False
+    for r in new["results"]:
+        old = old_rows.get(_key(r))
+        if old is None:
+            continue
+        cells = []
+        for m in METRICS:
+            pct = _pct(old[m], r[m])
+            cells.append(f"{old[m]:>8} -> {r[m]:<8}{pct:+5.0f}%")
+        if _pct(old["latency_ms"], r["latency_ms"]) > args.threshold:
+            regressed = True
+        print(f"{r['years']:>5}{r['categories']:>6}  {r['page']:<11}{r['phase']:<12}" + "".join(f"{c:>22}" for c in cells))
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
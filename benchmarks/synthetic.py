@@ -0,0 +1,137 @@
+"""
+Synthetic household data for benchmarks.
+
+make_lines(years, n_categories) returns a frame shaped like load_all_lines():
+income, expense, expense_tatiana and expense_ben lines for every month, with a
+share of foreign-currency categories so the FX path is exercised ("moscow" RUB
+ones by default, spread over `n_currencies` currencies if asked).
+make_fx(months) returns a frame shaped like load_all_fx().
+seed_database(storage, years, n_categories) writes a whole household (tenant)
+into a database through the storage bulk path.
+"""
+import numpy as np
+import pandas as pd
+
+from finance.money import CENTS, FX_SCALE
+
+LINE_TYPES = ["income", "expense", "expense_tatiana", "expense_ben"]
+FOREIGN_CURRENCIES = ["RUB", "USD", "GBP", "CHF", "SEK", "PLN", "JPY", "CZK", "NOK", "DKK", "HUF", "TRY"]
+
+
+def month_keys(years: int, start_year: int = 2000) -> list[str]:
+    return [f"{start_year + i // 12:04d}-{i % 12 + 1:02d}" for i in range(years * 12)]
+
+
+def category_names(n: int, line_type: str) -> list[str]:
+    prefix = "Income" if line_type == "income" else "Expense"
+    # every 7th category is a RUB one
+    return [f"{prefix}_{i:03d}" + (" moscow" if i % 7 == 3 else "") for i in range(n)]
+
+
+def category_currency(name: str, n_currencies: int = 1) -> str:
+    """EUR, or one of the first `n_currencies` foreign currencies for every 7th category."""
+    if not name.endswith(" moscow"):
+        return "EUR"
+    i = int(name.split("_")[1].split()[0])
+    return FOREIGN_CURRENCIES[(i // 7) % n_currencies]
+
+
+def _cents(amounts: np.ndarray) -> np.ndarray:
+    return np.rint(amounts * CENTS).astype(np.int64)
+
+
+def make_lines(years: int, n_categories: int, seed: int = 0, n_currencies: int = 1) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    months = month_keys(years)
+    n_income = max(2, n_categories // 5)
+    frames = []
+
+    inc_cats = category_names(n_income, "income")
+    inc = pd.MultiIndex.from_product([months, inc_cats], names=["month", "category"]).to_frame(index=False)
+    inc["line_type"] = "income"
+    inc["amount_cents"] = _cents(rng.gamma(2.0, 1500.0, len(inc)))
+    frames.append(inc)
+
+    exp_cats = category_names(n_categories, "expense")
+    grid = pd.MultiIndex.from_product([months, exp_cats], names=["month", "category"]).to_frame(index=False)
+    tat = _cents(rng.gamma(1.5, 80.0, len(grid)))
+    ben = _cents(rng.gamma(1.5, 80.0, len(grid)))
+    for line_type, amount in [("expense_tatiana", tat), ("expense_ben", ben), ("expense", tat + ben)]:
+        part = grid.copy()
+        part["line_type"] = line_type
+        part["amount_cents"] = amount
+        frames.append(part)
+
+    lines = pd.concat(frames, ignore_index=True)
+    codes, names = pd.factorize(lines["category"])
+    lines["currency"] = np.array([category_currency(n, n_currencies) for n in names])[codes]
+    # copy() consolidates the blocks, like a frame read from the database
+    return lines[["month", "line_type", "category", "currency", "amount_cents"]].copy()
+
+
+def make_fx(months: list[str], seed: int = 0, missing_every: int = 0, n_currencies: int = 1) -> pd.DataFrame:
+    """
+    Monthly rates to EUR for the first `n_currencies` foreign currencies (RUB
+    around 0.011); drop every `missing_every`-th month if set.
+    """
+    rng = np.random.default_rng(seed)
+    frames = []
+    for k, currency in enumerate(FOREIGN_CURRENCIES[:n_currencies]):
+        level = 0.011 * (k + 1)
+        frames.append(pd.DataFrame({
+            "month": months, "currency": currency,
+            "rate_e8": np.rint(rng.normal(level, level / 10, len(months)).clip(level / 2) * FX_SCALE).astype(np.int64),
+        }))
+    fx = pd.concat(frames, ignore_index=True)
+    if missing_every:
+        fx = fx[np.arange(len(fx)) % missing_every != 0]
+    return fx.reset_index(drop=True)
+
+
+def seed_database(
+    storage, years: int, n_categories: int, seed: int = 0, tenant_id: str | None = None, n_currencies: int = 1,
+) -> dict:
+    """Create the schema and load one synthetic household (default: current tenant). Returns row counts."""
+    from finance.context import current_tenant
+    from finance.db import bump_data_versions, category_kind, init_db, refresh_trends
+
+    init_db(storage)
+    tenant_id = tenant_id or current_tenant()
+    lines = make_lines(years, n_categories, seed=seed, n_currencies=n_currencies)
+    months = month_keys(years)
+    fx = make_fx(months, seed=seed, missing_every=13, n_currencies=n_currencies)
+
+    categories = [
+        (kind, name) for kind, n in [("expense", n_categories), ("income", max(2, n_categories // 5))]
+        for name in category_names(n, kind)
+    ]
+    ids = {key: i for i, key in enumerate(categories, start=1)}
+    kinds = lines["line_type"].map(category_kind)
+    category_id = [ids[key] for key in zip(kinds, lines["category"])]
+
+    with storage.connection() as conn:
+        storage.bulk_upsert(
+            conn, "household_settings", ["tenant_id", "starting_savings"], ["tenant_id"], [(tenant_id, 10000.0)],
+        )
+        storage.bulk_upsert(
+            conn, "categories", ["tenant_id", "id", "kind", "name", "position", "currency"], ["tenant_id", "id"],
+            [(tenant_id, i, kind, name, i, category_currency(name, n_currencies)) for (kind, name), i in ids.items()],
+        )
+        storage.bulk_upsert(
+            conn, "monthly_lines", ["tenant_id", "month", "line_type", "category_id", "amount_cents", "currency"],
+            ["tenant_id", "month", "line_type", "category_id"],
+            list(zip(
+                [tenant_id] * len(lines), lines["month"], lines["line_type"], category_id,
+                lines["amount_cents"].tolist(), lines["currency"],
+            )),
+        )
+        storage.bulk_upsert(
+            conn, "fx_rates", ["tenant_id", "month", "currency", "rate_e8"], ["tenant_id", "currency", "month"],
+            [(tenant_id, m, c, int(r)) for m, c, r in fx.itertuples(index=False, name=None)],
+        )
+        storage.refresh_fx_effective(conn, tenant_id)
+        refresh_trends(storage, conn, tenant_id)
+        bump_data_versions(
+            storage, conn, ["household_settings", "categories", "monthly_lines", "fx_rates", "monthly_trends"], tenant_id
+        )
+    return {"months": len(months), "lines": len(lines), "fx": len(fx)}
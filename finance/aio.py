@@ -0,0 +1,97 @@
+"""
+Concurrent page data loads on top of the blocking finance.db / finance.views API.
+
+The drivers (psycopg2, sqlite3, duckdb) are synchronous, so each load runs on a
+worker thread via asyncio.to_thread with its own connection (from the Postgres
+pool when FINANCE_DB_POOL_SIZE is set). A gather runs at most pool-size calls at
+once: the pool is shared by all sessions and makes callers wait for a free
+connection, so more threads would only queue there. Independent queries overlap and a
+page's data load takes as long as its slowest query instead of the sum.
+Context variables (FinanceContext, tenant, rerun timings) follow every call
+into its thread. Memoized loaders answer from the cache without a query.
+
+    bundle = dashboard_bundle()              # from a Streamlit page
+    bundle = await load_dashboard_bundle()   # from async code
+"""
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable
+
+from finance.instrument import timed
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from finance.db import Settings
+
+MAX_CONCURRENCY = 8  # worker threads per gather when the backend is not pooled
+
+
+def _concurrency() -> int:
+    from finance.context import get_context
+
+    return get_context().storage.pool_size or MAX_CONCURRENCY
+
+
+async def gather(calls: dict[str, Callable[[], object]], limit: int | None = None) -> dict[str, object]:
+    """Run the zero-argument `calls` concurrently on worker threads; results by the same keys."""
+    semaphore = asyncio.Semaphore(limit or _concurrency())
+
+    async def run(fn):
+        async with semaphore:
+            return await asyncio.to_thread(fn)
+
+    results = await asyncio.gather(*(run(fn) for fn in calls.values()))
+    return dict(zip(calls, results))
+
+
+#######################################################
+# Dashboard
+#######################################################
+@dataclass(frozen=True)
+class DashboardBundle:
+    settings: Settings
+    lines_eur: pd.DataFrame
+    missing_rates: list[tuple[str, str]]  # (month, currency) without a rate of their own
+    n_months: int  # months with income or expense lines
+    categories: dict[str, list[str]]  # line_type -> categories, largest first
+    months: dict[str, int]  # line_type -> months with lines of that type
+    budget_months: list[str]  # months with a budget status, newest first
+
+
+DASHBOARD_TABLES = ("income", "expense")
+
+
+async def load_dashboard_bundle() -> DashboardBundle:
+    """Everything the Dashboard needs before the user picks sort/page options, loaded concurrently."""
+    from finance import views
+    from finance.db import get_settings
+
+    calls = {
+        "settings": get_settings,
+        "lines_eur": views.lines_eur,
+        "missing_rates": views.missing_fx_rates,
+        "n_months": views.count_months,
+        "budget_months": views.budget_months,
+    }
+    for line_type in DASHBOARD_TABLES:
+        calls[f"categories.{line_type}"] = lambda t=line_type: views.list_categories(t)
+        calls[f"months.{line_type}"] = lambda t=line_type: views.count_months((t,))
+    with timed("aio.load_dashboard_bundle"):
+        r = await gather(calls)
+    return DashboardBundle(
+        settings=r["settings"],
+        lines_eur=r["lines_eur"],
+        missing_rates=r["missing_rates"],
+        n_months=r["n_months"],
+        categories={t: r[f"categories.{t}"] for t in DASHBOARD_TABLES},
+        months={t: r[f"months.{t}"] for t in DASHBOARD_TABLES},
+        budget_months=r["budget_months"],
+    )
+
+
+def dashboard_bundle() -> DashboardBundle:
+    """Blocking wrapper for scripts without a running event loop (Streamlit pages)."""
+    return asyncio.run(load_dashboard_bundle())
@@ -0,0 +1,208 @@
+"""
+Unusual spending: rolling robust z-scores over every (line_type, category)
+expense series at once.
+
+The lines are scattered into one months x series matrix (EUR). For each month,
+the previous WINDOW months of every series give a median and a median absolute
+deviation (MAD); the month's modified z-score is
+
+    z = (amount - median) / (MAD_TO_SIGMA * MAD)
+
+which, unlike a mean/stdev score, is not pulled around by the outliers it is
+looking for. All windows are one strided view of the matrix, so the cost is a
+few NumPy reductions however many categories and people there are. Pure
+functions like finance.metrics; finance.views memoizes them per data version.
+"""
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from finance.instrument import timed
+from finance.metrics import apply_fx
+from finance.money import CENTS
+
+# The combined household lines and each person's
+SPENDING_LINE_TYPES = ("expense", "expense_tatiana", "expense_ben")
+WINDOW = 12  # months of history behind each score
+THRESHOLD = 3.5  # |z| above this is unusual (Iglewicz & Hoaglin)
+MAD_TO_SIGMA = 1.4826  # MAD of a normal distribution x this = its standard deviation
+MIN_SCALE = 10.0  # EUR; floor for the spread of very regular series (MAD 0)
+MIN_DEVIATION = 20.0  # EUR; smaller departures from the median are never listed
+UNUSUAL_COLUMNS = ["month", "line_type", "category", "amount", "typical", "deviation", "z"]
+
+
+def spending_matrix(
+    lines: pd.DataFrame, fx: pd.DataFrame | None = None, line_types=SPENDING_LINE_TYPES,
+) -> tuple[np.ndarray, pd.Index, pd.MultiIndex]:
+    """
+    (months x series array of EUR amounts, months, (line_type, category)
+    series). Months are those with any lines, oldest first; a series with no
+    line in a month counts 0 there. Pass raw lines + fx, or lines_eur.
+    """
+    if "amount_eur_cents" not in lines.columns:
+        lines = apply_fx(lines, fx)
+    month_codes, months = pd.factorize(lines["month"], sort=True)
+    keep = lines["line_type"].isin(line_types).to_numpy()
+    df = lines[keep]
+    # Factorizing the two columns apart and pairing the codes is much cheaper than a MultiIndex factorize
+    type_codes, types = pd.factorize(df["line_type"], sort=True)
+    category_codes, categories = pd.factorize(df["category"], sort=True)
+    pairs, series_codes = np.unique(type_codes * len(categories) + category_codes, return_inverse=True)
+    series = pd.MultiIndex.from_arrays(
+        [types[pairs // len(categories)], categories[pairs % len(categories)]], names=["line_type", "category"]
+    )
+    flat = np.bincount(
+        month_codes[keep] * len(series) + series_codes,
+        weights=df["amount_eur_cents"].to_numpy(dtype=float),
+        minlength=len(months) * len(series),
+    )
+    return flat.reshape(len(months), len(series)) / CENTS, pd.Index(months, name="month"), series
+
+
+def _median(windows: np.ndarray) -> np.ndarray:
+    """Median over the last (short) axis: one sort of a contiguous copy beats np.median's partition."""
+    ordered = np.sort(windows, axis=-1)
+    n = ordered.shape[-1]
+    return (ordered[..., (n - 1) // 2] + ordered[..., n // 2]) / 2
+
+
+def robust_zscores(matrix: np.ndarray, window: int = WINDOW) -> tuple[np.ndarray, np.ndarray]:
+    """
+    (z, median) arrays shaped like `matrix`, each month scored against the
+    `window` months before it; NaN where there is not yet a full window.
+    """
+    z = np.full(matrix.shape, np.nan)
+    median = np.full(matrix.shape, np.nan)
+    if len(matrix) <= window:
+        return z, median
+    history = sliding_window_view(matrix[:-1], window, axis=0)  # (months - window, series, window)
+    med = _median(history)
+    mad = _median(np.abs(history - med[..., None]))
+    median[window:] = med
+    z[window:] = (matrix[window:] - med) / np.maximum(MAD_TO_SIGMA * mad, MIN_SCALE)
+    return z, median
+
+
+@timed("analytics.unusual_spending")
+def unusual_spending(
+    lines: pd.DataFrame,
+    fx: pd.DataFrame | None = None,
+    window: int = WINDOW,
+    threshold: float = THRESHOLD,
+    min_deviation: float = MIN_DEVIATION,
+) -> pd.DataFrame:
+    """
+    Months where a category's spending (household or one person's) departs
+    from its own recent history, most unusual first. amount, typical (the
+    rolling median) and deviation are EUR; z is the robust z-score, positive
+    for more spending than usual.
+    """
+    if lines is None or lines.empty:
+        return pd.DataFrame(columns=UNUSUAL_COLUMNS)
+    matrix, months, series = spending_matrix(lines, fx)
+    z, median = robust_zscores(matrix, window)
+    deviation = matrix - median
+    with np.errstate(invalid="ignore"):
+        hit = (np.abs(z) >= threshold) & (np.abs(deviation) >= min_deviation)
+    rows, cols = np.nonzero(hit)
+    out = pd.DataFrame({
+        "month": months.to_numpy()[rows],
+        "line_type": series.get_level_values(0).to_numpy()[cols],
+        "category": series.get_level_values(1).to_numpy()[cols],
+        "amount": matrix[rows, cols],
+        "typical": median[rows, cols],
+        "deviation": deviation[rows, cols],
+        "z": z[rows, cols],
+    })
+    order = np.lexsort((out["month"].to_numpy(), -np.abs(out["z"].to_numpy())))
+    return out.iloc[order].reset_index(drop=True)
+
+
+#######################################################
+# Rolling windows, year over year, shares
+#######################################################
+TREND_LINE_TYPES = ("income", "expense", "expense_tatiana", "expense_ben")
+TREND_WINDOWS = (3, 6, 12)
+# Furthest back any trend row looks (its 12-month window and the same month a
+# year earlier): recomputing from month m needs totals from m - 12 on, and a
+# change in month m moves rows m .. m + 12 only.
+TREND_LOOKBACK = 12
+TREND_COLUMNS = [
+    "month", "income", "expense", "net",
+    *[f"{s}_avg_{w}" for s in ("income", "expense", "net") for w in TREND_WINDOWS],
+    "income_yoy", "expense_yoy", "savings_rate", "tatiana_share",
+]
+
+
+def shift_month(month: str, months: int) -> str:
+    """'YYYY-MM' moved by `months` calendar months."""
+    i = int(month[:4]) * 12 + int(month[5:7]) - 1 + months
+    return f"{i // 12:04d}-{i % 12 + 1:02d}"
+
+
+def month_range(first: str, last: str) -> list[str]:
+    n = (int(last[:4]) - int(first[:4])) * 12 + int(last[5:7]) - int(first[5:7])
+    return [shift_month(first, i) for i in range(n + 1)]
+
+
+def rolling_means(matrix: np.ndarray, window: int) -> np.ndarray:
+    """
+    Trailing mean over `window` rows for every column, from one cumulative
+    sum. NaN cells (months without lines) are skipped, not counted as 0.
+    """
+    present = ~np.isnan(matrix)
+    sums = np.cumsum(np.where(present, matrix, 0.0), axis=0)
+    counts = np.cumsum(present, axis=0)
+    sums[window:] -= sums[:-window].copy()
+    counts[window:] -= counts[:-window].copy()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+def month_totals(lines: pd.DataFrame, fx: pd.DataFrame | None = None) -> pd.DataFrame:
+    """EUR cents per month (rows, oldest first) and TREND_LINE_TYPES (columns)."""
+    if "amount_eur_cents" not in lines.columns:
+        lines = apply_fx(lines, fx)
+    df = lines[lines["line_type"].isin(TREND_LINE_TYPES)]
+    return (
+        df.groupby(["month", "line_type"])["amount_eur_cents"].sum()
+        .unstack("line_type", fill_value=0)
+        .reindex(columns=list(TREND_LINE_TYPES), fill_value=0)
+        .sort_index()
+    )
+
+
+@timed("analytics.trends")
+def trends(totals: pd.DataFrame) -> pd.DataFrame:
+    """
+    One row per month of `totals` (month_totals, cents): income, expense and
+    net in EUR, their TREND_WINDOWS-month trailing averages, the change
+    against the same month a year earlier (NaN without one), the savings rate
+    (net / income) and Tatiana's share of the two personal expense lines.
+    Windows are calendar months; months without lines are left out of the
+    averages. Rows only look TREND_LOOKBACK months back.
+    """
+    if totals.empty:
+        return pd.DataFrame(columns=TREND_COLUMNS)
+    months = list(totals.index)
+    calendar = month_range(months[0], months[-1])
+    grid = totals.reindex(index=calendar, columns=list(TREND_LINE_TYPES)).to_numpy(dtype=float) / CENTS
+    income, expense, tatiana, ben = grid.T
+    flows = np.column_stack([income, expense, income - expense])  # months x (income, expense, net)
+
+    rows = pd.Index(calendar).get_indexer(months)
+    out = {"month": months, "income": income[rows], "expense": expense[rows], "net": flows[rows, 2]}
+    averages = {w: rolling_means(flows, w)[rows] for w in TREND_WINDOWS}
+    for j, name in enumerate(("income", "expense", "net")):
+        for w in TREND_WINDOWS:
+            out[f"{name}_avg_{w}"] = averages[w][:, j]
+
+    year_ago = rows - 12
+    earlier = np.where(year_ago >= 0, year_ago, 0)
+    for j, name in enumerate(("income", "expense")):
+        out[f"{name}_yoy"] = np.where(year_ago >= 0, flows[rows, j] - flows[earlier, j], np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out["savings_rate"] = np.where(income[rows] > 0, flows[rows, 2] / income[rows], np.nan)
+        personal = tatiana[rows] + ben[rows]
+        out["tatiana_share"] = np.where(personal > 0, tatiana[rows] / personal, np.nan)
+    return pd.DataFrame(out)[TREND_COLUMNS]
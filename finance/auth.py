@@ -1,7 +1,15 @@
+import sys
+
 import streamlit as st
-from finance.db import verify_user, init_db
+from finance.context import get_context, set_tenant
+from finance.db import authenticate, init_db
+from finance.ui import page_name, render_timing_panel, track_rerun
 
 def require_login():
+    # Time this rerun under the calling page's name (Main, 2_Dashboard, ...)
+    page = page_name(sys._getframe(1).f_globals.get("__file__", ""))
+    track_rerun(page)
+
     init_db()  # safe to call; creates tables if missing
 
     if "auth_ok" not in st.session_state:
@@ -9,23 +17,32 @@ def require_login():
 
     # Optional: logout button in sidebar when logged in
     if st.session_state.get("auth_ok"):
+        # Scope every finance.db call of this rerun to the user's household
+        set_tenant(st.session_state.get("tenant_id"))
         with st.sidebar:
             st.caption(f"Logged in as: {st.session_state.get('user_email','')}")
             if st.button("Logout"):
                 st.session_state.auth_ok = False
                 st.session_state.user_email = None
+                st.session_state.tenant_id = None
+                set_tenant(None)
                 st.rerun()
+        if get_context().is_admin(st.session_state.get("user_email")):
+            render_timing_panel(page)
         return
 
-    # Login screen
+    # Login screen: nothing below may run as the previous user's household
+    set_tenant(None)
     st.title("🔐 Login")
     email = st.text_input("Email")
     password = st.text_input("Password", type="password")
 
     if st.button("Login", type="primary"):
-        if verify_user(email, password):
+        tenant_id = authenticate(email, password)
+        if tenant_id is not None:
             st.session_state.auth_ok = True
             st.session_state.user_email = email.lower().strip()
+            st.session_state.tenant_id = tenant_id
             st.success("Logged in ✅")
             st.rerun()
         else:
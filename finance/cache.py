@@ -0,0 +1,175 @@
+"""
+Memoization of derived frames keyed on a cheap data-version token.
+
+Every write in finance.db bumps a counter in the data_versions table for the
+tenant and table it touched. `memoize(*tables)` keys a function's result on the
+current tenant, its arguments and the tenant's versions of those tables, so a
+result is reused across reruns and sessions until one of the tables actually
+changes for that household. Checking freshness is one tiny query (itself reused
+for VERSION_TTL seconds; writes from this process drop it immediately) instead
+of hashing whole DataFrames. On Postgres, finance.notify pushes other processes'
+writes over LISTEN/NOTIFY and evicts the affected entries right away, so the
+snapshot is then trusted for LISTEN_VERSION_TTL instead of being re-polled.
+
+Cached frames are shared: callers must treat them as read-only. They are held
+once per process whatever the number of sessions, and `freeze` stores their text
+columns as Arrow strings (one buffer per column instead of a Python object per
+cell, and slices share that buffer instead of copying it).
+"""
+import functools
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from finance.instrument import count
+
+VERSION_TTL = 2.0  # seconds another process' write may go unnoticed
+LISTEN_VERSION_TTL = 300.0  # safety net while a notify listener is connected
+MAX_ENTRIES = 256
+STRING_DTYPE = "string[pyarrow_numpy]"  # NaN for missing and numpy bool results, like object columns
+
+
+class VersionedCache:
+    """Thread-safe LRU of derived values plus the last-seen data_versions snapshot per tenant."""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.version_ttl = VERSION_TTL
+        self._entries: OrderedDict = OrderedDict()
+        self._versions: dict[str, tuple[float, dict]] = {}  # tenant -> (loaded at, versions)
+        self._epoch = 0  # bumped whenever snapshots are dropped, so a load that raced a write is not kept
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    # ---- version token ---------------------------------------------
+    def versions(self, tenant: str, loader) -> dict:
+        # loader() is a query: run it outside the lock so a slow one doesn't
+        # stall every other session's get/put/invalidate.
+        with self._lock:
+            seen = self._versions.get(tenant)
+            if seen is not None and time.monotonic() - seen[0] <= self.version_ttl:
+                return seen[1]
+            epoch = self._epoch
+        started = time.monotonic()
+        loaded = loader()
+        with self._lock:
+            seen = self._versions.get(tenant)
+            if seen is not None and seen[0] >= started:
+                return seen[1]  # another thread loaded a fresher snapshot meanwhile
+            if self._epoch == epoch:
+                self._versions[tenant] = (started, loaded)
+            return loaded
+
+    def forget_versions(self, tenant: str | None = None):
+        with self._lock:
+            self._epoch += 1
+            if tenant is None:
+                self._versions.clear()
+            else:
+                self._versions.pop(tenant, None)
+
+    def invalidate(self, tenant: str, tables) -> int:
+        """Forget the tenant's versions and evict its entries derived from any of `tables`. Returns evicted count."""
+        tables = set(tables)
+        with self._lock:
+            self._epoch += 1
+            self._versions.pop(tenant, None)
+            # memoize keys are (name, tenant, args, kwargs, ((table, version), ...))
+            stale = [k for k in self._entries if k[1] == tenant and any(t in tables for t, _ in k[4])]
+            for k in stale:
+                del self._entries[k]
+        return len(stale)
+
+    # ---- entries ---------------------------------------------------
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            self._versions.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def memory_usage(self) -> dict:
+        """Deep size in bytes of each cached DataFrame, by memoized function name (summed over keys)."""
+        pd = sys.modules.get("pandas")
+        with self._lock:
+            entries = list(self._entries.items())
+        usage: dict[str, int] = {}
+        for key, value in entries:
+            if pd is not None and isinstance(value, pd.DataFrame):
+                usage[key[0]] = usage.get(key[0], 0) + int(value.memory_usage(deep=True).sum())
+        return usage
+
+
+def freeze(value):
+    """
+    DataFrame `value` with its text columns as Arrow-backed strings; anything else
+    unchanged. Other columns are kept as they are (no copy).
+    """
+    pd = sys.modules.get("pandas")
+    if pd is None or not isinstance(value, pd.DataFrame):
+        return value
+    text = [
+        c for c, dtype in value.dtypes.items()
+        if dtype == object and pd.api.types.infer_dtype(value[c], skipna=True) in ("string", "empty")
+    ]
+    if not text or value.columns.has_duplicates:
+        return value
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return value
+    return value.astype({c: STRING_DTYPE for c in text}, copy=False)
+
+
+def data_version(*tables: str) -> tuple:
+    """Current tenant's version token for the given tables, e.g. (("fx_rates", 3), ("monthly_lines", 41))."""
+    from finance.context import current_tenant, get_context
+    from finance.db import load_data_versions
+
+    versions = get_context().cache.versions(current_tenant(), load_data_versions)
+    return tuple((t, versions.get(t, 0)) for t in sorted(tables))
+
+
+def memoize(*tables: str):
+    """Cache fn(*args) until any of `tables` gets a new data version."""
+    def decorator(fn):
+        name = f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            from finance.context import current_tenant, get_context
+
+            cache = get_context().cache
+            # Key layout is relied on by VersionedCache.invalidate.
+            key = (name, current_tenant(), args, tuple(sorted(kwargs.items())), data_version(*tables))
+            hit, value = cache.get(key)
+            count("cache.hit" if hit else "cache.miss")
+            if hit:
+                return value
+            value = freeze(fn(*args, **kwargs))
+            cache.put(key, value)
+            return value
+
+        wrapper.tables = tables
+        return wrapper
+    return decorator
@@ -0,0 +1,150 @@
+"""
+Dashboard figures, built once per data version and cached as Plotly JSON.
+
+- Long histories are aggregated before plotting: quarters above
+  QUARTERLY_AFTER months, years above YEARLY_AFTER months. Flows (income,
+  expense, net, category amounts) are summed, stocks (savings) take the
+  period's last value.
+- Stacked category charts keep the MAX_CATEGORIES largest categories and
+  fold the rest into "Other".
+- Line traces switch to WebGL (Scattergl) above WEBGL_POINTS points, which
+  matters when the caller asks for full monthly detail (detail=True).
+
+Rebuilding a Figure from cached JSON is far cheaper than running plotly
+express again, and the payload sent to the browser stays bounded however many
+decades of months there are. plotly is imported lazily.
+"""
+import pandas as pd
+
+from finance import views
+from finance.cache import memoize
+
+QUARTERLY_AFTER = 120  # months
+YEARLY_AFTER = 360
+MAX_CATEGORIES = 15
+WEBGL_POINTS = 500
+
+
+def granularity(n_months: int) -> str:
+    if n_months > YEARLY_AFTER:
+        return "year"
+    if n_months > QUARTERLY_AFTER:
+        return "quarter"
+    return "month"
+
+
+def period_labels(months: pd.Series, grain: str) -> pd.Series:
+    """'YYYY-MM' -> 'YYYY-MM' / 'YYYY-Qn' / 'YYYY'."""
+    if grain == "month":
+        return months
+    year = months.str.slice(0, 4)
+    if grain == "year":
+        return year
+    quarter = (months.str.slice(5, 7).astype(int) - 1) // 3 + 1
+    return year + "-Q" + quarter.astype(str)
+
+
+def downsample(
+    df: pd.DataFrame, flows=(), stocks=(), by=(), x: str = "month", detail: bool = False
+) -> tuple[pd.DataFrame, str]:
+    """Aggregate `df` to the granularity its month range needs. Returns (frame, grain)."""
+    grain = "month" if detail else granularity(df[x].nunique())
+    if grain == "month":
+        return df, grain
+    agg = {**{c: "sum" for c in flows}, **{c: "last" for c in stocks}}
+    out = (
+        df.sort_values(x)
+        .assign(**{x: period_labels(df[x], grain)})
+        .groupby([x, *by], as_index=False, sort=True)
+        .agg(agg)
+    )
+    return out, grain
+
+
+def _top_categories(long: pd.DataFrame) -> pd.DataFrame:
+    totals = long.groupby("category")["amount"].sum().sort_values(ascending=False)
+    if len(totals) <= MAX_CATEGORIES:
+        return long
+    keep = set(totals.index[:MAX_CATEGORIES])
+    folded = long.assign(category=long["category"].where(long["category"].isin(keep), "Other"))
+    return folded.groupby(["month", "category"], as_index=False)["amount"].sum()
+
+
+def _to_json(fig, grain: str) -> str:
+    import plotly.io as pio
+
+    if grain != "month":
+        fig.update_layout(xaxis_title=grain)
+    return pio.to_json(fig, validate=False)
+
+
+def figure(spec: str):
+    """Rebuild a Figure from cached JSON for st.plotly_chart."""
+    import plotly.io as pio
+
+    return pio.from_json(spec, skip_invalid=True)
+
+
+#######################################################
+# Cached figure specs
+#######################################################
+@memoize(*views.LINES)
+def savings_json(starting_savings: float, detail: bool = False) -> str:
+    import plotly.express as px
+
+    data, grain = downsample(views.monthly_summary(starting_savings), stocks=["savings_end"], detail=detail)
+    fig = px.line(
+        data, x="month", y="savings_end", markers=len(data) <= 240,
+        render_mode="webgl" if len(data) > WEBGL_POINTS else "svg",
+    )
+    return _to_json(fig, grain)
+
+
+@memoize(*views.LINES)
+def income_vs_expense_json(starting_savings: float, detail: bool = False) -> str:
+    import plotly.express as px
+
+    data, grain = downsample(
+        views.income_expense_long(starting_savings), flows=["amount"], by=["type"], detail=detail
+    )
+    fig = px.bar(data, x="month", y="amount", color="type", barmode="group")
+    return _to_json(fig, grain)
+
+
+@memoize(*views.LINES)
+def net_json(starting_savings: float, detail: bool = False) -> str:
+    import plotly.express as px
+
+    data, grain = downsample(views.monthly_summary(starting_savings), flows=["net"], detail=detail)
+    fig = px.bar(data, x="month", y="net")
+    return _to_json(fig, grain)
+
+
+@memoize(*views.LINES)
+def categories_json(line_type: str, detail: bool = False) -> str:
+    import plotly.express as px
+
+    data, grain = downsample(
+        _top_categories(views.category_long(line_type)), flows=["amount"], by=["category"], detail=detail
+    )
+    fig = px.bar(data, x="month", y="amount", color="category", barmode="stack")
+    return _to_json(fig, grain)
+
+
+@memoize("monthly_trends")
+def trend_json(flow: str = "expense") -> str:
+    """`flow` (income, expense or net) per month with its rolling averages."""
+    import plotly.express as px
+
+    from finance.analytics import TREND_WINDOWS
+
+    columns = {flow: "monthly", **{f"{flow}_avg_{w}": f"{w}-month average" for w in TREND_WINDOWS}}
+    data = (
+        views.trends()[["month", *columns]]
+        .rename(columns=columns)
+        .melt(id_vars=["month"], var_name="series", value_name="amount")
+    )
+    fig = px.line(
+        data, x="month", y="amount", color="series", render_mode="webgl" if len(data) > WEBGL_POINTS else "svg",
+    )
+    return _to_json(fig, "month")
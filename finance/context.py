@@ -0,0 +1,160 @@
+"""
+Runtime configuration for finance.* without a hard Streamlit dependency.
+
+A FinanceContext carries the database URL, the connection pool size and a
+process-local cache. finance.db resolves the active context in this order:
+  1. a context bound with `use_context(ctx)` (per thread / asyncio task)
+  2. a process default installed with `set_context(ctx)`
+  3. environment: FINANCE_DATABASE_URL or DATABASE_URL, FINANCE_DB_POOL_SIZE,
+     FINANCE_ADMIN_EMAILS, FINANCE_TENANT_ID, FINANCE_TENANT_PARTITIONS
+  4. Streamlit secrets (DATABASE_URL, optional DB_POOL_SIZE, ADMIN_EMAILS,
+     TENANT_PARTITIONS) when running under Streamlit
+
+Every finance.db query is scoped to one household (tenant). The tenant is
+bound per thread / task with `set_tenant` or `use_tenant` (the login sets it
+for each Streamlit rerun); otherwise the context's tenant_id is used.
+
+So batch jobs, CLIs, worker processes and benchmarks just set an env var (or
+pass a context), and the Streamlit pages keep working unchanged.
+"""
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from finance.cache import VersionedCache
+from finance.storage import Storage, storage_from_url
+
+DEFAULT_TENANT = "default"
+
+
+@dataclass
+class FinanceContext:
+    database_url: str
+    pool_size: int = 0
+    admin_emails: tuple[str, ...] = ()
+    tenant_id: str = DEFAULT_TENANT
+    tenant_partitions: int = 0  # Postgres HASH partitions per tenant-scoped table (0 = unpartitioned)
+    cache_listen: bool = True  # evict cache entries on other processes' writes (Postgres, see finance.notify)
+    cache: VersionedCache = field(default_factory=VersionedCache, repr=False, compare=False)
+    _storage: Storage | None = field(default=None, init=False, repr=False, compare=False)
+    _listener: object = field(default=None, init=False, repr=False, compare=False)
+
+    @property
+    def storage(self) -> Storage:
+        if self._storage is None:
+            self._storage = storage_from_url(
+                self.database_url, pool_size=self.pool_size, tenant_partitions=self.tenant_partitions
+            )
+        return self._storage
+
+    def is_admin(self, email: str | None) -> bool:
+        return bool(email) and email.lower().strip() in self.admin_emails
+
+    def close(self):
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+        if self._storage is not None:
+            self._storage.close()
+            self._storage = None
+
+    # Pools and caches stay in the parent; a worker process rebuilds its own.
+    def __getstate__(self):
+        return {
+            "database_url": self.database_url,
+            "pool_size": self.pool_size,
+            "admin_emails": self.admin_emails,
+            "tenant_id": self.tenant_id,
+            "tenant_partitions": self.tenant_partitions,
+            "cache_listen": self.cache_listen,
+        }
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    @classmethod
+    def from_env(cls, environ=None) -> "FinanceContext | None":
+        env = os.environ if environ is None else environ
+        url = env.get("FINANCE_DATABASE_URL") or env.get("DATABASE_URL")
+        if not url:
+            return None
+        return cls(
+            url,
+            pool_size=int(env.get("FINANCE_DB_POOL_SIZE", "0")),
+            admin_emails=_emails(env.get("FINANCE_ADMIN_EMAILS", "")),
+            tenant_id=env.get("FINANCE_TENANT_ID") or DEFAULT_TENANT,
+            tenant_partitions=int(env.get("FINANCE_TENANT_PARTITIONS", "0")),
+            cache_listen=env.get("FINANCE_CACHE_LISTEN", "1") != "0",
+        )
+
+    @classmethod
+    def from_streamlit(cls) -> "FinanceContext":
+        import streamlit as st
+        return cls(
+            st.secrets["DATABASE_URL"],
+            pool_size=int(st.secrets.get("DB_POOL_SIZE", 0)),
+            admin_emails=_emails(st.secrets.get("ADMIN_EMAILS", "")),
+            tenant_partitions=int(st.secrets.get("TENANT_PARTITIONS", 0)),
+            cache_listen=bool(st.secrets.get("CACHE_LISTEN", True)),
+        )
+
+
+def _emails(value: str) -> tuple[str, ...]:
+    return tuple(e.strip().lower() for e in value.split(",") if e.strip())
+
+
+_current: ContextVar[FinanceContext | None] = ContextVar("finance_context", default=None)
+_tenant: ContextVar[str | None] = ContextVar("finance_tenant", default=None)
+_default: FinanceContext | None = None
+
+
+def set_context(ctx: FinanceContext | None) -> None:
+    """Install the process-wide default context (None to re-resolve from env/secrets)."""
+    global _default
+    if _default is not None and _default is not ctx:
+        _default.close()
+    _default = ctx
+
+
+@contextmanager
+def use_context(ctx: FinanceContext):
+    """Bind ctx for the current thread / task only."""
+    token = _current.set(ctx)
+    try:
+        yield ctx
+    finally:
+        _current.reset(token)
+
+
+def get_context() -> FinanceContext:
+    global _default
+    ctx = _current.get()
+    if ctx is not None:
+        return ctx
+    if _default is None:
+        _default = FinanceContext.from_env() or FinanceContext.from_streamlit()
+    return _default
+
+
+def bound_context() -> FinanceContext | None:
+    """The context get_context() would return, if one is already bound or resolved (never reads env/secrets)."""
+    return _current.get() or _default
+
+
+def set_tenant(tenant_id: str | None) -> None:
+    """Scope finance.db to `tenant_id` for the rest of this thread / task (None: context default)."""
+    _tenant.set(tenant_id)
+
+
+@contextmanager
+def use_tenant(tenant_id: str):
+    token = _tenant.set(tenant_id)
+    try:
+        yield tenant_id
+    finally:
+        _tenant.reset(token)
+
+
+def current_tenant() -> str:
+    return _tenant.get() or get_context().tenant_id
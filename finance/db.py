@@ -1,155 +1,828 @@
-import pandas as pd
-import psycopg2
-import streamlit as st
+from __future__ import annotations
+
+import json
+from contextlib import contextmanager
+from dataclasses import dataclass, fields, replace
+from typing import TYPE_CHECKING
+
+from finance import meals, money, notify
+from finance.cache import memoize
+from finance.context import bound_context, current_tenant, get_context
+from finance.instrument import timed
+from finance.migrations import migrate
+from finance.storage import AMOUNT_CENTS_SQL, CATEGORY_JOIN_SQL, FX_JOIN_SQL, Storage, eur_sql
+
+# pandas and bcrypt are imported where they are used, so the login screen
+# (init_db + verify_user) renders without paying for them.
+#
+# Every query is scoped to current_tenant() (see finance.context); the tenant
+# leads each primary key, so a household's queries only touch its own rows.
+if TYPE_CHECKING:
+    import pandas as pd
 
 #######################################################
 # General DB functions
 #######################################################
+def get_storage() -> Storage:
+    """Backend of the active FinanceContext (see finance.context)."""
+    return get_context().storage
+
 def get_conn():
-    url = st.secrets["DATABASE_URL"]
-    return psycopg2.connect(url)
-
-def get_settings() -> dict:
-    with get_conn() as conn:
-        df = pd.read_sql("SELECT key, value FROM settings", conn)
-    return dict(zip(df["key"], df["value"]))
-
-def upsert_setting(key: str, value: str):
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute("""
-                INSERT INTO settings (key, value)
-                VALUES (%s, %s)
-                ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value
-            """, (key, value))
-        conn.commit()
-
-def get_or_create_settings() -> dict:
-    """
-    Ensures required settings exist in the DB (with defaults) and returns settings dict.
-    This preserves compatibility with older code that imports get_or_create_settings().
-    """
-    defaults = {
-        "starting_savings": "0",
-        "expense_categories": "Rent,Groceries,Transport,Utilities,Other",
-        "income_categories": "Salary,Other_income",
-    }
-
-    existing = get_settings()
-
-    # Insert any missing keys
-    for k, v in defaults.items():
-        if k not in existing:
-            upsert_setting(k, v)
-
-    # Return fresh merged settings
+    return get_storage().connect()
+
+def bump_data_versions(db: Storage, conn, tables, tenant_id: str | None = None) -> None:
+    """
+    Mark a tenant's tables as changed so finance.cache drops results derived
+    from them, here and (via NOTIFY on commit, see finance.notify) in other processes.
+    """
+    tenant_id = tenant_id or current_tenant()
+    db.executemany(conn, """
+        INSERT INTO data_versions (tenant_id, table_name, version)
+        VALUES (%s, %s, 1)
+        ON CONFLICT (tenant_id, table_name) DO UPDATE SET version = data_versions.version + 1
+    """, [(tenant_id, t) for t in tables])
+    db.notify(conn, notify.CHANNEL, notify.payload(tenant_id, tables))
+
+@contextmanager
+def _write(*tables: str):
+    """
+    Connection for a write that changes `tables` of the current tenant; bumps
+    their data versions in the same transaction. Yields (db, conn, tenant_id).
+    """
+    db = get_storage()
+    tenant_id = current_tenant()
+    with db.connection() as conn:
+        yield db, conn, tenant_id
+        bump_data_versions(db, conn, tables, tenant_id)
+    get_context().cache.invalidate(tenant_id, tables)
+
+@timed("db.load_data_versions")
+def load_data_versions() -> dict:
+    db = get_storage()
+    with db.connection() as conn:
+        return dict(db.fetchall(
+            conn, "SELECT table_name, version FROM data_versions WHERE tenant_id=%s", (current_tenant(),)
+        ))
+
+@timed("db.init_db")
+def init_db(db: Storage | None = None):
+    db = db or get_storage()
+    # Every page calls this on each rerun; only the first call per process
+    # checks the schema and applies pending migrations (finance.migrations).
+    if db.schema_ready:
+        return
+    with db.connection() as conn:
+        migrate(db, conn)
+    db.schema_ready = True
+    # Scripts pass their own storage and may have no app context to resolve.
+    ctx = bound_context()
+    if ctx is not None and db is ctx.storage:
+        notify.ensure_listener(ctx)
+
+
+#######################################################
+# Settings and categories
+#######################################################
+@dataclass(frozen=True)
+class Settings:
+    starting_savings: float = 0.0
+    passcode_enabled: bool = False
+    passcode: str = ""
+
+
+@dataclass(frozen=True)
+class Category:
+    id: int
+    kind: str  # "income" or "expense" (expense_tatiana / expense_ben lines use the expense list)
+    name: str
+    position: int
+    currency: str = "EUR"
+    archived: bool = False
+
+
+DEFAULT_CATEGORIES = {
+    "expense": ["Rent", "Groceries", "Transport", "Utilities", "Other"],
+    "income": ["Salary", "Other_income"],
+}
+
+# Currencies offered for categories; amounts are converted to the base (EUR)
+# with the rates in fx_rates.
+CURRENCIES = ["EUR", "RUB", "USD", "GBP", "CHF", "SEK", "NOK", "DKK", "PLN", "CZK", "HUF", "TRY", "JPY"]
+
+def category_kind(line_type: str) -> str:
+    return "income" if line_type == "income" else "expense"
+
+def default_currency(name: str) -> str:
+    """Currency proposed for a new category ("moscow" in the name means RUB, as before)."""
+    return "RUB" if "moscow" in name.lower() else "EUR"
+
+# Both lookups are memoized per data version, so pages read them from memory
+# instead of querying and re-parsing on every rerun. The values are frozen.
+@timed("db.get_settings")
+@memoize("household_settings")
+def get_settings() -> Settings:
+    db = get_storage()
+    with db.connection() as conn:
+        rows = db.fetchall(conn, """
+            SELECT starting_savings, passcode_enabled, passcode
+            FROM household_settings WHERE tenant_id=%s
+        """, (current_tenant(),))
+    if not rows:
+        return Settings()
+    starting_savings, passcode_enabled, passcode = rows[0]
+    return Settings(float(starting_savings), bool(passcode_enabled), passcode or "")
+
+@timed("db.update_settings")
+def update_settings(**changes) -> Settings:
+    """Change some settings fields, e.g. update_settings(starting_savings=1000.0)."""
+    new = replace(get_settings(), **changes)
+    names = [f.name for f in fields(Settings)]
+    with _write("household_settings") as (db, conn, tenant_id):
+        db.bulk_upsert(
+            conn, "household_settings", ["tenant_id", *names], ["tenant_id"],
+            [(tenant_id, float(new.starting_savings), bool(new.passcode_enabled), str(new.passcode))],
+        )
+    return new
+
+@timed("db.get_categories")
+@memoize("categories")
+def get_categories(kind: str, include_archived: bool = False) -> tuple[Category, ...]:
+    """Categories of one kind in display order."""
+    db = get_storage()
+    query = """
+        SELECT id, kind, name, position, currency, archived
+        FROM categories WHERE tenant_id=%s AND kind=%s
+    """
+    if not include_archived:
+        query += " AND NOT archived"
+    with db.connection() as conn:
+        rows = db.fetchall(conn, query + " ORDER BY position, id", (current_tenant(), kind))
+    return tuple(Category(int(i), k, n, int(p), c, bool(a)) for i, k, n, p, c, a in rows)
+
+def category_names(kind: str) -> list[str]:
+    return [c.name for c in get_categories(kind)]
+
+def _next_category_id(db: Storage, conn, tenant_id: str) -> int:
+    rows = db.fetchall(conn, "SELECT MAX(id) FROM categories WHERE tenant_id=%s", (tenant_id,))
+    return int(rows[0][0] or 0) + 1
+
+@timed("db.save_categories")
+def save_categories(kind: str, rows: list[dict]) -> None:
+    """
+    Store the ordered category list of one kind (e.g. from the Settings editor).
+    Each row has name, currency, archived and id (None for a new category); the
+    row order becomes the position. Renaming keeps the id, so monthly_lines
+    don't change. Categories left out are archived, not deleted, since old
+    lines still point at them.
+    """
+    with _write("categories") as (db, conn, tenant_id):
+        current = {
+            int(i): (n, c) for i, n, c in db.fetchall(
+                conn, "SELECT id, name, currency FROM categories WHERE tenant_id=%s AND kind=%s", (tenant_id, kind)
+            )
+        }
+        by_name = {n: i for i, (n, _) in current.items()}
+        next_id = _next_category_id(db, conn, tenant_id)
+
+        out, names = [], set()
+        for row in rows:
+            name = str(row.get("name") or "").strip()
+            if not name:
+                continue
+            if name in names:
+                raise ValueError(f"Duplicate {kind} category {name!r}")
+            names.add(name)
+            cid = row.get("id")
+            cid = int(cid) if cid is not None and cid == cid and int(cid) in current else by_name.get(name)
+            if cid is None:
+                cid, next_id = next_id, next_id + 1
+            elif by_name.get(name, cid) != cid:
+                raise ValueError(f"{kind.capitalize()} category {name!r} already exists")
+            currency = str(row.get("currency") or default_currency(name)).strip().upper()
+            out.append((tenant_id, cid, kind, name, len(out) + 1, currency, bool(row.get("archived") or False)))
+
+        kept = {r[1] for r in out}
+        for cid, (name, currency) in sorted(current.items()):
+            if cid not in kept:
+                out.append((tenant_id, cid, kind, name, len(out) + 1, currency, True))
+        db.bulk_upsert(
+            conn, "categories", ["tenant_id", "id", "kind", "name", "position", "currency", "archived"],
+            ["tenant_id", "id"], out,
+        )
+
+def _category_ids(db: Storage, conn, tenant_id: str, kind: str, names) -> dict[str, int]:
+    """Ids for category names of one kind; unknown names are added at the end of the list."""
+    ids = dict(db.fetchall(conn, "SELECT name, id FROM categories WHERE tenant_id=%s AND kind=%s", (tenant_id, kind)))
+    missing = [n for n in dict.fromkeys(names) if n not in ids]
+    if missing:
+        next_id = _next_category_id(db, conn, tenant_id)
+        rows = db.fetchall(conn, "SELECT MAX(position) FROM categories WHERE tenant_id=%s AND kind=%s", (tenant_id, kind))
+        position = int(rows[0][0] or 0)
+        new = []
+        for i, name in enumerate(missing, start=1):
+            ids[name] = next_id + i - 1
+            new.append((tenant_id, ids[name], kind, name, position + i, default_currency(name), False))
+        db.bulk_upsert(
+            conn, "categories", ["tenant_id", "id", "kind", "name", "position", "currency", "archived"],
+            ["tenant_id", "id"], new,
+        )
+        bump_data_versions(db, conn, ["categories"], tenant_id)
+    return ids
+
+@timed("db.get_or_create_settings")
+def get_or_create_settings() -> Settings:
+    """
+    Ensures the household has a settings row and default category lists, and
+    returns its settings. Kept for older code that imports get_or_create_settings().
+    """
+    tenant_id = current_tenant()
+    db = get_storage()
+    with db.connection() as conn:
+        have_settings = db.fetchall(conn, "SELECT 1 FROM household_settings WHERE tenant_id=%s", (tenant_id,))
+        have_categories = db.fetchall(conn, "SELECT 1 FROM categories WHERE tenant_id=%s LIMIT 1", (tenant_id,))
+    if not have_settings:
+        update_settings()
+    if not have_categories:
+        for kind, names in DEFAULT_CATEGORIES.items():
+            save_categories(kind, [{"name": n} for n in names])
     return get_settings()
 
-def set_setting(key: str, value: str):
-    return upsert_setting(key, value)
-
-def init_db():
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute("""
-            CREATE TABLE IF NOT EXISTS settings (
-                key TEXT PRIMARY KEY,
-                value TEXT NOT NULL
-            );
-            """)
-
-            cur.execute("""
-            CREATE TABLE IF NOT EXISTS monthly_lines (
-                month TEXT NOT NULL,
-                line_type TEXT NOT NULL,
-                category TEXT NOT NULL,
-                amount DOUBLE PRECISION NOT NULL,
-                PRIMARY KEY (month, line_type, category)
-            );
-            """)
-
-            cur.execute("""
-            CREATE TABLE IF NOT EXISTS monthly_fx (
-                month TEXT PRIMARY KEY,
-                rub_to_eur DOUBLE PRECISION NOT NULL
-            );
-            """)
-
-            cur.execute("""
-            CREATE TABLE IF NOT EXISTS weekly_plan (
-                day TEXT PRIMARY KEY,
-                anna_drop_off TEXT NOT NULL DEFAULT '',
-                anna_pick_up  TEXT NOT NULL DEFAULT '',
-                other_plans   TEXT NOT NULL DEFAULT '',
-                updated_at    TIMESTAMPTZ NOT NULL DEFAULT NOW()
-            );
-            """)
-
-            cur.execute("""
-            CREATE TABLE IF NOT EXISTS app_users (
-            email TEXT PRIMARY KEY,
-            password_hash TEXT NOT NULL,
-            is_active BOOLEAN NOT NULL DEFAULT TRUE
-            );
-            """)
-
-        conn.commit()
-
-
-def upsert_month_lines(month: str, line_type: str, lines: list[tuple[str, float]]):
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute("DELETE FROM monthly_lines WHERE month=%s AND line_type=%s", (month, line_type))
-            cur.executemany("""
-                INSERT INTO monthly_lines (month, line_type, category, amount)
-                VALUES (%s, %s, %s, %s)
-            """, [(month, line_type, cat, float(amt)) for cat, amt in lines])
-        conn.commit()
 
+#######################################################
+# Monthly lines and FX
+#######################################################
+@timed("db.upsert_month_lines")
+def upsert_month_lines(month: str, line_type: str, lines: list[tuple]):
+    """
+    Replace one month's lines of `line_type`; `lines` are (category name, amount)
+    in the category's currency, or (category name, amount, currency). Amounts
+    are in major units and stored as integer cents.
+    """
+    with _write("monthly_lines", "budget_status", "monthly_trends") as (db, conn, tenant_id):
+        kind = category_kind(line_type)
+        ids = _category_ids(db, conn, tenant_id, kind, [line[0] for line in lines])
+        currencies = dict(db.fetchall(
+            conn, "SELECT id, currency FROM categories WHERE tenant_id=%s AND kind=%s", (tenant_id, kind)
+        ))
+        db.execute(
+            conn, "DELETE FROM monthly_lines WHERE tenant_id=%s AND month=%s AND line_type=%s",
+            (tenant_id, month, line_type),
+        )
+        db.bulk_upsert(
+            conn, "monthly_lines",
+            ["tenant_id", "month", "line_type", "category_id", "amount_cents", "currency"],
+            ["tenant_id", "month", "line_type", "category_id"],
+            [
+                (tenant_id, month, line_type, ids[cat], money.to_cents(amt), rest[0] if rest else currencies[ids[cat]])
+                for cat, amt, *rest in lines
+            ],
+        )
+        db.refresh_fx_effective(conn, tenant_id, since=month)
+        db.refresh_budget_status(conn, tenant_id, month=month, line_type=line_type)
+        refresh_trends(db, conn, tenant_id, since=month, until=month)
+
+@timed("db.load_month_lines")
 def load_month_lines(month: str) -> pd.DataFrame:
-    with get_conn() as conn:
-        return pd.read_sql(
-            "SELECT month, line_type, category, amount FROM monthly_lines WHERE month=%s",
+    db = get_storage()
+    with db.connection() as conn:
+        return db.read_frame(conn, f"""
+            SELECT l.month, l.line_type, c.name AS category, l.currency, l.amount_cents
+            FROM monthly_lines l {CATEGORY_JOIN_SQL}
+            WHERE l.tenant_id=%s AND l.month=%s
+        """, (current_tenant(), month))
+
+@timed("db.load_all_lines")
+def load_all_lines() -> pd.DataFrame:
+    db = get_storage()
+    with db.connection() as conn:
+        return db.read_frame(conn, f"""
+            SELECT l.month, l.line_type, c.name AS category, l.currency, l.amount_cents
+            FROM monthly_lines l {CATEGORY_JOIN_SQL}
+            WHERE l.tenant_id=%s
+        """, (current_tenant(),))
+
+@timed("db.load_category_breakdown")
+def load_category_breakdown(line_type: str) -> pd.DataFrame:
+    """
+    Wide month x category EUR totals for one line_type, pivoted by the backend
+    (DuckDB PIVOT natively, SQL aggregate + pandas pivot elsewhere).
+    """
+    db = get_storage()
+    with db.connection() as conn:
+        return db.category_pivot(conn, current_tenant(), line_type)
+
+@timed("db.upsert_fx_rate")
+def upsert_fx_rate(month: str, rate_to_base: float, currency: str = "RUB"):
+    """Store how many EUR one unit of `currency` was worth in `month`."""
+    with _write("fx_rates", "budget_status", "monthly_trends") as (db, conn, tenant_id):
+        db.execute(conn, """
+            INSERT INTO fx_rates (tenant_id, currency, month, rate_e8)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (tenant_id, currency, month) DO UPDATE SET rate_e8 = EXCLUDED.rate_e8
+        """, (tenant_id, currency, month, money.to_rate(rate_to_base)))
+        db.refresh_fx_effective(conn, tenant_id, since=month)  # later months may carry this rate
+        db.refresh_budget_status(conn, tenant_id, since=month)
+        refresh_trends(db, conn, tenant_id, since=month)
+
+@timed("db.get_fx_rate")
+def get_fx_rate(month: str, currency: str = "RUB"):
+    """The rate in effect for `month`: its own, else the latest earlier one (None if there is none)."""
+    db = get_storage()
+    with db.connection() as conn:
+        rows = db.fetchall(conn, """
+            SELECT rate_e8 FROM fx_rates
+            WHERE tenant_id=%s AND currency=%s AND month <= %s
+            ORDER BY month DESC LIMIT 1
+        """, (current_tenant(), currency, month))
+    return money.from_rate(int(rows[0][0])) if rows else None
+
+@timed("db.load_all_fx")
+def load_all_fx() -> pd.DataFrame:
+    """All stored rates as (month, currency, rate_e8), rate_e8 = EUR per unit x money.FX_SCALE."""
+    db = get_storage()
+    with db.connection() as conn:
+        return db.read_frame(
+            conn, "SELECT month, currency, rate_e8 FROM fx_rates WHERE tenant_id=%s", (current_tenant(),)
+        )
+
+@timed("db.upsert_fx_rates")
+def upsert_fx_rates(rates: pd.DataFrame) -> int:
+    """Batch upsert of (month, currency, rate_to_base) rows, e.g. from finance.rates. Returns rows written."""
+    if rates.empty:
+        return 0
+    with _write("fx_rates", "budget_status", "monthly_trends") as (db, conn, tenant_id):
+        db.bulk_upsert(
+            conn, "fx_rates", ["tenant_id", "currency", "month", "rate_e8"], ["tenant_id", "currency", "month"],
+            [
+                (tenant_id, currency, month, money.to_rate(rate))
+                for month, currency, rate in rates[["month", "currency", "rate_to_base"]].itertuples(index=False)
+            ],
+        )
+        since = str(rates["month"].min())
+        db.refresh_fx_effective(conn, tenant_id, since=since)
+        db.refresh_budget_status(conn, tenant_id, since=since)
+        refresh_trends(db, conn, tenant_id, since=since)
+    return len(rates)
+
+@timed("db.missing_fx_rates")
+def missing_fx_rates() -> list[tuple[str, str]]:
+    """
+    (month, currency) pairs with non-zero lines in a foreign currency but no
+    rate of their own for it, oldest first. Anti-join on the fx_rates key.
+    """
+    db = get_storage()
+    with db.connection() as conn:
+        rows = db.fetchall(conn, """
+            SELECT DISTINCT l.month, l.currency
+            FROM monthly_lines l
+            WHERE l.tenant_id = %s AND l.currency <> 'EUR' AND l.amount_cents <> 0
+              AND NOT EXISTS (
+                  SELECT 1 FROM fx_rates r
+                  WHERE r.tenant_id = l.tenant_id AND r.currency = l.currency AND r.month = l.month
+              )
+            ORDER BY l.month, l.currency
+        """, (current_tenant(),))
+    return [(str(m), str(c)) for m, c in rows]
+
+#######################################################
+# Trends (finance.analytics, materialized in monthly_trends)
+#######################################################
+def refresh_trends(db: Storage, conn, tenant_id: str, since: str = "", until: str | None = None) -> None:
+    """
+    Recompute the tenant's monthly_trends rows that lines of months `since` ..
+    `until` (default: to the end) feed into: those months and the
+    TREND_LOOKBACK months after them. Only the totals those rows look back on
+    are read. Call after fx_effective is current.
+    """
+    from finance import analytics
+
+    last = analytics.shift_month(until, analytics.TREND_LOOKBACK) if until else None
+    first = analytics.shift_month(since, -analytics.TREND_LOOKBACK) if since else ""
+    where, params = "l.tenant_id = %s AND l.month >= %s", [tenant_id, first]
+    if last:
+        where += " AND l.month <= %s"
+        params.append(last)
+    long = db.read_frame(conn, f"""
+        SELECT l.month, l.line_type, SUM({AMOUNT_CENTS_SQL}) AS cents
+        FROM monthly_lines l
+        {FX_JOIN_SQL}
+        WHERE {where} AND l.line_type IN ({_placeholders(analytics.TREND_LINE_TYPES)})
+        GROUP BY l.month, l.line_type
+    """, (*params, *analytics.TREND_LINE_TYPES))
+    totals = (
+        long.astype({"cents": "int64"})
+        .pivot_table(index="month", columns="line_type", values="cents", aggfunc="sum", fill_value=0)
+        .reindex(columns=list(analytics.TREND_LINE_TYPES), fill_value=0)
+        .sort_index()
+    )
+    rows = analytics.trends(totals)
+    rows = rows[(rows["month"] >= since) & ((rows["month"] <= last) if last else True)]
+
+    delete = "DELETE FROM monthly_trends WHERE tenant_id = %s AND month >= %s"
+    if last:
+        delete += " AND month <= %s"
+    db.execute(conn, delete, (tenant_id, since, *([last] if last else [])))
+    db.bulk_upsert(
+        conn, "monthly_trends", ["tenant_id", *analytics.TREND_COLUMNS], ["tenant_id", "month"],
+        [
+            (tenant_id, r[0], *(None if v != v else float(v) for v in r[1:]))
+            for r in rows.itertuples(index=False, name=None)
+        ],
+    )
+
+@timed("db.load_trends")
+def load_trends() -> pd.DataFrame:
+    """All monthly_trends rows of the household, oldest first (see finance.analytics.trends)."""
+    from finance.analytics import TREND_COLUMNS
+
+    db = get_storage()
+    with db.connection() as conn:
+        frame = db.read_frame(
+            conn, f"SELECT {', '.join(TREND_COLUMNS)} FROM monthly_trends WHERE tenant_id=%s ORDER BY month",
+            (current_tenant(),),
+        )
+    return frame.astype({c: float for c in TREND_COLUMNS[1:]})  # all-NULL columns come back as object
+
+#######################################################
+# Budgets
+#######################################################
+# Whose spending a budget limits: the combined household lines or one person's.
+BUDGET_LINE_TYPES = {"expense": "Household", "expense_tatiana": "Tatiana", "expense_ben": "Ben"}
+
+@timed("db.load_budgets")
+def load_budgets() -> pd.DataFrame:
+    """Budgets as (line_type, category, limit) with limit in EUR per month."""
+    db = get_storage()
+    with db.connection() as conn:
+        return db.read_frame(conn, f"""
+            SELECT b.line_type, c.name AS category, {eur_sql("b.limit_cents")} AS "limit"
+            FROM budgets b JOIN categories c ON c.tenant_id = b.tenant_id AND c.id = b.category_id
+            WHERE b.tenant_id = %s
+            ORDER BY b.line_type, c.position, c.id
+        """, (current_tenant(),))
+
+@timed("db.save_budgets")
+def save_budgets(rows: list[dict]) -> None:
+    """
+    Replace the household's budgets with `rows` of line_type, category (an
+    expense category name) and limit (EUR per month; empty or 0 drops the row),
+    then recompute budget_status for every month.
+    """
+    with _write("budgets", "budget_status") as (db, conn, tenant_id):
+        ids = dict(db.fetchall(
+            conn, "SELECT name, id FROM categories WHERE tenant_id=%s AND kind='expense'", (tenant_id,)
+        ))
+        out = {}
+        for row in rows:
+            limit, name = row.get("limit"), str(row.get("category") or "").strip()
+            if limit is None or limit != limit or not limit or not name:
+                continue
+            line_type = row.get("line_type") or "expense"
+            if line_type not in BUDGET_LINE_TYPES:
+                raise ValueError(f"Unknown budget owner {line_type!r}")
+            if name not in ids:
+                raise ValueError(f"Unknown expense category {name!r}")
+            if (line_type, ids[name]) in out:
+                raise ValueError(f"{BUDGET_LINE_TYPES[line_type]} has two budgets for {name!r}")
+            if limit < 0:
+                raise ValueError(f"Budget for {name!r} must be positive")
+            out[(line_type, ids[name])] = (tenant_id, line_type, ids[name], money.to_cents(limit))
+        db.execute(conn, "DELETE FROM budgets WHERE tenant_id=%s", (tenant_id,))
+        db.bulk_upsert(conn, "budgets", ["tenant_id", "line_type", "category_id", "limit_cents"],
+                       ["tenant_id", "line_type", "category_id"], list(out.values()))
+        db.refresh_budget_status(conn, tenant_id)
+
+@timed("db.list_budget_months")
+def list_budget_months() -> list[str]:
+    """Months with a budget status, newest first."""
+    db = get_storage()
+    with db.connection() as conn:
+        rows = db.fetchall(
+            conn, "SELECT DISTINCT month FROM budget_status WHERE tenant_id=%s ORDER BY month DESC", (current_tenant(),)
+        )
+    return [str(r[0]) for r in rows]
+
+@timed("db.load_budget_status")
+def load_budget_status(month: str) -> pd.DataFrame:
+    """
+    Each budget against `month` from the precomputed budget_status: spent,
+    limit and remaining in EUR, over budget first.
+    """
+    db = get_storage()
+    with db.connection() as conn:
+        status = db.read_frame(conn, f"""
+            SELECT s.line_type, c.name AS category,
+                   {eur_sql("s.spent_cents")} AS spent,
+                   {eur_sql("s.limit_cents")} AS "limit",
+                   {eur_sql("s.limit_cents - s.spent_cents")} AS remaining,
+                   CASE WHEN s.spent_cents > s.limit_cents THEN 1 ELSE 0 END AS over_budget
+            FROM budget_status s JOIN categories c ON c.tenant_id = s.tenant_id AND c.id = s.category_id
+            WHERE s.tenant_id = %s AND s.month = %s
+            ORDER BY over_budget DESC, s.limit_cents - s.spent_cents, c.position
+        """, (current_tenant(), month))
+    return status.assign(over_budget=status["over_budget"].astype(bool))
+
+#######################################################
+# Paged table loaders (sorting, LIMIT/OFFSET in SQL)
+#######################################################
+SUMMARY_SORT_COLUMNS = ["month", "total_income", "total_expense", "net", "savings_start", "savings_end"]
+
+_SUMMARY_PAGE_SQL = f"""
+    WITH totals AS (
+        SELECT l.month,
+               SUM(CASE WHEN l.line_type = 'income' THEN {AMOUNT_CENTS_SQL} ELSE 0 END) AS income_cents,
+               SUM(CASE WHEN l.line_type = 'expense' THEN {AMOUNT_CENTS_SQL} ELSE 0 END) AS expense_cents
+        FROM monthly_lines l
+        {CATEGORY_JOIN_SQL}
+        {FX_JOIN_SQL}
+        WHERE l.tenant_id = %s AND l.line_type IN ('income', 'expense')
+        GROUP BY l.month
+    ), running AS (
+        SELECT month, income_cents, expense_cents, income_cents - expense_cents AS net_cents,
+               %s + SUM(income_cents - expense_cents)
+                    OVER (ORDER BY month ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW) AS end_cents
+        FROM totals
+    ), page AS (
+        SELECT month,
+               {eur_sql("income_cents")} AS total_income,
+               {eur_sql("expense_cents")} AS total_expense,
+               {eur_sql("net_cents")} AS net,
+               {eur_sql("end_cents - net_cents")} AS savings_start,
+               {eur_sql("end_cents")} AS savings_end
+        FROM running
+    )
+    SELECT * FROM page
+    ORDER BY {{order}}, month
+    LIMIT %s OFFSET %s
+"""
+
+def _direction(descending: bool) -> str:
+    return "DESC" if descending else "ASC"
+
+def _placeholders(values) -> str:
+    return ", ".join(["%s"] * len(values))
+
+@timed("db.count_months")
+def count_months(line_types: tuple[str, ...] = ("income", "expense")) -> int:
+    """Number of distinct months with lines of any of `line_types`."""
+    db = get_storage()
+    with db.connection() as conn:
+        rows = db.fetchall(
+            conn,
+            f"""
+            SELECT COUNT(DISTINCT month) FROM monthly_lines
+            WHERE tenant_id = %s AND line_type IN ({_placeholders(line_types)})
+            """,
+            (current_tenant(), *line_types),
+        )
+    return int(rows[0][0] or 0)
+
+@timed("db.list_categories")
+def list_categories(line_type: str) -> list[str]:
+    """Categories of one line_type, largest EUR total first."""
+    db = get_storage()
+    with db.connection() as conn:
+        rows = db.fetchall(conn, f"""
+            SELECT c.name
+            FROM monthly_lines l
+            {CATEGORY_JOIN_SQL}
+            {FX_JOIN_SQL}
+            WHERE l.tenant_id = %s AND l.line_type = %s
+            GROUP BY c.name
+            ORDER BY SUM({AMOUNT_CENTS_SQL}) DESC, c.name
+        """, (current_tenant(), line_type))
+    return [r[0] for r in rows]
+
+@timed("db.load_summary_page")
+def load_summary_page(
+    starting_savings: float, sort_by: str = "month", descending: bool = False, limit: int = 24, offset: int = 0
+) -> pd.DataFrame:
+    """
+    One page of the monthly summary (same numbers as metrics.monthly_summary).
+    Running savings come from a window sum in cents over all months, so any slice is exact.
+    """
+    if sort_by not in SUMMARY_SORT_COLUMNS:
+        raise ValueError(f"Cannot sort summary by {sort_by!r}")
+    db = get_storage()
+    with db.connection() as conn:
+        return db.read_frame(
             conn,
-            params=(month,)
+            _SUMMARY_PAGE_SQL.format(order=f"{sort_by} {_direction(descending)}"),
+            (current_tenant(), money.to_cents(starting_savings), int(limit), int(offset)),
         )
 
-def load_all_lines() -> pd.DataFrame:
-    with get_conn() as conn:
-        return pd.read_sql("SELECT month, line_type, category, amount FROM monthly_lines", conn)
-
-def upsert_fx_rate(month: str, rub_to_eur: float):
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute("""
-                INSERT INTO monthly_fx (month, rub_to_eur)
-                VALUES (%s, %s)
-                ON CONFLICT (month) DO UPDATE SET rub_to_eur = EXCLUDED.rub_to_eur
-            """, (month, float(rub_to_eur)))
-        conn.commit()
-
-def get_fx_rate(month: str):
-    with get_conn() as conn:
-        df = pd.read_sql("SELECT rub_to_eur FROM monthly_fx WHERE month=%s", conn, params=(month,))
-    return None if df.empty else float(df.iloc[0]["rub_to_eur"])
+@timed("db.load_category_page")
+def load_category_page(
+    line_type: str,
+    categories: tuple[str, ...],
+    sort_by: str = "month",
+    descending: bool = False,
+    limit: int = 24,
+    offset: int = 0,
+) -> pd.DataFrame:
+    """
+    One page of the month x category EUR table, restricted to `categories`.
+    sort_by is "month", "total" (sum of the selected categories) or one of them.
+    Months are ordered and sliced in SQL; only that slice is fetched and pivoted.
+    """
+    import pandas as pd
+
+    categories = tuple(categories)
+    columns = ["month", *categories]
+    if not categories:
+        return pd.DataFrame(columns=columns)
+    if sort_by != "month" and sort_by != "total" and sort_by not in categories:
+        raise ValueError(f"Cannot sort {line_type} categories by {sort_by!r}")
+
+    db = get_storage()
+    tenant_id = current_tenant()
+    with db.connection() as conn:
+        if sort_by == "month":
+            page = db.fetchall(conn, f"""
+                SELECT DISTINCT month FROM monthly_lines
+                WHERE tenant_id = %s AND line_type = %s
+                ORDER BY month {_direction(descending)}
+                LIMIT %s OFFSET %s
+            """, (tenant_id, line_type, int(limit), int(offset)))
+        else:
+            sort_cats = categories if sort_by == "total" else (sort_by,)
+            page = db.fetchall(conn, f"""
+                SELECT l.month
+                FROM monthly_lines l
+                {CATEGORY_JOIN_SQL}
+                {FX_JOIN_SQL}
+                WHERE l.tenant_id = %s AND l.line_type = %s
+                GROUP BY l.month
+                ORDER BY SUM(CASE WHEN c.name IN ({_placeholders(sort_cats)})
+                                  THEN {AMOUNT_CENTS_SQL} ELSE 0 END) {_direction(descending)},
+                         l.month
+                LIMIT %s OFFSET %s
+            """, (tenant_id, line_type, *sort_cats, int(limit), int(offset)))
+        months = [r[0] for r in page]
+        if not months:
+            return pd.DataFrame(columns=columns)
+
+        long = db.read_frame(conn, f"""
+            SELECT l.month, c.name AS category, {eur_sql(f"SUM({AMOUNT_CENTS_SQL})")} AS amount_eur
+            FROM monthly_lines l
+            {CATEGORY_JOIN_SQL}
+            {FX_JOIN_SQL}
+            WHERE l.tenant_id = %s AND l.line_type = %s
+              AND l.month IN ({_placeholders(months)})
+              AND c.name IN ({_placeholders(categories)})
+            GROUP BY l.month, c.name
+        """, (tenant_id, line_type, *months, *categories))
+
+    wide = long.pivot_table(index="month", columns="category", values="amount_eur", aggfunc="sum")
+    return (
+        wide.reindex(index=months, columns=list(categories))
+        .fillna(0.0)
+        .rename_axis(index="month", columns=None)
+        .reset_index()
+    )
 
-def load_all_fx() -> pd.DataFrame:
-    with get_conn() as conn:
-        return pd.read_sql("SELECT month, rub_to_eur FROM monthly_fx", conn)
+
+#######################################################
+# Meal plans and their ingredient index
+#######################################################
+MEAL_INDEX_COLUMNS = ["tenant_id", "ingredient", "week_start", "dietary_style", "day", "meal", "dish", "as_written"]
+
+def index_meal_plan(db: Storage, conn, tenant_id: str, week_start: str, dietary_style: str, plan: dict) -> None:
+    """Replace one plan's rows in the meal_ingredients index."""
+    db.execute(conn, "DELETE FROM meal_ingredients WHERE tenant_id=%s AND week_start=%s AND dietary_style=%s",
+               (tenant_id, week_start, dietary_style))
+    db.bulk_upsert(conn, "meal_ingredients", MEAL_INDEX_COLUMNS, MEAL_INDEX_COLUMNS[:6], [
+        (tenant_id, e.ingredient, week_start, dietary_style, e.day, e.meal, e.dish, e.as_written)
+        for e in meals.index_entries(plan)
+    ])
+
+def reindex_meal_plans(db: Storage, conn, tenant_id: str) -> None:
+    """Rebuild a tenant's meal_ingredients from the stored plans (e.g. after a sync or a normalizer change)."""
+    db.execute(conn, "DELETE FROM meal_ingredients WHERE tenant_id=%s", (tenant_id,))
+    rows = db.fetchall(conn, "SELECT week_start, dietary_style, plan FROM meal_plans WHERE tenant_id=%s", (tenant_id,))
+    for week_start, dietary_style, plan in rows:
+        index_meal_plan(db, conn, tenant_id, week_start, dietary_style, json.loads(plan))
+
+@timed("db.save_meal_plan")
+def save_meal_plan(week_start: str, dietary_style: str, plan: dict) -> None:
+    """Store (or replace) the plan for a week and dietary style, and index its ingredients."""
+    with _write("meal_plans", "meal_ingredients") as (db, conn, tenant_id):
+        db.execute(conn, """
+            INSERT INTO meal_plans (tenant_id, week_start, dietary_style, plan, updated_at)
+            VALUES (%s, %s, %s, %s, NOW())
+            ON CONFLICT (tenant_id, week_start, dietary_style) DO UPDATE SET
+                plan = EXCLUDED.plan,
+                updated_at = NOW()
+        """, (tenant_id, week_start, dietary_style, json.dumps(plan)))
+        index_meal_plan(db, conn, tenant_id, week_start, dietary_style, plan)
+
+@timed("db.list_meal_plans")
+def list_meal_plans() -> pd.DataFrame:
+    """Saved plans as (week_start, dietary_style, meals, ingredients), newest week first."""
+    db = get_storage()
+    with db.connection() as conn:
+        return db.read_frame(conn, """
+            SELECT p.week_start, p.dietary_style,
+                   COUNT(DISTINCT i.day || ' ' || i.meal) AS meals,
+                   COUNT(DISTINCT i.ingredient) AS ingredients
+            FROM meal_plans p
+            LEFT JOIN meal_ingredients i
+              ON i.tenant_id = p.tenant_id AND i.week_start = p.week_start AND i.dietary_style = p.dietary_style
+            WHERE p.tenant_id = %s
+            GROUP BY p.week_start, p.dietary_style
+            ORDER BY p.week_start DESC, p.dietary_style
+        """, (current_tenant(),))
+
+@timed("db.load_meal_plan")
+def load_meal_plan(week_start: str, dietary_style: str) -> dict | None:
+    db = get_storage()
+    with db.connection() as conn:
+        rows = db.fetchall(
+            conn, "SELECT plan FROM meal_plans WHERE tenant_id=%s AND week_start=%s AND dietary_style=%s",
+            (current_tenant(), week_start, dietary_style),
+        )
+    return json.loads(rows[0][0]) if rows else None
+
+@timed("db.load_meal_index")
+def load_meal_index(plans: list[tuple[str, str]]) -> list[meals.IndexEntry]:
+    """Index entries of the given (week_start, dietary_style) plans, for meals.shopping_list."""
+    if not plans:
+        return []
+    db = get_storage()
+    keys = " OR ".join(["(week_start=%s AND dietary_style=%s)"] * len(plans))
+    with db.connection() as conn:
+        rows = db.fetchall(conn, f"""
+            SELECT ingredient, day, meal, dish, as_written
+            FROM meal_ingredients
+            WHERE tenant_id=%s AND ({keys})
+        """, (current_tenant(), *[v for p in plans for v in p]))
+    return [meals.IndexEntry(*r) for r in rows]
+
+@timed("db.search_meal_plans")
+def search_meal_plans(query: str) -> pd.DataFrame:
+    """
+    Meals of all saved plans using an ingredient, answered from the
+    meal_ingredients index. The query is normalized like the index and
+    matches whole words, so "chicken" finds "chicken breast" but not "chickpea".
+    """
+    ingredient = meals.normalize_ingredient(query)
+    if not ingredient:
+        import pandas as pd
+        return pd.DataFrame(columns=["week_start", "dietary_style", "day", "meal", "dish", "ingredient", "as_written"])
+    db = get_storage()
+    with db.connection() as conn:
+        return db.read_frame(conn, f"""
+            SELECT week_start, dietary_style, day, meal, dish, ingredient, as_written
+            FROM meal_ingredients
+            WHERE tenant_id = %s
+              AND (ingredient = %s OR ingredient LIKE %s OR ingredient LIKE %s OR ingredient LIKE %s)
+            ORDER BY week_start DESC, dietary_style,
+                     CASE day {" ".join(f"WHEN '{d}' THEN {i}" for i, d in enumerate(meals.DAYS))} ELSE 99 END,
+                     CASE meal {" ".join(f"WHEN '{m}' THEN {i}" for i, m in enumerate(meals.MEALS))} ELSE 99 END
+        """, (current_tenant(), ingredient, f"{ingredient} %", f"% {ingredient}", f"% {ingredient} %"))
+
+#######################################################
+# Meal planner model calls (latency, tokens, outcome)
+#######################################################
+@timed("db.record_llm_calls")
+def record_llm_calls(calls: list[meals.LLMCall]) -> None:
+    """Store the accounting rows of a generation batch (see finance.meals.LLMCall)."""
+    if not calls:
+        return
+    with _write("llm_calls") as (db, conn, tenant_id):
+        db.bulk_upsert(conn, "llm_calls", ["tenant_id", *meals.LLM_CALL_COLUMNS], ["tenant_id", "call_id"], [
+            (tenant_id, *(getattr(c, f) for f in meals.LLM_CALL_COLUMNS)) for c in calls
+        ])
+
+@timed("db.load_llm_calls")
+def load_llm_calls(since: str | None = None) -> pd.DataFrame:
+    """Recorded model calls, oldest first; `since` is an ISO timestamp."""
+    db = get_storage()
+    query = f"SELECT {', '.join(meals.LLM_CALL_COLUMNS)} FROM llm_calls WHERE tenant_id = %s"
+    params: tuple = (current_tenant(),)
+    if since:
+        query += " AND called_at >= %s"
+        params += (since,)
+    with db.connection() as conn:
+        calls = db.read_frame(conn, query + " ORDER BY called_at", params)
+    return calls.astype({"cache_hit": bool, "latency_ms": float})
 
 ######################################################
 # Weekly Plan DB functions
 #####################################################
 
+@timed("db.load_weekly_plan")
 def load_weekly_plan() -> pd.DataFrame:
-    with get_conn() as conn:
-        df = pd.read_sql("""
+    db = get_storage()
+    with db.connection() as conn:
+        df = db.read_frame(conn, """
             SELECT
                 day AS "Day",
                 anna_drop_off AS "Anna drop off",
                 anna_pick_up  AS "Anna pick up",
                 other_plans   AS "Other plans"
             FROM weekly_plan
+            WHERE tenant_id = %s
             ORDER BY CASE day
                 WHEN 'Monday' THEN 1
                 WHEN 'Tuesday' THEN 2
@@ -157,10 +830,11 @@ def load_weekly_plan() -> pd.DataFrame:
                 WHEN 'Thursday' THEN 4
                 WHEN 'Friday' THEN 5
                 ELSE 99 END;
-        """, conn)
+        """, (current_tenant(),))
 
     # If table is empty for some reason, return default
     if df.empty:
+        import pandas as pd
         return pd.DataFrame({
             "Day": ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"],
             "Anna drop off": [""] * 5,
@@ -171,66 +845,79 @@ def load_weekly_plan() -> pd.DataFrame:
     return df
 
 
+@timed("db.upsert_weekly_plan")
 def upsert_weekly_plan(df: pd.DataFrame) -> None:
     # df must have columns: Day, Anna drop off, Anna pick up, Other plans
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            for _, r in df.iterrows():
-                cur.execute("""
-                    INSERT INTO weekly_plan(day, anna_drop_off, anna_pick_up, other_plans, updated_at)
-                    VALUES (%s, %s, %s, %s, NOW())
-                    ON CONFLICT (day) DO UPDATE SET
-                        anna_drop_off = EXCLUDED.anna_drop_off,
-                        anna_pick_up  = EXCLUDED.anna_pick_up,
-                        other_plans   = EXCLUDED.other_plans,
-                        updated_at    = NOW();
-                """, (
-                    r["Day"],
-                    str(r["Anna drop off"] or ""),
-                    str(r["Anna pick up"] or ""),
-                    str(r["Other plans"] or ""),
-                ))
-        conn.commit()
-
-
+    df = df.astype(object).where(df.notna(), "")
+    with _write("weekly_plan") as (db, conn, tenant_id):
+        db.executemany(conn, """
+            INSERT INTO weekly_plan(tenant_id, day, anna_drop_off, anna_pick_up, other_plans, updated_at)
+            VALUES (%s, %s, %s, %s, %s, NOW())
+            ON CONFLICT (tenant_id, day) DO UPDATE SET
+                anna_drop_off = EXCLUDED.anna_drop_off,
+                anna_pick_up  = EXCLUDED.anna_pick_up,
+                other_plans   = EXCLUDED.other_plans,
+                updated_at    = NOW();
+        """, [
+            (
+                tenant_id,
+                r["Day"],
+                str(r["Anna drop off"] or ""),
+                str(r["Anna pick up"] or ""),
+                str(r["Other plans"] or ""),
+            )
+            for _, r in df.iterrows()
+        ])
+
+
+@timed("db.clear_weekly_plan")
 def clear_weekly_plan() -> None:
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute("""
-                UPDATE weekly_plan
-                SET anna_drop_off = '',
-                    anna_pick_up  = '',
-                    other_plans   = '',
-                    updated_at    = NOW();
-            """)
-        conn.commit()
+    with _write("weekly_plan") as (db, conn, tenant_id):
+        db.execute(conn, """
+            UPDATE weekly_plan
+            SET anna_drop_off = '',
+                anna_pick_up  = '',
+                other_plans   = '',
+                updated_at    = NOW()
+            WHERE tenant_id = %s;
+        """, (tenant_id,))
 
 
 ######################################################
 # User authentication functions
 #####################################################
 
-import bcrypt
-
-def create_user(email: str, password: str):
+@timed("db.create_user")
+def create_user(email: str, password: str, tenant_id: str | None = None):
+    """Create or reset a login for a household (default: the current tenant)."""
+    import bcrypt
     pw_hash = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute("""
-                INSERT INTO app_users(email, password_hash)
-                VALUES (%s, %s)
-                ON CONFLICT (email) DO UPDATE SET password_hash=EXCLUDED.password_hash;
-            """, (email.lower().strip(), pw_hash))
-        conn.commit()
+    db = get_storage()
+    with db.connection() as conn:
+        db.execute(conn, """
+            INSERT INTO app_users(email, tenant_id, password_hash)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (email) DO UPDATE SET
+                tenant_id = EXCLUDED.tenant_id,
+                password_hash = EXCLUDED.password_hash;
+        """, (email.lower().strip(), tenant_id or current_tenant(), pw_hash))
+
+@timed("db.authenticate")
+def authenticate(email: str, password: str) -> str | None:
+    """Tenant id of an active login with this password, else None."""
+    db = get_storage()
+    with db.connection() as conn:
+        rows = db.fetchall(
+            conn, "SELECT password_hash, is_active, tenant_id FROM app_users WHERE email=%s", (email.lower().strip(),)
+        )
+    if not rows:
+        return None
+    pw_hash, is_active, tenant_id = rows[0]
+    if not is_active:
+        return None
+    import bcrypt
+    return tenant_id if bcrypt.checkpw(password.encode("utf-8"), pw_hash.encode("utf-8")) else None
 
+@timed("db.verify_user")
 def verify_user(email: str, password: str) -> bool:
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute("SELECT password_hash, is_active FROM app_users WHERE email=%s", (email.lower().strip(),))
-            row = cur.fetchone()
-    if not row:
-        return False
-    pw_hash, is_active = row
-    if not is_active:
-        return False
-    return bcrypt.checkpw(password.encode("utf-8"), pw_hash.encode("utf-8"))
+    return authenticate(email, password) is not None
@@ -1,7 +1,9 @@
 import numpy as np
 import pandas as pd
-from statsmodels.tsa.holtwinters import ExponentialSmoothing
 
+from finance.instrument import timed
+
+@timed("forecast.forecast_savings")
 def forecast_savings(
     monthly_df: pd.DataFrame,
     starting_savings: float,
@@ -25,6 +27,10 @@ def forecast_savings(
     # We'll forecast income and expense separately if enough data, else net only.
     n = len(df)
 
+    # statsmodels takes ~1.5s to import; only pay for it when a forecast actually runs
+    with timed("forecast.import_statsmodels"):
+        from statsmodels.tsa.holtwinters import ExponentialSmoothing
+
     def _safe_ets(series: pd.Series):
         # Minimal ETS config: no seasonality unless >= 24 months
         season = 12 if len(series) >= 24 else None
@@ -32,7 +38,8 @@ def forecast_savings(
             model = ExponentialSmoothing(series, trend="add", seasonal="add", seasonal_periods=12)
         else:
             model = ExponentialSmoothing(series, trend="add", seasonal=None)
-        fit = model.fit(optimized=True)
+        with timed("forecast.ets_fit"):
+            fit = model.fit(optimized=True)
         return fit
 
     # Forecast income & expense if enough points; else forecast net only
@@ -0,0 +1,185 @@
+"""
+Lightweight timers and counters for the hot paths of a page rerun.
+
+    @timed("db.load_all_lines")          # decorator
+    with timed("chart.savings"): ...     # context manager
+    count("db.query")                    # counter
+
+Each measurement goes into the current rerun (bound per thread/task with
+begin_rerun) and into process-wide totals. The last HISTORY reruns per page are
+kept for the admin timing panel. Optional exports, enabled by env var:
+  - FINANCE_METRICS_FILE: append one JSON line per finished rerun
+  - FINANCE_METRICS_PROM: rewrite a Prometheus text-format file with the totals
+Stdlib only, so importing it costs nothing.
+"""
+import functools
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+HISTORY = 20
+
+
+@dataclass
+class Rerun:
+    page: str
+    started: float = field(default_factory=time.time)
+    _t0: float = field(default_factory=time.perf_counter, repr=False)
+    last: float = 0.0  # seconds since start of the last recorded event
+    spans: dict = field(default_factory=lambda: defaultdict(lambda: [0, 0.0]))  # name -> [calls, seconds]
+    counters: dict = field(default_factory=lambda: defaultdict(int))
+    ended: bool = False
+
+    @property
+    def total(self) -> float:
+        return self.last
+
+    def as_dict(self) -> dict:
+        return {
+            "page": self.page,
+            "started": self.started,
+            "total_ms": round(self.total * 1000, 3),
+            "spans": {k: {"calls": c, "ms": round(s * 1000, 3)} for k, (c, s) in self.spans.items()},
+            "counters": dict(self.counters),
+        }
+
+
+_current: ContextVar[Rerun | None] = ContextVar("finance_rerun", default=None)
+_lock = threading.Lock()
+_history: dict[str, deque] = defaultdict(lambda: deque(maxlen=HISTORY))
+_span_totals: dict = defaultdict(lambda: [0, 0.0])
+_counter_totals: dict = defaultdict(int)
+
+
+# The rerun is updated under the lock too: finance.aio loads a page's data on
+# worker threads that all record into the same rerun.
+def _record_span(name: str, seconds: float):
+    run = _current.get()
+    with _lock:
+        t = _span_totals[name]
+        t[0] += 1
+        t[1] += seconds
+        if run is not None:
+            s = run.spans[name]
+            s[0] += 1
+            s[1] += seconds
+            run.last = max(run.last, time.perf_counter() - run._t0)
+
+
+def count(name: str, n: int = 1):
+    run = _current.get()
+    with _lock:
+        _counter_totals[name] += n
+        if run is not None:
+            run.counters[name] += n
+
+
+class timed:
+    """Time a block or a function under `name` (usable as decorator or context manager)."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _record_span(self.name, time.perf_counter() - self._t0)
+        return False
+
+    def __call__(self, fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _record_span(self.name, time.perf_counter() - t0)
+        return wrapper
+
+
+#######################################################
+# Reruns
+#######################################################
+def begin_rerun(page: str) -> Rerun:
+    """Start collecting for a new rerun of `page` in this thread/task."""
+    run = Rerun(page)
+    _current.set(run)
+    return run
+
+
+def end_rerun(run: Rerun | None = None) -> None:
+    """File a finished rerun into the page history and the optional exports."""
+    run = run or _current.get()
+    if run is None or run.ended:
+        return
+    run.ended = True
+    if _current.get() is run:
+        _current.set(None)
+    with _lock:
+        _history[run.page].append(run)
+    _export(run)
+
+
+def current_rerun() -> Rerun | None:
+    return _current.get()
+
+
+def history(page: str | None = None) -> dict[str, list[Rerun]]:
+    """Most recent finished reruns, newest last, per page (or just `page`)."""
+    with _lock:
+        if page is not None:
+            return {page: list(_history.get(page, ()))}
+        return {p: list(runs) for p, runs in _history.items()}
+
+
+def reset() -> None:
+    with _lock:
+        _history.clear()
+        _span_totals.clear()
+        _counter_totals.clear()
+    _current.set(None)
+
+
+#######################################################
+# Export
+#######################################################
+def prometheus_text() -> str:
+    """Process totals in Prometheus text exposition format."""
+    with _lock:
+        spans = {k: tuple(v) for k, v in _span_totals.items()}
+        counters = dict(_counter_totals)
+    lines = [
+        "# HELP finance_span_seconds_total Time spent in instrumented code.",
+        "# TYPE finance_span_seconds_total counter",
+    ]
+    lines += [f'finance_span_seconds_total{{name="{k}"}} {s:.6f}' for k, (_, s) in sorted(spans.items())]
+    lines += [
+        "# HELP finance_span_calls_total Calls of instrumented code.",
+        "# TYPE finance_span_calls_total counter",
+    ]
+    lines += [f'finance_span_calls_total{{name="{k}"}} {c}' for k, (c, _) in sorted(spans.items())]
+    lines += [
+        "# HELP finance_events_total Instrumentation counters.",
+        "# TYPE finance_events_total counter",
+    ]
+    lines += [f'finance_events_total{{name="{k}"}} {n}' for k, n in sorted(counters.items())]
+    return "\n".join(lines) + "\n"
+
+
+def _export(run: Rerun):
+    path = os.environ.get("FINANCE_METRICS_FILE")
+    if path:
+        with open(path, "a") as f:
+            f.write(json.dumps(run.as_dict()) + "\n")
+    prom = os.environ.get("FINANCE_METRICS_PROM")
+    if prom:
+        tmp = prom + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(prometheus_text())
+        os.replace(tmp, prom)
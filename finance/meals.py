@@ -0,0 +1,725 @@
+"""
+Weekly meal plans from the OpenAI chat completions API.
+
+One plan is one request (build_prompt -> JSON -> validate_plan). A batch of
+plans (several upcoming weeks, or several dietary variants of one week) runs
+concurrently on the async client:
+  - at most `concurrency` requests in flight (semaphore),
+  - each attempt bounded by `timeout` seconds,
+  - timeouts, connection errors, rate limits, 5xx and unparseable JSON are
+    retried up to `attempts` times with exponential backoff and jitter,
+  - plans are validated as they complete and handed to `on_result`,
+so a batch takes about as long as its slowest request rather than the sum.
+
+Each week is streamed: PlanStream validates every day the moment its JSON
+object closes, and days that fail (or never arrive) are re-requested one by
+one, so a bad day costs about a seventh of a regeneration.
+
+Every request (and every plan served from the in-process cache) is recorded
+as an LLMCall with its latency, token usage and outcome when the batch is
+given a `calls` list; finance.db.record_llm_calls stores them and llm_usage
+summarizes latency percentiles and spend per model.
+
+Saved plans are indexed by ingredient (finance.db.save_meal_plan): every
+key or fruit ingredient of every meal becomes an IndexEntry under its
+normalized name, which drives the shopping list and the search over past plans.
+
+    results = generate_plans_sync([PlanRequest(week, prompt) for ...], model, api_key=...)
+
+The client honours OPENAI_BASE_URL (or `base_url=`), so batches can run
+against a local fake server (see benchmarks/bench_meals.py). openai is
+imported on first use.
+"""
+from __future__ import annotations
+
+import asyncio
+import copy
+import json
+import random
+import re
+import time
+import uuid
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Iterator
+
+from finance.instrument import count, timed
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+MEALS = ["breakfast", "lunch", "dinner"]
+
+MAX_CONCURRENCY = 4
+REQUEST_TIMEOUT = 90.0  # seconds per attempt
+MAX_ATTEMPTS = 3
+BACKOFF_SECONDS = 1.0  # first retry waits about this long, doubling after
+SYSTEM_PROMPT = "You output only valid JSON."
+TEMPERATURE = 0.3
+CACHE_TTL = 24 * 60 * 60  # seconds a validated plan is reused for the same model and prompt
+# USD per million (prompt, completion) tokens, for the spend in llm_usage
+MODEL_PRICES = {"gpt-4.1-mini": (0.40, 1.60), "gpt-4.1": (2.00, 8.00)}
+
+
+#######################################################
+# Prompt and validation
+#######################################################
+def next_monday(d: date) -> date:
+    return d + timedelta(days=(7 - d.weekday()) % 7)  # weekday: Mon=0
+
+
+def week_starts(first: date, n: int) -> list[str]:
+    """ISO dates of `n` consecutive Mondays from the Monday on or after `first`."""
+    monday = next_monday(first)
+    return [(monday + timedelta(weeks=i)).isoformat() for i in range(n)]
+
+
+def build_prompt(
+    family_size: int,
+    dietary_style: str,
+    exclusions: str,
+    time_budget: str,
+    budget_level: str,
+    extra_notes: str,
+    week_start: str,
+) -> str:
+    return f"""
+You are a nutrition-focused meal planner.
+
+Create a 7-day meal plan starting on {week_start} (Monday to Sunday).
+The plan must be:
+- Low-fat overall (avoid frying; prefer grilling/baking/steaming; minimal added oils; lean proteins).
+- Highly nutritious (whole foods; vegetables; legumes; whole grains; lean proteins).
+- Include fruit every day (at least 1 serving/day; can be part of breakfast or meal).
+- Practical for a household of {family_size} people.
+- Dietary style preference: {dietary_style}.
+- Exclusions/allergies: {exclusions if exclusions.strip() else "none"}.
+- Time budget: {time_budget}.
+- Budget level: {budget_level}.
+- Notes: {extra_notes if extra_notes.strip() else "none"}.
+
+Return ONLY valid JSON that matches exactly this schema:
+
+{{
+  "week_start": "{week_start}",
+  "days": [
+    {{
+      "day": "Monday",
+      "breakfast": {{
+        "name": "...",
+        "key_ingredients": ["...", "..."],
+        "fruit_included": ["..."],
+        "prep_time_minutes": 0
+      }},
+      "lunch": {{
+        "name": "...",
+        "key_ingredients": ["...", "..."],
+        "fruit_included": ["..."],
+        "prep_time_minutes": 0
+      }},
+      "dinner": {{
+        "name": "...",
+        "key_ingredients": ["...", "..."],
+        "fruit_included": ["..."],
+        "prep_time_minutes": 0
+      }},
+      "nutrition_notes": ["1 short bullet", "1 short bullet"]
+    }}
+  ],
+  "overall_tips": ["...", "..."]
+}}
+
+Rules:
+- Exactly 7 elements in "days", in order Monday..Sunday.
+- Each day must include fruit in at least one meal. Put fruit items in that meal’s fruit_included list.
+- Keep names simple and family-friendly.
+- Keep prep_time_minutes realistic (5–45 typically).
+- Do NOT include any text before or after the JSON.
+- Do NOT wrap JSON in ``` fences.
+""".strip()
+
+
+def validate_day(index: int, day) -> tuple[bool, str]:
+    """Check one element of "days" (0 = Monday) against the schema."""
+    expected_day = DAYS[index]
+    if not isinstance(day, dict):
+        return False, f"Day {index+1} is not an object."
+    if day.get("day") != expected_day:
+        return False, f"Day {index+1} should be {expected_day}."
+    for meal in MEALS:
+        m = day.get(meal)
+        if not isinstance(m, dict):
+            return False, f"Missing {meal} for {expected_day}."
+        if not isinstance(m.get("name"), str) or not isinstance(m.get("key_ingredients"), list):
+            return False, f"{meal.capitalize()} on {expected_day} needs a name and key_ingredients."
+        if not isinstance(m.get("fruit_included", []), list) or not isinstance(m.get("prep_time_minutes"), (int, float)):
+            return False, f"{meal.capitalize()} on {expected_day} needs fruit_included and prep_time_minutes."
+    # fruit can be empty for a meal, but we need at least one fruit serving in the day overall
+    day_fruit = [f for meal in MEALS for f in day[meal].get("fruit_included", [])]
+    if not day_fruit:
+        return False, f"No fruit included on {expected_day}."
+    return True, "OK"
+
+
+def validate_plan(plan: dict) -> tuple[bool, str]:
+    if "days" not in plan or not isinstance(plan["days"], list) or len(plan["days"]) != 7:
+        return False, "Plan must contain exactly 7 days."
+    for i, day in enumerate(plan["days"]):
+        ok, message = validate_day(i, day)
+        if not ok:
+            return ok, message
+    return True, "OK"
+
+
+def try_parse_json(text: str) -> dict | None:
+    try:
+        return json.loads(text)
+    except Exception:
+        return None
+
+
+#######################################################
+# Call accounting and plan cache
+#######################################################
+@dataclass(frozen=True)
+class LLMCall:
+    call_id: str
+    called_at: str  # ISO 8601, UTC
+    kind: str  # "week" (streamed plan) or "day" (one re-requested day)
+    label: str
+    model: str
+    latency_ms: float
+    prompt_tokens: int | None  # None when the response never finished
+    completion_tokens: int | None
+    cache_hit: bool
+    outcome: str  # "ok", "invalid" (answered, failed validation) or "error"
+    detail: str  # validation message or error
+
+
+LLM_CALL_COLUMNS = list(LLMCall.__dataclass_fields__)
+
+# The batch's call list, visible to all of its tasks (they copy this context)
+_calls: ContextVar[list[LLMCall] | None] = ContextVar("meal_llm_calls", default=None)
+_plan_cache: dict[tuple[str, str], tuple[float, dict]] = {}
+
+
+def _record(kind: str, label: str, model: str, started: float, usage, outcome: str, detail: str = "",
+            cache_hit: bool = False) -> None:
+    calls = _calls.get()
+    if calls is None:
+        return
+    prompt_tokens, completion_tokens = usage or (None, None)
+    calls.append(LLMCall(
+        uuid.uuid4().hex, datetime.now(timezone.utc).isoformat(), kind, label, model,
+        (time.perf_counter() - started) * 1000, prompt_tokens, completion_tokens, cache_hit, outcome, detail,
+    ))
+
+
+def _usage(usage) -> tuple[int, int] | None:
+    return (usage.prompt_tokens, usage.completion_tokens) if usage is not None else None
+
+
+def cached_plan(model: str, prompt: str) -> dict | None:
+    """A copy of the validated plan generated for this model and prompt within CACHE_TTL, if any."""
+    hit = _plan_cache.get((model, prompt))
+    if hit is None or time.time() - hit[0] > CACHE_TTL:
+        return None
+    return copy.deepcopy(hit[1])
+
+
+def remember_plan(model: str, prompt: str, plan: dict) -> None:
+    now = time.time()
+    for key in [k for k, (stored, _) in _plan_cache.items() if now - stored > CACHE_TTL]:
+        _plan_cache.pop(key, None)
+    _plan_cache[(model, prompt)] = (now, copy.deepcopy(plan))
+
+
+def call_cost(model: str, prompt_tokens, completion_tokens) -> float:
+    """USD for one call at MODEL_PRICES; NaN for models without a price."""
+    if model not in MODEL_PRICES:
+        return float("nan")
+    prompt_price, completion_price = MODEL_PRICES[model]
+    return ((prompt_tokens or 0) * prompt_price + (completion_tokens or 0) * completion_price) / 1_000_000
+
+
+def llm_usage(calls):
+    """
+    Per model, from a frame of LLMCall rows: requests sent, cache hits and hit
+    rate (share of week calls answered from the cache, retries included),
+    p50/p95 latency of sent requests in ms, tokens, spend in USD and the share
+    of requests that failed validation or errored.
+    """
+    import pandas as pd
+
+    columns = ["model", "requests", "cache_hits", "hit_rate", "p50_ms", "p95_ms",
+               "prompt_tokens", "completion_tokens", "spend_usd", "invalid_rate", "error_rate"]
+    if calls is None or calls.empty:
+        return pd.DataFrame(columns=columns)
+    rows = []
+    for model, df in calls.groupby("model", sort=True):
+        hits = df["cache_hit"].astype(bool)
+        sent = df[~hits]
+        lookups = int((df["kind"] == "week").sum())
+        rows.append({
+            "model": model,
+            "requests": len(sent),
+            "cache_hits": int(hits.sum()),
+            "hit_rate": hits.sum() / lookups if lookups else float("nan"),
+            "p50_ms": sent["latency_ms"].quantile(0.5) if len(sent) else float("nan"),
+            "p95_ms": sent["latency_ms"].quantile(0.95) if len(sent) else float("nan"),
+            "prompt_tokens": int(sent["prompt_tokens"].fillna(0).sum()),
+            "completion_tokens": int(sent["completion_tokens"].fillna(0).sum()),
+            "spend_usd": call_cost(model, sent["prompt_tokens"].fillna(0).sum(), sent["completion_tokens"].fillna(0).sum()),
+            "invalid_rate": (sent["outcome"] == "invalid").mean() if len(sent) else float("nan"),
+            "error_rate": (sent["outcome"] == "error").mean() if len(sent) else float("nan"),
+        })
+    return pd.DataFrame(rows, columns=columns)
+
+
+#######################################################
+# Streaming parser
+#######################################################
+class PlanStream:
+    """
+    Incremental parser for a streamed plan. feed() scans each chunk once,
+    tracking strings and nesting; every element of the top-level "days" array
+    is parsed and checked with validate_day as soon as its closing brace
+    arrives, and every other top-level value (week_start, overall_tips) when
+    its comma or the closing brace does, so the complete text never has to be
+    parsed or walked again.
+    """
+
+    def __init__(self):
+        self.days: dict[int, dict] = {}  # index -> valid day
+        self.problems: dict[int, str] = {}  # index -> why it was rejected
+        self.complete = False  # the top-level object was closed
+        self.extras: dict = {}  # the other top-level fields, as they complete
+        self._text = ""
+        self._depth = 0
+        self._in_string = self._escape = False
+        self._string_start = 0
+        self._last_string = self._key = None
+        self._value_start = None  # start of the current top-level value other than "days"
+        self._days_depth = None  # depth inside the "days" array while in it
+        self._item_start = None
+        self._items = 0
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+    def feed(self, chunk: str) -> list[int]:
+        """Scan `chunk`; return the indices of the days it completed (valid or not)."""
+        offset = len(self._text)
+        self._text += chunk
+        finished = []
+        for k, ch in enumerate(chunk):
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_string = self._text[self._string_start:offset + k]
+            elif ch == '"':
+                self._in_string, self._string_start = True, offset + k + 1
+            elif ch == ":" and self._depth == 1:
+                self._key = self._last_string
+                self._value_start = None if self._key == "days" else offset + k + 1
+            elif ch == "," and self._depth == 1:
+                self._finish_value(offset + k)
+            elif ch in "{[":
+                if self._days_depth is not None and self._depth == self._days_depth and ch == "{":
+                    self._item_start = offset + k
+                self._depth += 1
+                if ch == "[" and self._depth == 2 and self._key == "days":
+                    self._days_depth = 2
+            elif ch in "}]":
+                self._depth -= 1
+                if self._days_depth is not None and self._depth == self._days_depth and ch == "}":
+                    finished.append(self._finish_day(self._text[self._item_start:offset + k + 1]))
+                elif self._days_depth is not None and self._depth == 1:
+                    self._days_depth = None  # end of "days"
+                elif self._depth == 0:
+                    self._finish_value(offset + k)
+                    self.complete = True
+        return finished
+
+    def _finish_value(self, end: int):
+        if self._value_start is None:
+            return
+        try:
+            self.extras[self._key] = json.loads(self._text[self._value_start:end])
+        except json.JSONDecodeError:
+            pass  # a malformed extra field is dropped, the days don't depend on it
+        self._value_start = None
+
+    def _finish_day(self, text: str) -> int:
+        index, self._items = self._items, self._items + 1
+        if index >= len(DAYS):
+            return index
+        try:
+            day = json.loads(text)
+        except json.JSONDecodeError:
+            self.problems[index] = f"{DAYS[index]} is not valid JSON."
+            return index
+        ok, message = validate_day(index, day)
+        if ok:
+            self.days[index] = day
+        else:
+            self.problems[index] = message
+        return index
+
+
+#######################################################
+# Concurrent generation
+#######################################################
+@dataclass(frozen=True)
+class PlanRequest:
+    label: str  # e.g. the week start or "2025-06-02 · Vegetarian"
+    prompt: str
+
+
+@dataclass(frozen=True)
+class PlanResult:
+    label: str
+    plan: dict | None  # None if every attempt failed
+    ok: bool  # plan arrived and passed validate_plan
+    message: str  # validation message or the last error
+    attempts: int  # requests for the whole week
+    seconds: float
+    redone: tuple[str, ...] = ()  # days re-requested on their own
+
+
+def async_client(api_key: str | None = None, base_url: str | None = None):
+    """AsyncOpenAI without its own retries (generate_plan retries with backoff)."""
+    from openai import AsyncOpenAI
+
+    return AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+
+
+def _retryable(exc: BaseException) -> bool:
+    import openai
+
+    if isinstance(exc, (asyncio.TimeoutError, json.JSONDecodeError)):
+        return True
+    if isinstance(exc, (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    return isinstance(exc, openai.APIStatusError) and exc.status_code >= 500
+
+
+def _describe(exc: BaseException) -> str:
+    return f"{type(exc).__name__}: {exc}" if str(exc) else type(exc).__name__
+
+
+def backoff_delay(attempt: int, base: float = BACKOFF_SECONDS) -> float:
+    """Seconds before retry number `attempt` (1, 2, ...): base * 2**(attempt-1), +-50% jitter."""
+    return base * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+
+
+def _messages(prompt: str) -> list[dict]:
+    return [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": prompt}]
+
+
+async def stream_plan(
+    client, prompt: str, model: str, parser: PlanStream, timeout: float = REQUEST_TIMEOUT,
+) -> tuple[int, int] | None:
+    """
+    Stream one week into `parser`; returns (prompt, completion) tokens.
+    Raises on timeout or API error, keeping the days already parsed.
+    """
+
+    async def consume():
+        usage = None
+        stream = await client.chat.completions.create(
+            model=model,
+            messages=_messages(prompt),
+            temperature=TEMPERATURE,
+            response_format={"type": "json_object"},
+            stream=True,
+            stream_options={"include_usage": True},  # sent in a last chunk without choices
+            timeout=timeout,
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                parser.feed(chunk.choices[0].delta.content)
+            if chunk.usage is not None:
+                usage = _usage(chunk.usage)
+        return usage
+
+    return await asyncio.wait_for(consume(), timeout)
+
+
+def build_day_prompt(prompt: str, index: int, problem: str) -> str:
+    """Ask again for one day of the week described by `prompt`."""
+    day = DAYS[index]
+    return f"""{prompt}
+
+Only {day} is needed now: the previous answer for it was rejected ({problem}).
+Return ONLY the JSON object for {day}, i.e. one element of "days" with "day": "{day}", following the same schema and rules.
+""".strip()
+
+
+async def request_day(
+    client, prompt: str, index: int, problem: str, model: str, timeout: float = REQUEST_TIMEOUT,
+) -> tuple[dict, tuple[int, int] | None]:
+    """
+    (day, (prompt, completion) tokens) as a plain (non-streamed) completion;
+    raises on timeout, API error or bad JSON.
+    """
+    resp = await asyncio.wait_for(
+        client.chat.completions.create(
+            model=model,
+            messages=_messages(build_day_prompt(prompt, index, problem)),
+            temperature=TEMPERATURE,
+            response_format={"type": "json_object"},
+            timeout=timeout,
+        ),
+        timeout,
+    )
+    day = json.loads(resp.choices[0].message.content)
+    if isinstance(day, dict) and "day" not in day and isinstance(day.get("days"), list) and len(day["days"]) == 1:
+        day = day["days"][0]  # answered as a one-day plan
+    return day, _usage(resp.usage)
+
+
+async def redo_day(
+    client, label: str, prompt: str, index: int, problem: str, model: str, semaphore: asyncio.Semaphore,
+    timeout: float = REQUEST_TIMEOUT, attempts: int = MAX_ATTEMPTS, backoff: float = BACKOFF_SECONDS,
+) -> tuple[dict | None, str]:
+    """(valid day or None, last problem), re-requesting until it validates or attempts run out."""
+    label = f"{label} · {DAYS[index]}"
+    for attempt in range(1, attempts + 1):
+        started = time.perf_counter()
+        try:
+            async with semaphore:
+                count("meals.day_request")
+                started = time.perf_counter()
+                day, usage = await request_day(client, prompt, index, problem, model, timeout)
+        except Exception as exc:
+            _record("day", label, model, started, None, "error", _describe(exc))
+            if not _retryable(exc):
+                return None, _describe(exc)
+            problem = _describe(exc)
+        else:
+            ok, message = validate_day(index, day)
+            _record("day", label, model, started, usage, "ok" if ok else "invalid", message)
+            if ok:
+                return day, "OK"
+            problem = message
+        if attempt < attempts:
+            await asyncio.sleep(backoff_delay(attempt, backoff))
+    return None, problem
+
+
+async def generate_plan(
+    client,
+    request: PlanRequest,
+    model: str,
+    semaphore: asyncio.Semaphore,
+    timeout: float = REQUEST_TIMEOUT,
+    attempts: int = MAX_ATTEMPTS,
+    backoff: float = BACKOFF_SECONDS,
+    use_cache: bool = True,
+) -> PlanResult:
+    """
+    Stream one week, validating days as they arrive; then re-request only the
+    days that were invalid or missing, concurrently. The week itself is
+    retried (with backoff) only while no valid day has arrived. Semaphore
+    slots are held only while a request is in flight. With `use_cache`, a
+    plan validated for the same model and prompt within CACHE_TTL is reused.
+    """
+    t0 = time.perf_counter()
+    if use_cache:
+        plan = cached_plan(model, request.prompt)
+        count("meals.cache_hit" if plan is not None else "meals.cache_miss")
+        if plan is not None:
+            _record("week", request.label, model, t0, (0, 0), "ok", "OK", cache_hit=True)
+            return PlanResult(request.label, plan, True, "OK (cached)", 0, time.perf_counter() - t0)
+    error = "no attempt made"
+    for attempt in range(1, attempts + 1):
+        parser = PlanStream()
+        started = time.perf_counter()
+        try:
+            async with semaphore:
+                count("meals.request")
+                started = time.perf_counter()
+                usage = await stream_plan(client, request.prompt, model, parser, timeout)
+            invalid = [parser.problems.get(i, f"{DAYS[i]} was missing.") for i in range(len(DAYS)) if i not in parser.days]
+            _record("week", request.label, model, started, usage, "invalid" if invalid else "ok", " ".join(invalid) or "OK")
+        except Exception as exc:
+            _record("week", request.label, model, started, None, "error", _describe(exc))
+            if not _retryable(exc):
+                count("meals.failed")
+                return PlanResult(request.label, None, False, _describe(exc), attempt, time.perf_counter() - t0)
+            error = _describe(exc)
+            if not parser.days and attempt < attempts:
+                count("meals.retry")
+                await asyncio.sleep(backoff_delay(attempt, backoff))
+                continue
+        break
+    if not parser.days and not parser.complete:
+        count("meals.failed")
+        return PlanResult(request.label, None, False, error, attempts, time.perf_counter() - t0)
+
+    days = dict(parser.days)
+    bad = {i: parser.problems.get(i, f"{DAYS[i]} was missing.") for i in range(len(DAYS)) if i not in days}
+    problems = []
+    if bad:
+        count("meals.day_redone", len(bad))
+        redone = await asyncio.gather(*(
+            redo_day(client, request.label, request.prompt, i, problem, model, semaphore, timeout, attempts, backoff)
+            for i, problem in bad.items()
+        ))
+        for i, (day, problem) in zip(bad, redone):
+            if day is None:
+                problems.append(problem)
+            else:
+                days[i] = day
+    plan = {**parser.extras, "days": [days[i] for i in sorted(days)]}
+    seconds = time.perf_counter() - t0
+    redone_days = tuple(DAYS[i] for i in bad)
+    if problems:
+        count("meals.failed")
+        return PlanResult(request.label, plan, False, " ".join(problems), attempt, seconds, redone_days)
+    message = f"OK (re-requested {', '.join(redone_days)})" if redone_days else "OK"
+    remember_plan(model, request.prompt, plan)
+    return PlanResult(request.label, plan, True, message, attempt, seconds, redone_days)
+
+
+async def generate_plans(
+    requests: list[PlanRequest],
+    model: str,
+    client=None,
+    concurrency: int = MAX_CONCURRENCY,
+    timeout: float = REQUEST_TIMEOUT,
+    attempts: int = MAX_ATTEMPTS,
+    backoff: float = BACKOFF_SECONDS,
+    on_result: Callable[[PlanResult], None] | None = None,
+    api_key: str | None = None,
+    base_url: str | None = None,
+    use_cache: bool = True,
+    calls: list[LLMCall] | None = None,
+) -> list[PlanResult]:
+    """
+    Generate all `requests` concurrently. `on_result` sees each validated
+    result as soon as it completes; the returned list is in request order.
+    Pass a list as `calls` to have an LLMCall appended for every request.
+    """
+    client = client or async_client(api_key, base_url)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def indexed(i: int, request: PlanRequest) -> tuple[int, PlanResult]:
+        return i, await generate_plan(client, request, model, semaphore, timeout, attempts, backoff, use_cache)
+
+    token = _calls.set(calls)
+    try:
+        results: list[PlanResult | None] = [None] * len(requests)
+        for done in asyncio.as_completed([indexed(i, r) for i, r in enumerate(requests)]):
+            i, result = await done
+            results[i] = result
+            if on_result is not None:
+                on_result(result)
+    finally:
+        _calls.reset(token)
+    return results
+
+
+#######################################################
+# Ingredient index and shopping list
+#######################################################
+_PARENTHESES = re.compile(r"\([^)]*\)")
+_QUANTITY = re.compile(
+    r"^(?:an?\s+|[\d½¼¾⅓⅔/.,-]+\s*)?"
+    r"(?:(?:g|kg|grams?|ml|l|litres?|liters?|cups?|tbsp|tsp|tablespoons?|teaspoons?|cloves?|slices?|cans?"
+    r"|tins?|handfuls?|pinch(?:es)?|bunch(?:es)?|pieces?|pcs|oz|lbs?)\b\.?\s*)?"
+    r"(?:of\s+)?"
+)
+_PREPARATION = {
+    "fresh", "chopped", "diced", "sliced", "grated", "minced", "cooked", "frozen", "dried", "raw",
+    "ripe", "large", "small", "medium", "steamed", "roasted", "baked", "grilled", "boiled", "mixed",
+}
+_NOT_PLURAL = {"oats", "greens", "hummus", "couscous", "asparagus", "molasses", "swiss", "brussels", "lentils"}
+
+
+def _singular(word: str) -> str:
+    if word in _NOT_PLURAL or len(word) <= 3 or word.endswith(("ss", "us", "is")):
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith(("oes", "ches", "shes", "xes")):
+        return word[:-2]
+    return word[:-1] if word.endswith("s") else word
+
+
+def normalize_ingredient(name: str) -> str:
+    """
+    Index key for an ingredient as the model wrote it: lower case, without
+    quantities, units, parenthesised notes, trailing ", chopped"-style
+    remarks or leading preparation words, last word singular.
+    "2 cups Cherry Tomatoes (halved)" -> "cherry tomato". "" if nothing is left.
+    """
+    text = _PARENTHESES.sub(" ", str(name).lower()).split(",")[0]
+    text = re.sub(r"[^\w\s½¼¾⅓⅔/.'-]|_", " ", text)
+    text = _QUANTITY.sub("", text.strip())
+    words = re.sub(r"[^\w\s'-]|_|\d", " ", text).split()
+    while words and words[0] in _PREPARATION:
+        words = words[1:]
+    if words:
+        words[-1] = _singular(words[-1])
+    return " ".join(words)
+
+
+@dataclass(frozen=True)
+class IndexEntry:
+    ingredient: str  # normalize_ingredient(as_written)
+    day: str
+    meal: str  # breakfast / lunch / dinner
+    dish: str
+    as_written: str
+
+
+def index_entries(plan: dict) -> Iterator[IndexEntry]:
+    """One entry per distinct ingredient of each of the plan's 21 meals (key ingredients and fruit)."""
+    for day in plan.get("days", []):
+        for meal in MEALS:
+            m = day.get(meal) or {}
+            seen = set()
+            for raw in [*m.get("key_ingredients", []), *m.get("fruit_included", [])]:
+                ingredient = normalize_ingredient(raw)
+                if ingredient and ingredient not in seen:
+                    seen.add(ingredient)
+                    yield IndexEntry(ingredient, day.get("day", ""), meal, m.get("name", ""), str(raw).strip())
+
+
+def shopping_list(entries) -> list[dict]:
+    """
+    Aggregate index entries (one plan's, or several weeks') into one row per
+    ingredient: how many meals use it, on which days, and how the plans
+    spelled it. Most used first.
+    """
+    items: dict[str, dict] = {}
+    for e in entries:
+        item = items.setdefault(e.ingredient, {"ingredient": e.ingredient, "meals": 0, "days": [], "as_written": []})
+        item["meals"] += 1
+        if e.day not in item["days"]:
+            item["days"].append(e.day)
+        if e.as_written not in item["as_written"]:
+            item["as_written"].append(e.as_written)
+    order = {d: i for i, d in enumerate(DAYS)}
+    rows = sorted(items.values(), key=lambda r: (-r["meals"], r["ingredient"]))
+    return [
+        {
+            **r,
+            "days": ", ".join(d[:3] for d in sorted(r["days"], key=lambda d: order.get(d, len(DAYS)))),
+            "as_written": "; ".join(r["as_written"]),
+        }
+        for r in rows
+    ]
+
+
+def generate_plans_sync(requests: list[PlanRequest], model: str, **kwargs) -> list[PlanResult]:
+    """Blocking wrapper for scripts without a running event loop (Streamlit pages)."""
+    with timed("meals.generate_plans"):
+        return asyncio.run(generate_plans(requests, model, **kwargs))
@@ -1,69 +1,183 @@
+"""
+Pure aggregation core: every function takes frames in and returns a new frame,
+with no database or Streamlit access. Results depend only on the inputs, so
+callers can cache them by content (e.g. st.cache_data) or run them in bulk.
+
+Currency rule: every line carries the currency it was entered in (lines from
+load_all_lines have a currency column; frames without one fall back to the old
+name rule, a category containing "moscow" is RUB). Amounts are converted to the
+base currency (EUR) with the rate of the line's month, or the latest earlier
+rate of that currency when the month has none. A foreign line with no rate at or
+before its month converts to 0 (finance.db.missing_fx_rates lists the gaps).
+
+Money is int64 throughout (see finance.money): amounts in cents, rates scaled
+by FX_SCALE, each converted line rounded half away from zero like the SQL in
+finance.storage. Sums are exact; results turn into EUR floats only at the end.
+Frames with a float `amount` column (major units) are still accepted.
+"""
+import numpy as np
 import pandas as pd
-from finance.db import load_all_fx
 
+from finance import money
+from finance.instrument import timed
+from finance.money import CENTS, FX_SCALE
 
-def monthly_summary(all_lines: pd.DataFrame, starting_savings: float) -> pd.DataFrame:
-    if all_lines.empty:
-        return pd.DataFrame(columns=["month", "total_income", "total_expense", "net", "savings_end"])
+BASE_CURRENCY = "EUR"
+FX_COLUMNS = ["month", "currency", "rate_e8"]
+SUMMARY_COLUMNS = ["month", "total_income", "total_expense", "net", "savings_start", "savings_end"]
 
-    df = all_lines.copy()
-    df["amount"] = df["amount"].astype(float)
 
-    # Load FX rates
-    fx = load_all_fx()  # month, rub_to_eur
-    df = df.merge(fx, on="month", how="left")
+def is_rub_category(cat: str) -> bool:
+    return "moscow" in (cat or "").strip().lower()
 
-    # Currency mapping (simple + explicit)
-    # Treat amount for salary_moscow as RUB; convert to EUR using that month’s rate.
-    is_rub = (df["line_type"] == "income") & (df["category"].str.lower().str.contains("salary_moscow", na=False))
 
+def _scaled(values, scale) -> np.ndarray:
+    # Delegates to finance.money so arrays round exactly like single values
+    # (half away from zero on the typed decimal); once per distinct value.
+    values = np.asarray(values, dtype=float)
+    uniques, inverse = np.unique(values, return_inverse=True)
+    scaled = np.fromiter((scale(v) for v in uniques.tolist()), dtype=np.int64, count=len(uniques))
+    return scaled[inverse].reshape(values.shape)
 
-    # If missing fx for any month where RUB exists, raise a helpful error later in UI
-    df["amount_eur"] = df["amount"]
-    df.loc[is_rub, "amount_eur"] = df.loc[is_rub, "amount"] * df.loc[is_rub, "rub_to_eur"]
 
-    pivot = (
-        df.groupby(["month", "line_type"], as_index=False)["amount_eur"].sum()
-        .pivot(index="month", columns="line_type", values="amount_eur")
-        .fillna(0.0)
-        .reset_index()
-        .sort_values("month")
+def to_cents(values) -> np.ndarray:
+    """Major units -> int64 cents, rounded like finance.money.to_cents."""
+    return _scaled(values, money.to_cents)
+
+
+def convert_cents(cents, rates) -> np.ndarray:
+    """int64 cents x rates scaled by FX_SCALE -> base-currency cents, rounded half away from zero."""
+    product = np.asarray(cents, dtype=np.int64) * np.asarray(rates, dtype=np.int64)
+    q = (np.abs(product) + FX_SCALE // 2) // FX_SCALE
+    return np.where(product < 0, -q, q)
+
+
+def _line_cents(lines: pd.DataFrame) -> np.ndarray:
+    if "amount_cents" in lines.columns:
+        return lines["amount_cents"].to_numpy(dtype=np.int64)
+    return to_cents(lines["amount"])
+
+
+def _line_currency(lines: pd.DataFrame) -> pd.Series:
+    if "currency" in lines.columns:
+        return lines["currency"]
+    # Few distinct categories, many rows: test each name once, then broadcast by code.
+    codes, uniques = pd.factorize(lines["category"])
+    names = np.array(["RUB" if is_rub_category(str(c)) else BASE_CURRENCY for c in uniques] + [BASE_CURRENCY])
+    return pd.Series(names[codes], index=lines.index)  # code -1 (missing) -> index -1 -> base
+
+
+def _fx_long(fx: pd.DataFrame | None) -> pd.DataFrame:
+    """
+    fx as (month, currency, rate_e8). Float rates (rate_to_base, or the legacy
+    (month, rub_to_eur) shape for RUB) are scaled to integers.
+    """
+    if fx is None or fx.empty:
+        return pd.DataFrame(columns=FX_COLUMNS)
+    if "rate_e8" in fx.columns:
+        return fx[FX_COLUMNS]
+    if "currency" in fx.columns:
+        currency, rate = fx["currency"], fx["rate_to_base"]
+    else:
+        currency = "RUB"
+        rate = fx["rub_to_eur" if "rub_to_eur" in fx.columns else [c for c in fx.columns if c != "month"][0]]
+    scaled = _scaled(rate.to_numpy(dtype=float), money.to_rate)
+    return pd.DataFrame({"month": fx["month"], "currency": currency, "rate_e8": scaled})
+
+
+def _rate_grid(fx: pd.DataFrame | None, months: pd.Index, currencies: pd.Index) -> np.ndarray:
+    """
+    int64 months x currencies array of scaled rates to the base currency,
+    forward-filled over time; FX_SCALE for the base currency, 0 where no rate
+    exists yet.
+    """
+    rates = _fx_long(fx)
+    grid = (
+        rates.pivot_table(index="month", columns="currency", values="rate_e8", aggfunc="last")
+        .reindex(columns=currencies)
     )
+    calendar = grid.index.union(months)  # YYYY-MM sorts chronologically
+    grid = grid.reindex(calendar).ffill().reindex(months)
+    if BASE_CURRENCY in grid.columns:
+        grid[BASE_CURRENCY] = FX_SCALE
+    # Missing cells make the frame float64 meanwhile; rates < 2**53 come back exactly.
+    return grid.fillna(0).to_numpy(dtype=float).astype(np.int64)
 
-    if "income" not in pivot.columns:
-        pivot["income"] = 0.0
-    if "expense" not in pivot.columns:
-        pivot["expense"] = 0.0
 
-    pivot = pivot.rename(columns={"income": "total_income", "expense": "total_expense"})
-    pivot["net"] = pivot["total_income"] - pivot["total_expense"]
+@timed("metrics.apply_fx")
+def apply_fx(lines: pd.DataFrame, fx: pd.DataFrame | None) -> pd.DataFrame:
+    """
+    Return lines with an amount_eur_cents (int64) column. One gather from the
+    month x currency rate grid, so the cost does not depend on how many
+    currencies there are.
+    """
+    if lines is None or lines.empty:
+        cols = list(lines.columns) if lines is not None else ["month", "line_type", "category", "amount_cents"]
+        return pd.DataFrame(columns=cols + ["amount_eur_cents"])
 
-    savings = []
-    cur = float(starting_savings)
-    for net in pivot["net"].tolist():
-        cur += float(net)
-        savings.append(cur)
-    pivot["savings_end"] = savings
+    cents = _line_cents(lines)
+    month_codes, months = pd.factorize(lines["month"])
+    currency_codes, currencies = pd.factorize(_line_currency(lines))
+    grid = _rate_grid(fx, pd.Index(months), pd.Index(currencies))
+    rate = grid[month_codes, currency_codes] if grid.size else np.zeros(len(cents), dtype=np.int64)
+    return lines.assign(amount_eur_cents=convert_cents(cents, rate))
 
-    return pivot[["month", "total_income", "total_expense", "net", "savings_end"]]
 
+@timed("metrics.monthly_summary")
+def monthly_summary(lines: pd.DataFrame, starting_savings: float, fx: pd.DataFrame | None = None) -> pd.DataFrame:
+    """
+    Monthly totals in EUR with running savings.
+    Uses ONLY line_type == 'expense' (the combined table) to avoid double counting
+    expense_tatiana / expense_ben. Pass raw lines + fx, or lines that already
+    carry amount_eur_cents (from apply_fx). Sums and running savings are
+    computed in cents.
+    """
+    if lines is None or lines.empty:
+        return pd.DataFrame(columns=SUMMARY_COLUMNS)
+    if "amount_eur_cents" not in lines.columns:
+        lines = apply_fx(lines, fx)
+
+    totals = (
+        lines[lines["line_type"].isin(["income", "expense"])]
+        .groupby(["month", "line_type"])["amount_eur_cents"].sum()
+        .unstack("line_type", fill_value=0)
+        .reindex(columns=["income", "expense"], fill_value=0)
+        .sort_index()
+    )
 
-def category_breakdown(all_lines: pd.DataFrame, line_type: str) -> pd.DataFrame:
+    income = totals["income"].to_numpy(dtype=np.int64)
+    expense = totals["expense"].to_numpy(dtype=np.int64)
+    net = income - expense
+    savings_end = money.to_cents(starting_savings) + np.cumsum(net)
+    return pd.DataFrame({
+        "month": totals.index.to_numpy(),
+        "total_income": income / CENTS,
+        "total_expense": expense / CENTS,
+        "net": net / CENTS,
+        "savings_start": (savings_end - net) / CENTS,
+        "savings_end": savings_end / CENTS,
+    })[SUMMARY_COLUMNS]
+
+
+@timed("metrics.category_breakdown")
+def category_breakdown(lines: pd.DataFrame, line_type: str, fx: pd.DataFrame | None = None) -> pd.DataFrame:
     """
-    Returns wide format: month rows, categories columns
+    Returns wide format: month rows, categories columns (EUR).
+    For expenses, pass line_type='expense' (combined) to match the totals.
     """
-    if all_lines.empty:
+    if lines is None or lines.empty:
         return pd.DataFrame()
+    if "amount_eur_cents" not in lines.columns:
+        lines = apply_fx(lines, fx)
 
-    df = all_lines[all_lines["line_type"] == line_type].copy()
+    df = lines[lines["line_type"] == line_type]
     if df.empty:
         return pd.DataFrame()
 
-    wide = (
-        df.groupby(["month", "category"], as_index=False)["amount"].sum()
-        .pivot(index="month", columns="category", values="amount")
-        .fillna(0.0)
+    cents = df.pivot_table(index="month", columns="category", values="amount_eur_cents", aggfunc="sum", fill_value=0)
+    return (
+        (cents / CENTS)
         .sort_index()
         .reset_index()
+        .rename_axis(columns=None)
     )
-    return wide
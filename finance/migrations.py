@@ -0,0 +1,435 @@
+"""
+Schema migrations, applied in order by finance.db.init_db.
+
+schema_version records every applied step. Each step is a function (db, conn)
+written against the Storage helpers, so the same code runs on Postgres, SQLite
+and DuckDB. Tables whose keys change are rebuilt (rename, create, copy, drop)
+because that is the one ALTER all three backends share.
+
+Add a step by appending a new `@migration(n, "name")` function; never edit a
+step that has shipped.
+"""
+from finance.context import DEFAULT_TENANT
+from finance.storage import Storage
+
+MIGRATIONS: list[tuple[int, str, object]] = []
+
+
+def migration(version: int, name: str):
+    def register(fn):
+        MIGRATIONS.append((version, name, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+
+def schema_version(db: Storage, conn) -> int:
+    rows = db.fetchall(conn, "SELECT MAX(version) FROM schema_version")
+    return int(rows[0][0] or 0)
+
+
+def migrate(db: Storage, conn) -> list[int]:
+    """Apply pending migrations in this transaction. Returns the versions applied."""
+    db.lock_schema(conn)
+    db.create_table(conn, "schema_version", """
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    """)
+    current = schema_version(db, conn)
+    applied = []
+    for version, name, step in MIGRATIONS:
+        if version <= current:
+            continue
+        step(db, conn)
+        db.execute(conn, "INSERT INTO schema_version (version, name) VALUES (%s, %s)", (version, name))
+        applied.append(version)
+    return applied
+
+
+def rebuild_table(
+    db: Storage, conn, table: str, body: str, columns: list[str], select: str, params=(), partition_by=None,
+    join: str = "",
+):
+    """
+    Recreate `table` from `body` and copy its rows over with `select` (in
+    `columns` order). The old rows are aliased `o`; `join` may add lookups.
+    Drop secondary indexes on `table` first and recreate them afterwards.
+    """
+    old = f"{table}_old"
+    db.rename_table(conn, table, old)
+    db.create_table(conn, table, body, partition_by=partition_by)
+    db.execute(conn, f"INSERT INTO {table} ({', '.join(columns)}) SELECT {select} FROM {old} o {join}", params)
+    db.execute(conn, f"DROP TABLE {old}")
+
+
+#######################################################
+# Steps
+#######################################################
+@migration(1, "baseline")
+def _baseline(db: Storage, conn):
+    # The single-household schema as it existed before migrations; no-op on
+    # databases created by earlier versions.
+    db.create_table(conn, "settings", """
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    """)
+    db.create_table(conn, "monthly_lines", """
+        month TEXT NOT NULL,
+        line_type TEXT NOT NULL,
+        category TEXT NOT NULL,
+        amount DOUBLE PRECISION NOT NULL,
+        PRIMARY KEY (month, line_type, category)
+    """)
+    db.create_table(conn, "monthly_fx", """
+        month TEXT PRIMARY KEY,
+        rub_to_eur DOUBLE PRECISION NOT NULL
+    """)
+    db.create_table(conn, "weekly_plan", """
+        day TEXT PRIMARY KEY,
+        anna_drop_off TEXT NOT NULL DEFAULT '',
+        anna_pick_up  TEXT NOT NULL DEFAULT '',
+        other_plans   TEXT NOT NULL DEFAULT '',
+        updated_at    TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    """)
+    db.create_table(conn, "app_users", """
+        email TEXT PRIMARY KEY,
+        password_hash TEXT NOT NULL,
+        is_active BOOLEAN NOT NULL DEFAULT TRUE
+    """)
+    db.create_table(conn, "data_versions", """
+        table_name TEXT PRIMARY KEY,
+        version BIGINT NOT NULL
+    """)
+
+
+@migration(2, "tenants")
+def _tenants(db: Storage, conn):
+    # Every household-owned row gets a tenant_id that leads its primary key, so
+    # a tenant's rows are one contiguous index range (and, on Postgres with
+    # tenant_partitions set, one HASH partition). Existing data becomes the
+    # default tenant.
+    tenant = (DEFAULT_TENANT,)
+    rebuild_table(db, conn, "settings", """
+        tenant_id TEXT NOT NULL,
+        key TEXT NOT NULL,
+        value TEXT NOT NULL,
+        PRIMARY KEY (tenant_id, key)
+    """, ["tenant_id", "key", "value"], "%s, key, value", tenant)
+    rebuild_table(db, conn, "monthly_lines", """
+        tenant_id TEXT NOT NULL,
+        month TEXT NOT NULL,
+        line_type TEXT NOT NULL,
+        category TEXT NOT NULL,
+        amount DOUBLE PRECISION NOT NULL,
+        PRIMARY KEY (tenant_id, month, line_type, category)
+    """, ["tenant_id", "month", "line_type", "category", "amount"], "%s, month, line_type, category, amount",
+        tenant, partition_by="tenant_id")
+    rebuild_table(db, conn, "monthly_fx", """
+        tenant_id TEXT NOT NULL,
+        month TEXT NOT NULL,
+        rub_to_eur DOUBLE PRECISION NOT NULL,
+        PRIMARY KEY (tenant_id, month)
+    """, ["tenant_id", "month", "rub_to_eur"], "%s, month, rub_to_eur", tenant, partition_by="tenant_id")
+    rebuild_table(db, conn, "weekly_plan", """
+        tenant_id TEXT NOT NULL,
+        day TEXT NOT NULL,
+        anna_drop_off TEXT NOT NULL DEFAULT '',
+        anna_pick_up  TEXT NOT NULL DEFAULT '',
+        other_plans   TEXT NOT NULL DEFAULT '',
+        updated_at    TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        PRIMARY KEY (tenant_id, day)
+    """, ["tenant_id", "day", "anna_drop_off", "anna_pick_up", "other_plans", "updated_at"],
+        "%s, day, anna_drop_off, anna_pick_up, other_plans, updated_at", tenant)
+    rebuild_table(db, conn, "data_versions", """
+        tenant_id TEXT NOT NULL,
+        table_name TEXT NOT NULL,
+        version BIGINT NOT NULL,
+        PRIMARY KEY (tenant_id, table_name)
+    """, ["tenant_id", "table_name", "version"], "%s, table_name, version", tenant)
+    # Logins stay global (email is unique across households) and carry their tenant.
+    rebuild_table(db, conn, "app_users", f"""
+        email TEXT PRIMARY KEY,
+        tenant_id TEXT NOT NULL DEFAULT '{DEFAULT_TENANT}',
+        password_hash TEXT NOT NULL,
+        is_active BOOLEAN NOT NULL DEFAULT TRUE
+    """, ["email", "tenant_id", "password_hash", "is_active"], "email, %s, password_hash, is_active", tenant)
+
+    # Secondary access path, also tenant first: the Dashboard filters on line_type.
+    db.execute(conn, "CREATE INDEX IF NOT EXISTS monthly_lines_tenant_type_month ON monthly_lines (tenant_id, line_type, month)")
+    db.execute(conn, "CREATE INDEX IF NOT EXISTS app_users_tenant ON app_users (tenant_id)")
+
+
+@migration(3, "typed settings and categories")
+def _typed_settings(db: Storage, conn):
+    # settings(key, value TEXT) becomes one typed row per household, and the
+    # comma-separated category lists become rows that monthly_lines reference
+    # by id, so a rename touches one row.
+    db.create_table(conn, "household_settings", """
+        tenant_id TEXT PRIMARY KEY,
+        starting_savings DOUBLE PRECISION NOT NULL DEFAULT 0,
+        passcode_enabled BOOLEAN NOT NULL DEFAULT FALSE,
+        passcode TEXT NOT NULL DEFAULT ''
+    """)
+    db.create_table(conn, "categories", """
+        tenant_id TEXT NOT NULL,
+        id INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        name TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        currency TEXT NOT NULL DEFAULT 'EUR',
+        archived BOOLEAN NOT NULL DEFAULT FALSE,
+        PRIMARY KEY (tenant_id, id)
+    """)
+    # A household's categories are one primary-key range (a few hundred rows at
+    # most). name and position stay unindexed: renames and reorders update them
+    # in place, which DuckDB doesn't allow on indexed columns. finance.db keeps
+    # names unique per kind.
+
+    legacy: dict[str, dict[str, str]] = {}
+    for tenant_id, key, value in db.fetchall(conn, "SELECT tenant_id, key, value FROM settings"):
+        legacy.setdefault(tenant_id, {})[key] = value or ""
+
+    def number(text: str) -> float:
+        try:
+            return float(text)
+        except ValueError:
+            return 0.0
+
+    db.bulk_upsert(conn, "household_settings", ["tenant_id", "starting_savings", "passcode_enabled", "passcode"],
+                   ["tenant_id"], [
+        (t, number(kv.get("starting_savings", "0")), kv.get("app_passcode_enabled") == "1", kv.get("app_passcode", ""))
+        for t, kv in legacy.items()
+    ])
+
+    # Configured lists first, in their order; names that only occur in old
+    # lines are kept (archived) so every line keeps its category.
+    used = db.fetchall(conn, """
+        SELECT DISTINCT tenant_id, CASE WHEN line_type = 'income' THEN 'income' ELSE 'expense' END, category
+        FROM monthly_lines
+    """)
+    wanted: dict[str, list[tuple[str, str, bool]]] = {}
+    for t, kv in legacy.items():
+        for kind in ("expense", "income"):
+            for name in kv.get(f"{kind}_categories", "").split(","):
+                if name.strip():
+                    wanted.setdefault(t, []).append((kind, name.strip(), False))
+    for t, kind, name in sorted(used):
+        wanted.setdefault(t, []).append((kind, name, True))
+
+    rows = []
+    for t, entries in wanted.items():
+        seen, positions = set(), {"expense": 0, "income": 0}
+        for kind, name, archived in entries:
+            if (kind, name) in seen:
+                continue
+            seen.add((kind, name))
+            positions[kind] += 1
+            # The rule before categories had a currency: "moscow" in the name means RUB.
+            currency = "RUB" if "moscow" in name.lower() else "EUR"
+            rows.append((t, len(seen), kind, name, positions[kind], currency, archived))
+    db.bulk_upsert(
+        conn, "categories", ["tenant_id", "id", "kind", "name", "position", "currency", "archived"],
+        ["tenant_id", "id"], rows,
+    )
+
+    db.execute(conn, "DROP INDEX IF EXISTS monthly_lines_tenant_type_month")
+    rebuild_table(db, conn, "monthly_lines", """
+        tenant_id TEXT NOT NULL,
+        month TEXT NOT NULL,
+        line_type TEXT NOT NULL,
+        category_id INTEGER NOT NULL,
+        amount DOUBLE PRECISION NOT NULL,
+        PRIMARY KEY (tenant_id, month, line_type, category_id)
+    """, ["tenant_id", "month", "line_type", "category_id", "amount"], "o.tenant_id, o.month, o.line_type, c.id, o.amount",
+        partition_by="tenant_id", join="""
+        JOIN categories c ON c.tenant_id = o.tenant_id AND c.name = o.category
+         AND c.kind = CASE WHEN o.line_type = 'income' THEN 'income' ELSE 'expense' END
+    """)
+    db.execute(conn, "CREATE INDEX IF NOT EXISTS monthly_lines_tenant_type_month ON monthly_lines (tenant_id, line_type, month)")
+    db.execute(conn, "DROP TABLE settings")
+
+
+@migration(4, "fx rates")
+def _fx_rates(db: Storage, conn):
+    # monthly_fx(month, rub_to_eur) becomes fx_rates(month, currency, rate_to_base)
+    # with EUR as the base, and every line records the currency it was entered
+    # in (its category's currency at the time). fx_effective forward-fills the
+    # rates onto the months that have lines, so queries join it on equality.
+    db.create_table(conn, "fx_rates", """
+        tenant_id TEXT NOT NULL,
+        currency TEXT NOT NULL,
+        month TEXT NOT NULL,
+        rate_to_base DOUBLE PRECISION NOT NULL,
+        PRIMARY KEY (tenant_id, currency, month)
+    """, partition_by="tenant_id")
+    db.execute(conn, """
+        INSERT INTO fx_rates (tenant_id, currency, month, rate_to_base)
+        SELECT tenant_id, 'RUB', month, rub_to_eur FROM monthly_fx
+    """)
+    db.execute(conn, "DROP TABLE monthly_fx")
+
+    db.execute(conn, "DROP INDEX IF EXISTS monthly_lines_tenant_type_month")
+    rebuild_table(db, conn, "monthly_lines", """
+        tenant_id TEXT NOT NULL,
+        month TEXT NOT NULL,
+        line_type TEXT NOT NULL,
+        category_id INTEGER NOT NULL,
+        amount DOUBLE PRECISION NOT NULL,
+        currency TEXT NOT NULL DEFAULT 'EUR',
+        PRIMARY KEY (tenant_id, month, line_type, category_id)
+    """, ["tenant_id", "month", "line_type", "category_id", "amount", "currency"],
+        "o.tenant_id, o.month, o.line_type, o.category_id, o.amount, COALESCE(c.currency, 'EUR')",
+        partition_by="tenant_id",
+        join="LEFT JOIN categories c ON c.tenant_id = o.tenant_id AND c.id = o.category_id")
+    db.execute(conn, "CREATE INDEX IF NOT EXISTS monthly_lines_tenant_type_month ON monthly_lines (tenant_id, line_type, month)")
+
+    db.create_table(conn, "fx_effective", """
+        tenant_id TEXT NOT NULL,
+        currency TEXT NOT NULL,
+        month TEXT NOT NULL,
+        rate_to_base DOUBLE PRECISION NOT NULL,
+        PRIMARY KEY (tenant_id, currency, month)
+    """, partition_by="tenant_id")
+    # Filled by migration 5: refresh_fx_effective now writes the integer rates.
+
+
+@migration(5, "integer money")
+def _integer_money(db: Storage, conn):
+    # Amounts become integer cents and rates integers scaled by 1e8 (see
+    # finance.money), so sums are exact. Household settings (starting savings)
+    # stay a float: it is one value added once, not summed.
+    db.execute(conn, "DROP INDEX IF EXISTS monthly_lines_tenant_type_month")
+    rebuild_table(db, conn, "monthly_lines", """
+        tenant_id TEXT NOT NULL,
+        month TEXT NOT NULL,
+        line_type TEXT NOT NULL,
+        category_id INTEGER NOT NULL,
+        amount_cents BIGINT NOT NULL,
+        currency TEXT NOT NULL DEFAULT 'EUR',
+        PRIMARY KEY (tenant_id, month, line_type, category_id)
+    """, ["tenant_id", "month", "line_type", "category_id", "amount_cents", "currency"],
+        "o.tenant_id, o.month, o.line_type, o.category_id, CAST(ROUND(o.amount * 100) AS BIGINT), o.currency",
+        partition_by="tenant_id")
+    db.execute(conn, "CREATE INDEX IF NOT EXISTS monthly_lines_tenant_type_month ON monthly_lines (tenant_id, line_type, month)")
+
+    rate_body = """
+        tenant_id TEXT NOT NULL,
+        currency TEXT NOT NULL,
+        month TEXT NOT NULL,
+        rate_e8 BIGINT NOT NULL,
+        PRIMARY KEY (tenant_id, currency, month)
+    """
+    rebuild_table(db, conn, "fx_rates", rate_body, ["tenant_id", "currency", "month", "rate_e8"],
+                  "o.tenant_id, o.currency, o.month, CAST(ROUND(o.rate_to_base * 100000000) AS BIGINT)",
+                  partition_by="tenant_id")
+    db.execute(conn, "DROP TABLE IF EXISTS fx_effective")
+    db.create_table(conn, "fx_effective", rate_body, partition_by="tenant_id")
+    for (tenant_id,) in db.fetchall(conn, "SELECT DISTINCT tenant_id FROM monthly_lines"):
+        db.refresh_fx_effective(conn, tenant_id)
+
+
+@migration(6, "budgets")
+def _budgets(db: Storage, conn):
+    # Monthly EUR limits per expense category, for the household (line_type
+    # 'expense') or one person (expense_tatiana / expense_ben). budget_status
+    # is derived: each budget against each month's spending, refreshed by the
+    # writes that change it (Storage.refresh_budget_status).
+    db.create_table(conn, "budgets", """
+        tenant_id TEXT NOT NULL,
+        line_type TEXT NOT NULL,
+        category_id INTEGER NOT NULL,
+        limit_cents BIGINT NOT NULL,
+        PRIMARY KEY (tenant_id, line_type, category_id)
+    """, partition_by="tenant_id")
+    db.create_table(conn, "budget_status", """
+        tenant_id TEXT NOT NULL,
+        month TEXT NOT NULL,
+        line_type TEXT NOT NULL,
+        category_id INTEGER NOT NULL,
+        spent_cents BIGINT NOT NULL,
+        limit_cents BIGINT NOT NULL,
+        PRIMARY KEY (tenant_id, month, line_type, category_id)
+    """, partition_by="tenant_id")
+
+
+@migration(7, "monthly trends")
+def _monthly_trends(db: Storage, conn):
+    # Derived per-month analytics (finance.analytics.trends): rolling averages,
+    # year-over-year changes, savings rate and personal shares, in EUR.
+    # Refreshed by the writes that change them (finance.db.refresh_trends).
+    db.create_table(conn, "monthly_trends", """
+        tenant_id TEXT NOT NULL,
+        month TEXT NOT NULL,
+        income DOUBLE PRECISION NOT NULL,
+        expense DOUBLE PRECISION NOT NULL,
+        net DOUBLE PRECISION NOT NULL,
+        income_avg_3 DOUBLE PRECISION,
+        income_avg_6 DOUBLE PRECISION,
+        income_avg_12 DOUBLE PRECISION,
+        expense_avg_3 DOUBLE PRECISION,
+        expense_avg_6 DOUBLE PRECISION,
+        expense_avg_12 DOUBLE PRECISION,
+        net_avg_3 DOUBLE PRECISION,
+        net_avg_6 DOUBLE PRECISION,
+        net_avg_12 DOUBLE PRECISION,
+        income_yoy DOUBLE PRECISION,
+        expense_yoy DOUBLE PRECISION,
+        savings_rate DOUBLE PRECISION,
+        tatiana_share DOUBLE PRECISION,
+        PRIMARY KEY (tenant_id, month)
+    """, partition_by="tenant_id")
+    from finance.db import refresh_trends  # finance.db imports this module
+
+    for (tenant_id,) in db.fetchall(conn, "SELECT DISTINCT tenant_id FROM monthly_lines"):
+        refresh_trends(db, conn, tenant_id)
+
+
+@migration(8, "meal plans")
+def _meal_plans(db: Storage, conn):
+    # Saved weekly meal plans (the model's JSON, one per week and dietary
+    # style) and their inverted ingredient index: one row per normalized
+    # ingredient and meal (finance.meals.index_entries). The index leads with
+    # the ingredient, so searches and shopping lists never re-read the JSON.
+    db.create_table(conn, "meal_plans", """
+        tenant_id TEXT NOT NULL,
+        week_start TEXT NOT NULL,
+        dietary_style TEXT NOT NULL,
+        plan TEXT NOT NULL,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        PRIMARY KEY (tenant_id, week_start, dietary_style)
+    """, partition_by="tenant_id")
+    db.create_table(conn, "meal_ingredients", """
+        tenant_id TEXT NOT NULL,
+        ingredient TEXT NOT NULL,
+        week_start TEXT NOT NULL,
+        dietary_style TEXT NOT NULL,
+        day TEXT NOT NULL,
+        meal TEXT NOT NULL,
+        dish TEXT NOT NULL,
+        as_written TEXT NOT NULL,
+        PRIMARY KEY (tenant_id, ingredient, week_start, dietary_style, day, meal)
+    """, partition_by="tenant_id")
+    db.execute(conn, "CREATE INDEX IF NOT EXISTS meal_ingredients_plan ON meal_ingredients (tenant_id, week_start, dietary_style)")
+
+
+@migration(9, "llm calls")
+def _llm_calls(db: Storage, conn):
+    # One row per meal-planner model request or cache hit (finance.meals.LLMCall):
+    # latency, token usage and outcome, for the admin usage view.
+    db.create_table(conn, "llm_calls", """
+        tenant_id TEXT NOT NULL,
+        call_id TEXT NOT NULL,
+        called_at TIMESTAMPTZ NOT NULL,
+        kind TEXT NOT NULL,
+        label TEXT NOT NULL,
+        model TEXT NOT NULL,
+        latency_ms DOUBLE PRECISION NOT NULL,
+        prompt_tokens INTEGER,
+        completion_tokens INTEGER,
+        cache_hit BOOLEAN NOT NULL,
+        outcome TEXT NOT NULL,
+        detail TEXT NOT NULL,
+        PRIMARY KEY (tenant_id, call_id)
+    """, partition_by="tenant_id")
+    db.execute(conn, "CREATE INDEX IF NOT EXISTS llm_calls_tenant_called ON llm_calls (tenant_id, called_at)")
@@ -0,0 +1,54 @@
+"""
+Exact money representation.
+
+Amounts are stored and summed as integer minor units (cents; BIGINT columns,
+int64 arrays) and FX rates as integers scaled by FX_SCALE (EUR per unit x 1e8),
+so totals never pick up float error. Floats only appear at the edges: what the
+user types and what the pages display. Converting a foreign amount rounds once
+per line, half away from zero; finance.metrics (NumPy) and the SQL in
+finance.storage apply the same rule.
+
+Products of cents and scaled rates must fit in int64 (lines up to ~90M EUR).
+
+Stdlib only, like finance.db's import path.
+"""
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+CENTS = 100
+FX_SCALE = 100_000_000
+
+
+def _scaled(value, scale: int) -> int:
+    # str() first: the shortest repr of a float is what the user typed (0.1, not 0.1000000000000000055)
+    try:
+        number = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError(f"Not an amount: {value!r}") from None
+    if not number.is_finite():
+        raise ValueError(f"Not a finite amount: {value!r}")
+    return int((number * scale).quantize(Decimal(1), ROUND_HALF_UP))
+
+
+def to_cents(amount) -> int:
+    """Major units (float, int, str or Decimal) -> integer cents."""
+    return _scaled(amount, CENTS)
+
+
+def to_rate(rate) -> int:
+    """EUR per unit -> integer rate scaled by FX_SCALE."""
+    return _scaled(rate, FX_SCALE)
+
+
+def from_cents(cents: int) -> float:
+    return cents / CENTS
+
+
+def from_rate(rate: int) -> float:
+    return rate / FX_SCALE
+
+
+def convert(cents: int, rate: int) -> int:
+    """Foreign cents x scaled rate -> base-currency cents, rounded half away from zero."""
+    product = cents * rate
+    q = (abs(product) + FX_SCALE // 2) // FX_SCALE
+    return q if product >= 0 else -q
@@ -0,0 +1,81 @@
+"""
+Cross-process cache invalidation over Postgres LISTEN/NOTIFY.
+
+Every data-version bump in finance.db also sends NOTIFY finance_data with the
+tenant and tables it changed, in the same transaction, so it is delivered only
+once the write commits. Each process runs one daemon listener thread per
+FinanceContext (started by init_db) that evicts exactly the cache entries
+derived from those tables for that household (VersionedCache.invalidate).
+While the listener is connected the cache trusts its version snapshots for
+LISTEN_VERSION_TTL instead of re-polling data_versions every VERSION_TTL; if
+it drops, polling resumes until it is back.
+
+Embedded backends (SQLite, DuckDB) have no NOTIFY: nothing is started and the
+cache keeps polling. Set FINANCE_CACHE_LISTEN=0 (or CACHE_LISTEN = false in
+secrets) to turn the listener off.
+"""
+import json
+import threading
+
+from finance.cache import LISTEN_VERSION_TTL, VERSION_TTL
+from finance.instrument import count
+
+CHANNEL = "finance_data"
+RETRY_SECONDS = 5.0
+
+_lock = threading.Lock()
+
+
+def payload(tenant_id: str, tables) -> str:
+    return json.dumps({"tenant": tenant_id, "tables": sorted(tables)})
+
+
+class Listener(threading.Thread):
+    """Daemon thread applying NOTIFY payloads to one context's cache; reconnects until stopped."""
+
+    def __init__(self, storage, cache):
+        super().__init__(name="finance-notify", daemon=True)
+        self.storage = storage
+        self.cache = cache
+        self.stop_event = threading.Event()
+        self.connected = threading.Event()
+
+    def on_message(self, message: str | None):
+        if message is None:  # (re)subscribed: writes may have been missed meanwhile
+            self.cache.forget_versions()
+            self.cache.version_ttl = LISTEN_VERSION_TTL
+            self.connected.set()
+            return
+        count("notify.received")
+        try:
+            change = json.loads(message)
+            evicted = self.cache.invalidate(change["tenant"], change["tables"])
+        except (ValueError, KeyError, TypeError):
+            self.cache.forget_versions()  # unknown payload: fall back to re-reading versions
+            return
+        count("notify.evicted", evicted)
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                self.storage.listen(CHANNEL, self.on_message, self.stop_event)
+            except Exception:
+                count("notify.disconnect")
+            self.connected.clear()
+            self.cache.version_ttl = VERSION_TTL
+            self.stop_event.wait(RETRY_SECONDS)
+
+    def stop(self):
+        self.stop_event.set()
+
+
+def ensure_listener(ctx) -> "Listener | None":
+    """Start ctx's listener once, if its backend supports NOTIFY and it is enabled."""
+    if not (ctx.cache_listen and ctx.storage.supports_notify):
+        return None
+    with _lock:
+        if ctx._listener is None or not ctx._listener.is_alive():
+            ctx._listener = Listener(ctx.storage, ctx.cache)
+            ctx._listener.start()
+    return ctx._listener
+
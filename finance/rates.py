@@ -0,0 +1,143 @@
+"""
+Bulk import of historical exchange rates from local ECB-style files.
+
+Drop rate files into a folder (default data/fx, or FINANCE_FX_DIR) and run
+    python -m finance.rates [folder] [--currency USD --currency GBP] [--tenant smith]
+or press "Import rate files" in Settings. Understood formats:
+  - eurofxref-hist.csv (also inside eurofxref-hist.zip): a Date column and one
+    column per currency, "N/A" where there is no quote
+  - eurofxref-hist.xml and the daily / 90-day XML feeds: Cube time= / currency= rate=
+  - ECB Data Portal CSV exports: CURRENCY, TIME_PERIOD, OBS_VALUE columns
+    (daily dates or monthly periods)
+The ECB quotes units of currency per 1 EUR while fx_rates stores EUR per unit,
+so quotes are inverted; daily quotes are averaged per month. Everything found
+is written for the current household in one batch upsert (see
+finance.db.upsert_fx_rates), overwriting rates entered by hand for those months.
+"""
+import argparse
+import io
+import os
+import zipfile
+from pathlib import Path
+from xml.etree import ElementTree
+
+import pandas as pd
+
+DEFAULT_DIR = "data/fx"
+RATE_COLUMNS = ["month", "currency", "rate_to_base"]
+_SUFFIXES = {".csv", ".xml", ".zip"}
+
+
+def rates_dir() -> Path:
+    return Path(os.environ.get("FINANCE_FX_DIR", DEFAULT_DIR))
+
+
+#######################################################
+# Parsers: each returns daily/monthly quotes as (date, currency, per_eur)
+#######################################################
+def _parse_csv(data: bytes) -> pd.DataFrame:
+    frame = pd.read_csv(io.BytesIO(data), na_values=["N/A", ""], skipinitialspace=True)
+    frame.columns = [str(c).strip() for c in frame.columns]
+    if {"CURRENCY", "TIME_PERIOD", "OBS_VALUE"} <= set(frame.columns):
+        if "CURRENCY_DENOM" in frame.columns:
+            frame = frame[frame["CURRENCY_DENOM"] == "EUR"]
+        return frame.rename(columns={"TIME_PERIOD": "date", "CURRENCY": "currency", "OBS_VALUE": "per_eur"})[
+            ["date", "currency", "per_eur"]
+        ]
+    if "Date" in frame.columns:
+        frame = frame.loc[:, [c for c in frame.columns if c and not c.startswith("Unnamed")]]
+        return frame.melt(id_vars=["Date"], var_name="currency", value_name="per_eur").rename(columns={"Date": "date"})
+    raise ValueError("unrecognised CSV layout (expected a Date column or CURRENCY/TIME_PERIOD/OBS_VALUE)")
+
+
+def _parse_xml(data: bytes) -> pd.DataFrame:
+    rows = []
+    for _, elem in ElementTree.iterparse(io.BytesIO(data)):
+        if elem.tag.rsplit("}", 1)[-1] == "Cube" and "time" in elem.attrib:
+            day = elem.attrib["time"]
+            rows.extend((day, c.attrib["currency"], c.attrib["rate"]) for c in elem if "currency" in c.attrib)
+            elem.clear()
+    return pd.DataFrame(rows, columns=["date", "currency", "per_eur"])
+
+
+def _parse_zip(data: bytes) -> pd.DataFrame:
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        frames = [
+            _parse(name, archive.read(name)) for name in archive.namelist()
+            if Path(name).suffix.lower() in _SUFFIXES - {".zip"}
+        ]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["date", "currency", "per_eur"])
+
+
+def _parse(name: str, data: bytes) -> pd.DataFrame:
+    suffix = Path(name).suffix.lower()
+    if suffix == ".xml":
+        return _parse_xml(data)
+    if suffix == ".zip":
+        return _parse_zip(data)
+    return _parse_csv(data)
+
+
+def monthly_rates(quotes: pd.DataFrame, currencies=None) -> pd.DataFrame:
+    """Per-EUR quotes -> one EUR-per-unit rate per (month, currency), the mean of that month's quotes."""
+    quotes = quotes.assign(
+        month=quotes["date"].astype(str).str.strip().str[:7],
+        currency=quotes["currency"].astype(str).str.strip().str.upper(),
+        per_eur=pd.to_numeric(quotes["per_eur"], errors="coerce"),
+    )
+    quotes = quotes[(quotes["per_eur"] > 0) & (quotes["currency"] != "EUR")]
+    if currencies:
+        quotes = quotes[quotes["currency"].isin({c.upper() for c in currencies})]
+    return (
+        quotes.assign(rate_to_base=1.0 / quotes["per_eur"])
+        .groupby(["month", "currency"], as_index=False)["rate_to_base"].mean()
+        .sort_values(["currency", "month"], ignore_index=True)[RATE_COLUMNS]
+    )
+
+
+def read_rate_files(paths, currencies=None) -> pd.DataFrame:
+    """Parse rate files (or every .csv/.xml/.zip in the given folders) into (month, currency, rate_to_base)."""
+    files = []
+    for path in map(Path, [paths] if isinstance(paths, (str, Path)) else paths):
+        if path.is_dir():
+            files.extend(sorted(p for p in path.iterdir() if p.suffix.lower() in _SUFFIXES))
+        elif not path.exists():
+            raise ValueError(f"{path}: no such file or folder")
+        else:
+            files.append(path)
+    frames = []
+    for f in files:
+        try:
+            frames.append(_parse(f.name, f.read_bytes()))
+        except (ValueError, ElementTree.ParseError, zipfile.BadZipFile) as e:
+            raise ValueError(f"{f}: {e}") from e
+    if not frames:
+        return pd.DataFrame(columns=RATE_COLUMNS)
+    return monthly_rates(pd.concat(frames, ignore_index=True), currencies)
+
+
+def import_rates(paths=None, currencies=None) -> int:
+    """Read rate files (default: rates_dir()) and upsert them for the current household. Returns rows written."""
+    from finance.db import upsert_fx_rates
+
+    return upsert_fx_rates(read_rate_files(paths or rates_dir(), currencies))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import ECB-style exchange rate files into fx_rates.")
+    parser.add_argument("paths", nargs="*", help=f"files or folders (default: $FINANCE_FX_DIR or {DEFAULT_DIR})")
+    parser.add_argument("--currency", action="append", help="only import these currencies")
+    parser.add_argument("--tenant", help="household to import into (default: $FINANCE_TENANT_ID)")
+    args = parser.parse_args(argv)
+
+    from finance.context import use_tenant
+    from finance.db import init_db
+
+    init_db()
+    with use_tenant(args.tenant):  # None: FINANCE_TENANT_ID / default
+        n = import_rates(args.paths or None, args.currency)
+    print(f"fx_rates: {n} rows")
+
+
+if __name__ == "__main__":
+    main()
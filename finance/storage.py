@@ -0,0 +1,524 @@
+"""
+Storage backends behind finance.db.
+
+The backend is picked from the scheme of DATABASE_URL:
+  - postgresql://... or postgres://...  -> Postgres (psycopg2)
+  - sqlite:///data/finance.db           -> embedded SQLite file
+  - duckdb:///data/finance.duckdb       -> embedded DuckDB file
+
+All SQL in finance.db is written once in Postgres style (%s placeholders, NOW()).
+Each backend translates it to its own dialect and implements the bulk and
+aggregate paths natively.
+"""
+from __future__ import annotations
+
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+
+from finance.instrument import count
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+class Storage:
+    name = "base"
+
+    def __init__(self, url: str, pool_size: int = 0, tenant_partitions: int = 0):
+        self.url = url
+        self.pool_size = pool_size
+        self.tenant_partitions = tenant_partitions  # Postgres only, see PostgresStorage.create_table
+        self.schema_ready = False  # set by finance.db.init_db
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.url!r})"
+
+    # ---- connections -------------------------------------------------
+    def connect(self):
+        raise NotImplementedError
+
+    def close(self):
+        """Release pooled resources (no-op for unpooled backends)."""
+
+    @contextmanager
+    def connection(self):
+        """Yield a connection; commit on success, roll back on error, always close."""
+        count("db.connect")
+        conn = self.connect()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    # ---- SQL helpers -------------------------------------------------
+    def sql(self, query: str) -> str:
+        """Translate Postgres-style SQL to this backend's dialect (every query passes here)."""
+        count("db.query")
+        return self.dialect(query)
+
+    def dialect(self, query: str) -> str:
+        return query
+
+    def execute(self, conn, query: str, params=()):
+        with conn.cursor() as cur:
+            cur.execute(self.sql(query), params)
+
+    def executemany(self, conn, query: str, rows):
+        with conn.cursor() as cur:
+            cur.executemany(self.sql(query), rows)
+
+    def fetchall(self, conn, query: str, params=()) -> list[tuple]:
+        with conn.cursor() as cur:
+            cur.execute(self.sql(query), params)
+            return cur.fetchall()
+
+    def read_frame(self, conn, query: str, params=()) -> pd.DataFrame:
+        import pandas as pd
+
+        cur = conn.cursor()
+        try:
+            cur.execute(self.sql(query), params)
+            cols = [d[0] for d in cur.description]
+            rows = cur.fetchall()
+        finally:
+            cur.close()
+        return pd.DataFrame.from_records(rows, columns=cols)
+
+    def iter_batches(self, conn, query: str, params=(), size: int = 1000):
+        """Yield (columns, rows) chunks of at most `size` rows."""
+        cur = conn.cursor()
+        try:
+            cur.execute(self.sql(query), params)
+            cols = [d[0] for d in cur.description]
+            while True:
+                rows = cur.fetchmany(size)
+                if not rows:
+                    break
+                yield cols, rows
+        finally:
+            cur.close()
+
+    # ---- DDL ---------------------------------------------------------
+    def create_table(self, conn, table: str, body: str, partition_by: str | None = None):
+        """CREATE TABLE IF NOT EXISTS; `partition_by` is a hint only backends with partitioning use."""
+        self.execute(conn, f"CREATE TABLE IF NOT EXISTS {table} ({body})")
+
+    def rename_table(self, conn, table: str, new_name: str):
+        self.execute(conn, f"ALTER TABLE {table} RENAME TO {new_name}")
+
+    def lock_schema(self, conn):
+        """Serialize migrations between processes (embedded backends have a single writer anyway)."""
+
+    # ---- change notifications ---------------------------------------
+    supports_notify = False
+
+    def notify(self, conn, channel: str, payload: str):
+        """Announce a change to other processes once conn commits (no-op without LISTEN/NOTIFY)."""
+
+    def listen(self, channel: str, on_message, stop, poll_seconds: float = 5.0):
+        """Block until `stop` is set, calling on_message(payload) per notification on `channel`."""
+        raise NotImplementedError(f"{self.name} has no LISTEN/NOTIFY")
+
+    # ---- bulk path ---------------------------------------------------
+    def bulk_upsert(self, conn, table: str, columns: list[str], keys: list[str], rows: list[tuple]):
+        """INSERT rows, updating non-key columns on primary-key conflict."""
+        if not rows:
+            return
+        self.executemany(conn, _upsert_sql(table, columns, keys, "VALUES (" + ", ".join(["%s"] * len(columns)) + ")"), rows)
+
+    # ---- aggregate path ----------------------------------------------
+    def category_pivot(self, conn, tenant_id: str, line_type: str) -> pd.DataFrame:
+        """Wide month x category frame of EUR amounts for one tenant and line_type."""
+        import pandas as pd
+
+        long = self.read_frame(conn, _CATEGORY_TOTALS_SQL, (tenant_id, line_type))
+        if long.empty:
+            return pd.DataFrame()
+        return (
+            long.pivot_table(index="month", columns="category", values="amount_eur", aggfunc="sum", fill_value=0.0)
+            .reset_index()
+            .rename_axis(columns=None)
+        )
+
+    def refresh_fx_effective(self, conn, tenant_id: str, since: str = ""):
+        """
+        Recompute the tenant's fx_effective rows from month `since` on (all by
+        default). Call after writing monthly_lines or fx_rates: a rate change
+        in month m can move every later month that has no rate of its own.
+        """
+        self.execute(conn, "DELETE FROM fx_effective WHERE tenant_id = %s AND month >= %s", (tenant_id, since))
+        self.execute(conn, _FX_EFFECTIVE_SQL, (tenant_id, since, tenant_id))
+
+    def refresh_budget_status(self, conn, tenant_id: str, since: str = "", month: str | None = None,
+                              line_type: str | None = None):
+        """
+        Recompute the tenant's budget_status rows for one `month` (else from
+        `since` on) and one `line_type` (else all). Call after fx_effective is
+        current: after a month's lines change, just that month and line_type;
+        after rates change, from their first month; after budgets change, all.
+        """
+        where = "tenant_id = %s AND " + ("month = %s" if month is not None else "month >= %s")
+        params = [tenant_id, month if month is not None else since]
+        if line_type is not None:
+            where += " AND line_type = %s"
+            params.append(line_type)
+        self.execute(conn, f"DELETE FROM budget_status WHERE {where}", tuple(params))
+        self.execute(conn, _BUDGET_STATUS_SQL.format(where=where), tuple(params) * 2)
+
+
+# Amounts are integer cents and rates integers scaled by 1e8 (finance.money).
+# A line converts to base-currency (EUR) cents with the rate of its month, or
+# the latest earlier rate of that currency (forward fill), rounded half away
+# from zero; a foreign line with no rate yet converts to 0. Same rule as
+# finance.metrics.apply_fx. Sum these, then turn the total into EUR with eur_sql.
+# (SQLite and DuckDB divide in double precision: exact while cents x rate_e8
+# stays below 2**53, i.e. lines under ~900k EUR.)
+AMOUNT_CENTS_SQL = """
+    CASE WHEN l.currency = 'EUR'
+         THEN l.amount_cents
+         ELSE CAST(ROUND(l.amount_cents * COALESCE(f.rate_e8, 0) / 100000000.0) AS BIGINT) END
+"""
+
+
+def eur_sql(cents: str) -> str:
+    """SQL for an integer cents expression as EUR (a float, for display)."""
+    return f"CAST({cents} AS DOUBLE PRECISION) / 100"
+
+
+# monthly_lines l -> categories c (name) and the rate f in effect for the line's
+# currency and month. fx_effective holds exactly those rates (forward-filled,
+# see Storage.refresh_fx_effective), so this stays an equi-join on its primary
+# key and costs the same for any number of currencies.
+CATEGORY_JOIN_SQL = "JOIN categories c ON c.tenant_id = l.tenant_id AND c.id = l.category_id"
+FX_JOIN_SQL = """
+    LEFT JOIN fx_effective f
+      ON f.tenant_id = l.tenant_id AND f.currency = l.currency AND f.month = l.month
+"""
+
+# Every (currency, month) of a tenant's foreign lines from `since` on, with the
+# latest rate at or before that month: each fx_rates row is valid until the
+# next rate of its currency. Params: (tenant_id, since, tenant_id).
+_FX_EFFECTIVE_SQL = """
+    INSERT INTO fx_effective (tenant_id, currency, month, rate_e8)
+    SELECT p.tenant_id, p.currency, p.month, r.rate_e8
+    FROM (
+        SELECT DISTINCT tenant_id, currency, month FROM monthly_lines
+        WHERE tenant_id = %s AND month >= %s AND currency <> 'EUR'
+    ) p
+    JOIN (
+        SELECT currency, rate_e8, month AS valid_from,
+               LEAD(month) OVER (PARTITION BY currency ORDER BY month) AS valid_until
+        FROM fx_rates WHERE tenant_id = %s
+    ) r ON r.currency = p.currency
+       AND r.valid_from <= p.month AND (r.valid_until IS NULL OR p.month < r.valid_until)
+"""
+
+# Every budget against each month that has lines of its line_type (from the
+# `where` filter on monthly_lines), with the EUR cents spent on its category
+# that month (0 if none). Params: the `where` params, twice.
+_BUDGET_STATUS_SQL = f"""
+    INSERT INTO budget_status (tenant_id, month, line_type, category_id, spent_cents, limit_cents)
+    SELECT m.tenant_id, m.month, b.line_type, b.category_id, COALESCE(s.spent_cents, 0), b.limit_cents
+    FROM (SELECT DISTINCT tenant_id, month, line_type FROM monthly_lines WHERE {{where}}) m
+    JOIN budgets b ON b.tenant_id = m.tenant_id AND b.line_type = m.line_type
+    LEFT JOIN (
+        SELECT l.month, l.line_type, l.category_id, SUM({AMOUNT_CENTS_SQL}) AS spent_cents
+        FROM (SELECT * FROM monthly_lines WHERE {{where}}) l
+        {FX_JOIN_SQL}
+        GROUP BY l.month, l.line_type, l.category_id
+    ) s ON s.month = m.month AND s.line_type = b.line_type AND s.category_id = b.category_id
+"""
+
+_CATEGORY_TOTALS_SQL = f"""
+    SELECT l.month, c.name AS category, {eur_sql(f"SUM({AMOUNT_CENTS_SQL})")} AS amount_eur
+    FROM monthly_lines l
+    {CATEGORY_JOIN_SQL}
+    {FX_JOIN_SQL}
+    WHERE l.tenant_id = %s AND l.line_type = %s
+    GROUP BY l.month, c.name
+    ORDER BY l.month
+"""
+
+
+def _upsert_sql(table: str, columns: list[str], keys: list[str], source: str) -> str:
+    updates = [c for c in columns if c not in keys]
+    conflict = (
+        "DO UPDATE SET " + ", ".join(f"{c} = EXCLUDED.{c}" for c in updates)
+        if updates else "DO NOTHING"
+    )
+    return f"""
+        INSERT INTO {table} ({", ".join(columns)})
+        {source}
+        ON CONFLICT ({", ".join(keys)}) {conflict}
+    """
+
+
+#######################################################
+# Postgres
+#######################################################
+_SCHEMA_LOCK_ID = 0x66696E616E6365  # "finance"
+
+class PostgresStorage(Storage):
+    name = "postgres"
+
+    def __init__(self, url: str, pool_size: int = 0, tenant_partitions: int = 0):
+        super().__init__(url, pool_size, tenant_partitions)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        # ThreadedConnectionPool raises once every connection is out; sessions
+        # run on their own threads, so callers wait for a free slot instead.
+        self._slots = threading.BoundedSemaphore(pool_size) if pool_size else None
+
+    def connect(self):
+        import psycopg2
+        return psycopg2.connect(self.url)
+
+    @contextmanager
+    def connection(self):
+        if not self.pool_size:
+            with super().connection() as conn:
+                yield conn
+            return
+
+        count("db.connect")
+        with self._pool_lock:
+            if self._pool is None:
+                from psycopg2.pool import ThreadedConnectionPool
+                self._pool = ThreadedConnectionPool(1, self.pool_size, self.url)
+            pool = self._pool
+        with self._slots:
+            conn = pool.getconn()
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                pool.putconn(conn)
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+
+    def create_table(self, conn, table, body, partition_by=None):
+        # Declarative HASH partitioning (e.g. by tenant_id) when configured: each
+        # tenant's rows live in one of N partitions, so its scans and index
+        # lookups don't grow with the number of tenants.
+        if not (partition_by and self.tenant_partitions):
+            return super().create_table(conn, table, body)
+        if self.fetchall(conn, "SELECT to_regclass(%s)", (table,))[0][0] is not None:
+            return
+        n = self.tenant_partitions
+        self.execute(conn, f"CREATE TABLE {table} ({body}) PARTITION BY HASH ({partition_by})")
+        for i in range(n):
+            self.execute(
+                conn,
+                f"CREATE TABLE {table}_p{i} PARTITION OF {table} FOR VALUES WITH (MODULUS {n}, REMAINDER {i})",
+            )
+
+    def rename_table(self, conn, table, new_name):
+        # Partitions keep their names on ALTER TABLE RENAME; move them along so
+        # a table recreated under the old name can create its own.
+        partitions = self.fetchall(conn, """
+            SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(%s)
+        """, (table,))
+        super().rename_table(conn, table, new_name)
+        for (name,) in partitions:
+            if name.startswith(f"{table}_"):
+                super().rename_table(conn, name, new_name + name[len(table):])
+
+    def lock_schema(self, conn):
+        self.execute(conn, "SELECT pg_advisory_xact_lock(%s)", (_SCHEMA_LOCK_ID,))
+
+    supports_notify = True
+
+    def notify(self, conn, channel, payload):
+        # Delivered when (and only if) the transaction commits.
+        self.execute(conn, "SELECT pg_notify(%s, %s)", (channel, payload))
+
+    def listen(self, channel, on_message, stop, poll_seconds=5.0):
+        # Dedicated autocommit connection outside the pool: it sits in LISTEN
+        # for the life of the process. on_message(None) marks a (re)subscribe,
+        # after which anything may have changed while nobody was listening.
+        import select
+
+        from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+        conn = self.connect()
+        try:
+            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cur:
+                cur.execute(f'LISTEN "{channel}"')
+            on_message(None)
+            while not stop.is_set():
+                if select.select([conn], [], [], poll_seconds) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    on_message(conn.notifies.pop(0).payload)
+        finally:
+            conn.close()
+
+    def bulk_upsert(self, conn, table, columns, keys, rows):
+        if not rows:
+            return
+        from psycopg2.extras import execute_values
+        with conn.cursor() as cur:
+            execute_values(cur, _upsert_sql(table, columns, keys, "VALUES %s"), rows, page_size=1000)
+
+
+#######################################################
+# SQLite
+#######################################################
+class SQLiteStorage(Storage):
+    name = "sqlite"
+
+    def __init__(self, url: str, pool_size: int = 0, tenant_partitions: int = 0):
+        super().__init__(url, pool_size, tenant_partitions)
+        self.path = _path_from_url(url)
+
+    def connect(self):
+        import sqlite3
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def dialect(self, query):
+        return (
+            query.replace("%s", "?")
+            .replace("NOW()", "CURRENT_TIMESTAMP")
+        )
+
+    def execute(self, conn, query, params=()):
+        conn.execute(self.sql(query), params)
+
+    def executemany(self, conn, query, rows):
+        conn.executemany(self.sql(query), rows)
+
+    def fetchall(self, conn, query, params=()):
+        return conn.execute(self.sql(query), params).fetchall()
+
+
+#######################################################
+# DuckDB
+#######################################################
+class DuckDBStorage(Storage):
+    name = "duckdb"
+
+    def __init__(self, url: str, pool_size: int = 0, tenant_partitions: int = 0):
+        super().__init__(url, pool_size, tenant_partitions)
+        self.path = _path_from_url(url)
+
+    def connect(self):
+        import duckdb
+        return duckdb.connect(self.path)
+
+    @contextmanager
+    def connection(self):
+        # DuckDB autocommits each statement; open an explicit transaction so
+        # multi-statement writes (delete + insert) stay atomic.
+        count("db.connect")
+        conn = self.connect()
+        try:
+            conn.execute("BEGIN TRANSACTION")
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def dialect(self, query):
+        return query.replace("%s", "?")
+
+    # DuckDB cursors are separate connections, so always go through conn itself.
+    def execute(self, conn, query, params=()):
+        conn.execute(self.sql(query), params)
+
+    def executemany(self, conn, query, rows):
+        conn.executemany(self.sql(query), rows)
+
+    def fetchall(self, conn, query, params=()):
+        return conn.execute(self.sql(query), params).fetchall()
+
+    def read_frame(self, conn, query, params=()):
+        return conn.execute(self.sql(query), params).df()
+
+    def iter_batches(self, conn, query, params=(), size=1000):
+        res = conn.execute(self.sql(query), params)
+        cols = [d[0] for d in res.description]
+        while True:
+            rows = res.fetchmany(size)
+            if not rows:
+                break
+            yield cols, rows
+
+    def bulk_upsert(self, conn, table, columns, keys, rows):
+        if not rows:
+            return
+        import pandas as pd
+
+        # Vectorized insert from a registered frame instead of row-by-row executemany.
+        conn.register("_bulk_rows", pd.DataFrame.from_records(rows, columns=columns))
+        try:
+            conn.execute(_upsert_sql(table, columns, keys, f"SELECT {', '.join(columns)} FROM _bulk_rows"))
+        finally:
+            conn.unregister("_bulk_rows")
+
+    def category_pivot(self, conn, tenant_id, line_type):
+        import pandas as pd
+
+        # PIVOT can't take parameters in its source, so stage the totals first.
+        self.execute(
+            conn, f"CREATE OR REPLACE TEMP TABLE _category_totals AS {_CATEGORY_TOTALS_SQL}",
+            (tenant_id, line_type),
+        )
+        try:
+            wide = self.read_frame(conn, """
+                PIVOT _category_totals
+                ON category USING SUM(amount_eur)
+                GROUP BY month
+                ORDER BY month
+            """)
+        finally:
+            self.execute(conn, "DROP TABLE IF EXISTS _category_totals")
+        if wide.empty:
+            return pd.DataFrame()
+        return wide.fillna(0.0)
+
+
+#######################################################
+# Selection by config
+#######################################################
+_BACKENDS = {
+    "postgres": PostgresStorage,
+    "postgresql": PostgresStorage,
+    "sqlite": SQLiteStorage,
+    "duckdb": DuckDBStorage,
+}
+
+
+def _path_from_url(url: str) -> str:
+    # sqlite:///relative/path.db, sqlite:////abs/path.db, duckdb:///:memory:
+    path = url.split("://", 1)[1]
+    return path[1:] if path.startswith("/") else path
+
+
+def storage_from_url(url: str, pool_size: int = 0, tenant_partitions: int = 0) -> Storage:
+    scheme = url.split("://", 1)[0].split("+", 1)[0].lower()
+    try:
+        cls = _BACKENDS[scheme]
+    except KeyError:
+        raise ValueError(f"Unsupported DATABASE_URL scheme: {scheme!r}") from None
+    return cls(url, pool_size=pool_size, tenant_partitions=tenant_partitions)
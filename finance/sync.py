@@ -0,0 +1,210 @@
+"""
+Bring a local embedded copy (SQLite/DuckDB) in line with the Postgres tables.
+
+The first run is a full one-pass migration. Later runs only transfer what changed,
+using a per-table, per-household high-water mark stored in the target's sync_state table:
+  - monthly_lines, fx_rates: month key (the last synced month is re-read,
+    since the current month is the one that keeps getting edited)
+  - weekly_plan, meal_plans: updated_at
+  - household_settings, categories, budgets, app_users: a handful of rows, copied whole
+    (budgets replace the target's, since removed budgets are deleted on the source)
+Every household (tenant) is copied, each from its own mark, so a household added
+later is picked up even if its months sort below the others'. The derived
+fx_effective, budget_status, monthly_trends and meal_ingredients tables are not
+copied but recomputed on the target. The source is only read, never migrated:
+it must already be at the schema version of this code.
+
+Usage:
+    python -m finance.sync --source postgresql://... --target sqlite:///data/finance.db
+"""
+import argparse
+import os
+from datetime import datetime, timezone
+
+from finance.db import bump_data_versions, init_db, refresh_trends, reindex_meal_plans
+from finance.migrations import schema_version
+from finance.storage import Storage, storage_from_url
+
+BATCH_SIZE = 1000
+
+# table -> (columns, primary key, high-water column or None, what the copied rows replace)
+# replace: "month" = those months of their tenant, "table" = the whole table, None = upsert only
+TABLES = {
+    "household_settings": (
+        ["tenant_id", "starting_savings", "passcode_enabled", "passcode"], ["tenant_id"], None, None,
+    ),
+    "categories": (
+        ["tenant_id", "id", "kind", "name", "position", "currency", "archived"], ["tenant_id", "id"], None, None,
+    ),
+    "monthly_lines": (
+        ["tenant_id", "month", "line_type", "category_id", "amount_cents", "currency"],
+        ["tenant_id", "month", "line_type", "category_id"], "month", "month",
+    ),
+    "fx_rates": (
+        ["tenant_id", "currency", "month", "rate_e8"], ["tenant_id", "currency", "month"], "month", None,
+    ),
+    "budgets": (
+        ["tenant_id", "line_type", "category_id", "limit_cents"],
+        ["tenant_id", "line_type", "category_id"], None, "table",
+    ),
+    "weekly_plan": (
+        ["tenant_id", "day", "anna_drop_off", "anna_pick_up", "other_plans", "updated_at"],
+        ["tenant_id", "day"], "updated_at", None,
+    ),
+    "meal_plans": (
+        ["tenant_id", "week_start", "dietary_style", "plan", "updated_at"],
+        ["tenant_id", "week_start", "dietary_style"], "updated_at", None,
+    ),
+    "app_users": (["email", "tenant_id", "password_hash", "is_active"], ["email"], None, None),
+}
+
+
+SYNC_STATE_SQL = """
+    CREATE TABLE IF NOT EXISTS sync_state (
+        table_name TEXT NOT NULL,
+        tenant_id  TEXT NOT NULL,
+        high_water TEXT NOT NULL,
+        synced_at  TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        PRIMARY KEY (table_name, tenant_id)
+    );
+"""
+
+
+def _init_sync_state(db: Storage, conn):
+    db.execute(conn, SYNC_STATE_SQL)
+    # Marks used to be per table only; start those targets over (one full copy, rows are upserted).
+    if "tenant_id" not in db.read_frame(conn, "SELECT * FROM sync_state WHERE 1 = 0").columns:
+        db.execute(conn, "DROP TABLE sync_state")
+        db.execute(conn, SYNC_STATE_SQL)
+
+
+def _plain(value):
+    # Timestamps travel as ISO text so every backend can parse them back.
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def sync_table(source: Storage, target: Storage, table: str, batch_size: int = BATCH_SIZE) -> int:
+    """Copy changed rows of one table from source to target. Returns rows transferred."""
+    columns, keys, hw_col, replace = TABLES[table]
+
+    with target.connection() as tconn:
+        _init_sync_state(target, tconn)
+        marks = dict(target.fetchall(
+            tconn, "SELECT tenant_id, high_water FROM sync_state WHERE table_name=%s", (table,)
+        ))
+
+    # (tenant or None for all, query, params): one read per tenant past its own mark
+    select = f"SELECT {', '.join(columns)} FROM {table}"
+    reads = [(None, select, ())]
+    if hw_col:
+        op = ">=" if hw_col == "month" else ">"
+        with source.connection() as sconn:
+            source_tenants = sorted(t for (t,) in source.fetchall(sconn, f"SELECT DISTINCT tenant_id FROM {table}"))
+        reads = []
+        for tenant_id in source_tenants:
+            query, params = f"{select} WHERE tenant_id = %s", (tenant_id,)
+            if tenant_id in marks:
+                query += f" AND {hw_col} {op} %s"
+                params += (marks[tenant_id],)
+            reads.append((tenant_id, query + f" ORDER BY {hw_col}", params))
+
+    moved = 0
+    new_highs: dict = {}
+    cleared: set = set()
+    tenants: set = set()
+    ti = columns.index("tenant_id")
+    with source.connection() as sconn, target.connection() as tconn:
+        if replace == "table":
+            # save_budgets deletes + reinserts, so start from an empty table; every
+            # tenant that had rows gets its derived rows recomputed below
+            tenants.update(t for (t,) in target.fetchall(tconn, f"SELECT DISTINCT tenant_id FROM {table}"))
+            target.execute(tconn, f"DELETE FROM {table}")
+        for read_tenant, query, params in reads:
+            for _, rows in source.iter_batches(sconn, query, params, size=batch_size):
+                rows = [tuple(_plain(v) for v in r) for r in rows]
+                if replace == "month":
+                    # upsert_month_lines deletes + reinserts, so mirror whole months to drop removed categories
+                    mi = columns.index("month")
+                    for tenant_id, month in sorted({(r[ti], r[mi]) for r in rows} - cleared):
+                        target.execute(
+                            tconn, f"DELETE FROM {table} WHERE tenant_id=%s AND month=%s", (tenant_id, month)
+                        )
+                        cleared.add((tenant_id, month))
+                target.bulk_upsert(tconn, table, columns, keys, rows)
+                tenants.update(r[ti] for r in rows)
+                moved += len(rows)
+                if hw_col:
+                    new_highs[read_tenant] = str(rows[-1][columns.index(hw_col)])
+
+        for tenant_id in sorted(tenants):
+            changed = [table]
+            if table in ("monthly_lines", "fx_rates"):
+                target.refresh_fx_effective(tconn, tenant_id)
+                refresh_trends(target, tconn, tenant_id)
+                changed.append("monthly_trends")
+            if table in ("monthly_lines", "fx_rates", "budgets"):
+                target.refresh_budget_status(tconn, tenant_id)
+                changed.append("budget_status")
+            if table == "meal_plans":
+                reindex_meal_plans(target, tconn, tenant_id)
+                changed.append("meal_ingredients")
+            bump_data_versions(target, tconn, changed, tenant_id)
+        synced_at = datetime.now(timezone.utc).isoformat()
+        target.bulk_upsert(
+            tconn, "sync_state", ["table_name", "tenant_id", "high_water", "synced_at"], ["table_name", "tenant_id"],
+            [(table, tenant_id, high, synced_at) for tenant_id, high in sorted(new_highs.items())],
+        )
+    return moved
+
+
+def _schema_version(db: Storage) -> int:
+    with db.connection() as conn:
+        try:
+            return schema_version(db, conn)
+        except Exception:  # no schema_version table: a database from before migrations
+            return 0
+
+
+def sync(source: Storage, target: Storage, tables=None, full: bool = False, batch_size: int = BATCH_SIZE) -> dict:
+    """Sync all (or the given) tables; `full=True` forgets high-water marks first."""
+    # The source is only read: it is never migrated, the schemas must already match.
+    init_db(target)
+    source_version, target_version = _schema_version(source), _schema_version(target)
+    if source_version != target_version:
+        raise ValueError(
+            f"source schema is at version {source_version}, target at {target_version}; "
+            "upgrade the source by starting the app (init_db) against it first"
+        )
+    tables = list(tables or TABLES)
+    if full:
+        with target.connection() as conn:
+            _init_sync_state(target, conn)
+            for t in tables:
+                target.execute(conn, "DELETE FROM sync_state WHERE table_name=%s", (t,))
+    return {t: sync_table(source, target, t, batch_size=batch_size) for t in tables}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sync Postgres finance tables into a local embedded database.")
+    parser.add_argument("--source", default=os.environ.get("DATABASE_URL"), help="source URL (default: $DATABASE_URL)")
+    parser.add_argument("--target", default="sqlite:///data/finance.db", help="embedded target URL")
+    parser.add_argument("--table", action="append", choices=list(TABLES), help="limit to these tables")
+    parser.add_argument("--full", action="store_true", help="ignore high-water marks and copy everything")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+    if not args.source:
+        parser.error("--source or DATABASE_URL is required")
+
+    try:
+        counts = sync(
+            storage_from_url(args.source), storage_from_url(args.target),
+            tables=args.table, full=args.full, batch_size=args.batch_size,
+        )
+    except ValueError as e:
+        raise SystemExit(f"error: {e}") from None
+    for table, n in counts.items():
+        print(f"{table}: {n} rows")
+
+
+if __name__ == "__main__":
+    main()
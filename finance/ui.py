@@ -0,0 +1,138 @@
+"""Streamlit helpers shared by the pages (timing panel, paged tables, FX warning, model usage)."""
+import os
+
+import streamlit as st
+
+from finance import instrument
+
+
+def track_rerun(page: str) -> None:
+    """File this session's previous rerun and start timing the current one."""
+    prev = st.session_state.get("_perf_rerun")
+    if prev is not None:
+        instrument.end_rerun(prev)
+    st.session_state["_perf_rerun"] = instrument.begin_rerun(page)
+
+
+PAGE_SIZES = [12, 24, 60, 120]
+
+
+def pager(key: str, total_rows: int, sort_options: list[str], default_sort: str = "month") -> tuple[str, bool, int, int]:
+    """
+    Sort / page-size / page controls for a table whose rows are fetched per page.
+    Returns (sort_by, descending, limit, offset) for the loader.
+    """
+    c1, c2, c3, c4 = st.columns([3, 2, 2, 2])
+    sort_by = c1.selectbox(
+        "Sort by", sort_options,
+        index=sort_options.index(default_sort) if default_sort in sort_options else 0, key=f"{key}_sort",
+    )
+    descending = c2.toggle("Descending", value=True, key=f"{key}_desc")
+    limit = c3.selectbox("Rows per page", PAGE_SIZES, index=1, key=f"{key}_size")
+    pages = max(1, -(-total_rows // limit))
+    # No max_value: it shrinks when the page size grows, so clamp instead.
+    page = min(int(c4.number_input("Page", min_value=1, value=1, step=1, key=f"{key}_page")), pages)
+    offset = (page - 1) * limit
+    st.caption(
+        f"Page {page} of {pages} · rows {min(offset + 1, total_rows)}–{min(offset + limit, total_rows)} of {total_rows}"
+    )
+    return sort_by, descending, limit, offset
+
+
+def missing_fx_warning(missing: list[tuple[str, str]] | None = None) -> None:
+    """Warn about months with foreign-currency lines but no rate of their own (default: load them)."""
+    if missing is None:
+        from finance import views
+
+        missing = views.missing_fx_rates()
+    if not missing:
+        return
+    by_month: dict[str, list[str]] = {}
+    for month, currency in missing:
+        by_month.setdefault(month, []).append(currency)
+    st.warning(
+        "Missing exchange rates for months: "
+        + ", ".join(f"{m} ({', '.join(c)})" for m, c in by_month.items())
+        + ". Until you add them in **Add Month** or import rate files in **Settings**, the latest earlier "
+        "rate is used (0 if there is none)."
+    )
+
+
+def page_name(script_path: str) -> str:
+    return os.path.splitext(os.path.basename(script_path or "app"))[0]
+
+
+def render_timing_panel(current_page: str, last_n: int = 10) -> None:
+    """Admin-only sidebar breakdown of the last `last_n` reruns per page."""
+    runs_by_page = instrument.history()
+    with st.sidebar.expander("⏱ Rerun timings"):
+        if not runs_by_page:
+            st.caption("No finished reruns yet.")
+            return
+
+        import pandas as pd
+
+        pages = sorted(runs_by_page)
+        page = st.selectbox(
+            "Page", pages, index=pages.index(current_page) if current_page in pages else 0, key="_perf_page"
+        )
+        runs = runs_by_page[page][-last_n:]
+
+        st.dataframe(pd.DataFrame([
+            {
+                "started": pd.Timestamp(r.started, unit="s").strftime("%H:%M:%S"),
+                "total ms": round(r.total * 1000, 1),
+                "queries": r.counters.get("db.query", 0),
+                "connects": r.counters.get("db.connect", 0),
+                "cache hit/miss": f"{r.counters.get('cache.hit', 0)}/{r.counters.get('cache.miss', 0)}",
+            }
+            for r in reversed(runs)
+        ]), hide_index=True, use_container_width=True)
+
+        spans = {}
+        for r in runs:
+            for name, (calls, secs) in r.spans.items():
+                agg = spans.setdefault(name, [0, 0.0])
+                agg[0] += calls
+                agg[1] += secs
+        breakdown = pd.DataFrame(
+            [(name, calls / len(runs), secs * 1000 / len(runs)) for name, (calls, secs) in spans.items()],
+            columns=["span", "calls / rerun", "ms / rerun"],
+        ).sort_values("ms / rerun", ascending=False)
+        st.caption(f"Mean over last {len(runs)} reruns (spans are inclusive, nested ones overlap)")
+        st.dataframe(breakdown.round(2), hide_index=True, use_container_width=True)
+
+        st.download_button(
+            "Prometheus metrics", instrument.prometheus_text(), file_name="finance_metrics.prom", mime="text/plain"
+        )
+
+
+def render_llm_usage() -> None:
+    """Admin-only meal-planner usage: latency percentiles, cache hits and spend per model."""
+    from finance import views
+
+    st.subheader("🤖 Model usage")
+    days = st.selectbox("Period", [7, 30, 90, 365], index=1, format_func=lambda d: f"Last {d} days", key="_llm_days")
+    usage = views.llm_usage(days)
+    if usage.empty:
+        st.caption("No model calls recorded in this period.")
+        return
+    st.dataframe(
+        usage,
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            "model": "Model",
+            "requests": st.column_config.NumberColumn("Requests", help="Weeks and re-requested days sent to the API"),
+            "cache_hits": "Cache hits",
+            "hit_rate": st.column_config.NumberColumn("Hit rate", format="percent"),
+            "p50_ms": st.column_config.NumberColumn("p50 ms", format="%.0f"),
+            "p95_ms": st.column_config.NumberColumn("p95 ms", format="%.0f"),
+            "prompt_tokens": "Prompt tokens",
+            "completion_tokens": "Completion tokens",
+            "spend_usd": st.column_config.NumberColumn("Spend", format="$%.4f"),
+            "invalid_rate": st.column_config.NumberColumn("Invalid", format="percent"),
+            "error_rate": st.column_config.NumberColumn("Errors", format="percent"),
+        },
+    )
+    st.caption("Spend at list prices (finance.meals.MODEL_PRICES); latency excludes cache hits.")
@@ -0,0 +1,146 @@
+"""
+Page-level derived frames, memoized on the data version of the tables they read
+(see finance.cache). Switching tabs or re-running a page reuses these until a
+month, FX rate or setting is actually saved. Returned frames are shared across
+sessions: do not modify them in place.
+"""
+import pandas as pd
+
+from finance import analytics, db, meals, metrics
+from finance.cache import memoize
+
+LINES = ("monthly_lines", "fx_rates", "categories")
+
+
+@memoize(*LINES)
+def lines_eur() -> pd.DataFrame:
+    return metrics.apply_fx(db.load_all_lines(), db.load_all_fx())
+
+
+@memoize(*LINES)
+def missing_fx_rates() -> list[tuple[str, str]]:
+    return db.missing_fx_rates()
+
+
+@memoize(*LINES)
+def monthly_summary(starting_savings: float) -> pd.DataFrame:
+    return metrics.monthly_summary(lines_eur(), starting_savings)
+
+
+@memoize(*LINES)
+def unusual_spending(window: int = analytics.WINDOW, threshold: float = analytics.THRESHOLD) -> pd.DataFrame:
+    """Ranked unusual category months (see finance.analytics), scored once per data version."""
+    return analytics.unusual_spending(lines_eur(), window=window, threshold=threshold)
+
+
+@memoize(*LINES)
+def income_expense_long(starting_savings: float) -> pd.DataFrame:
+    return monthly_summary(starting_savings).melt(
+        id_vars=["month"],
+        value_vars=["total_income", "total_expense"],
+        var_name="type",
+        value_name="amount",
+    )
+
+
+@memoize(*LINES)
+def category_breakdown(line_type: str) -> pd.DataFrame:
+    return db.load_category_breakdown(line_type)
+
+
+@memoize(*LINES)
+def category_long(line_type: str) -> pd.DataFrame:
+    """Positive month/category amounts in long form, for the stacked bars."""
+    wide = category_breakdown(line_type)
+    if wide.empty:
+        return pd.DataFrame(columns=["month", "category", "amount"])
+    long = wide.melt(id_vars=["month"], var_name="category", value_name="amount")
+    return long[long["amount"] > 0].reset_index(drop=True)
+
+
+#######################################################
+# Trends (materialized in monthly_trends, see finance.db.refresh_trends)
+#######################################################
+@memoize("monthly_trends")
+def trends() -> pd.DataFrame:
+    return db.load_trends()
+
+
+#######################################################
+# Budgets (precomputed in budget_status, see finance.db)
+#######################################################
+BUDGETS = ("budgets", "budget_status", "categories")
+
+
+@memoize(*BUDGETS)
+def budget_months() -> list[str]:
+    return db.list_budget_months()
+
+
+@memoize(*BUDGETS)
+def budget_status(month: str) -> pd.DataFrame:
+    return db.load_budget_status(month)
+
+
+#######################################################
+# Meal plans (indexed by ingredient in meal_ingredients, see finance.db)
+#######################################################
+MEAL_PLANS = ("meal_plans", "meal_ingredients")
+
+
+@memoize(*MEAL_PLANS)
+def saved_meal_plans() -> pd.DataFrame:
+    return db.list_meal_plans()
+
+
+@memoize(*MEAL_PLANS)
+def shopping_list(plans: tuple[tuple[str, str], ...]) -> pd.DataFrame:
+    """Aggregated ingredients of the given (week_start, dietary_style) plans."""
+    rows = meals.shopping_list(db.load_meal_index(list(plans)))
+    return pd.DataFrame(rows, columns=["ingredient", "meals", "days", "as_written"])
+
+
+@memoize(*MEAL_PLANS)
+def meal_search(query: str) -> pd.DataFrame:
+    return db.search_meal_plans(query)
+
+
+@memoize("llm_calls")
+def llm_usage(days: int = 30) -> pd.DataFrame:
+    """Per-model latency and spend over the last `days` (window fixed until the next recorded call)."""
+    since = (pd.Timestamp.now(tz="UTC") - pd.Timedelta(days=days)).isoformat()
+    return meals.llm_usage(db.load_llm_calls(since))
+
+
+#######################################################
+# Weekly plan
+#######################################################
+@memoize("weekly_plan")
+def weekly_plan() -> pd.DataFrame:
+    """The household's Monday-Friday plan; the page's editor keeps only each session's edits on top."""
+    return db.load_weekly_plan()
+
+
+#######################################################
+# Table pages (sorted and sliced in SQL, see finance.db)
+#######################################################
+@memoize(*LINES)
+def count_months(line_types: tuple[str, ...] = ("income", "expense")) -> int:
+    return db.count_months(line_types)
+
+
+@memoize(*LINES)
+def list_categories(line_type: str) -> list[str]:
+    return db.list_categories(line_type)
+
+
+@memoize(*LINES)
+def summary_page(starting_savings: float, sort_by: str, descending: bool, limit: int, offset: int) -> pd.DataFrame:
+    return db.load_summary_page(starting_savings, sort_by, descending, limit, offset)
+
+
+@memoize(*LINES)
+def category_page(
+    line_type: str, categories: tuple[str, ...], sort_by: str, descending: bool, limit: int, offset: int
+) -> pd.DataFrame:
+    return db.load_category_page(line_type, categories, sort_by, descending, limit, offset)
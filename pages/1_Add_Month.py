@@ -1,8 +1,10 @@
 import streamlit as st
 import pandas as pd
-from finance.db import get_settings, upsert_month_lines, load_month_lines
+from finance.db import get_categories, upsert_month_lines, load_month_lines
 from finance.db import get_fx_rate, upsert_fx_rate
 from finance.db import init_db
+from finance import money
+from finance.metrics import convert_cents, to_cents
 from finance.auth import require_login
 
 # Authentification
@@ -14,23 +16,34 @@ init_db()
 # Set page title
 st.title("➕ Add Month (Enter totals for previous month)")
 
-settings = get_settings()
-expense_cats = [c.strip() for c in settings["expense_categories"].split(",") if c.strip()]
-income_cats = [c.strip() for c in settings["income_categories"].split(",") if c.strip()]
+# Ordered, non-archived categories (cached per data version)
+expense_categories = get_categories("expense")
+income_categories = get_categories("income")
+expense_cats = [c.name for c in expense_categories]
+income_cats = [c.name for c in income_categories]
+category_currency = {c.name: c.currency for c in expense_categories + income_categories}
+foreign = sorted({c for c in category_currency.values() if c != "EUR"})
 
 month = st.text_input("Month to add (YYYY-MM)", value="2025-12", help="Example: 2025-11")
-st.subheader("Exchange rate for this month")
-
-existing_fx = get_fx_rate(month) if month else None
+st.subheader("Exchange rates for this month")
+if foreign:
+    st.caption(
+        "Prefilled with the latest known rate; amounts of these categories are entered in their own currency. "
+        "A rate is saved for this month only for currencies with amounts."
+    )
 
-rub_to_eur = st.number_input(
-    "RUB → EUR rate (EUR per 1 RUB). Example: 0.0102",
-    min_value=0.0,
-    value=float(existing_fx) if existing_fx is not None else 0.0,
-    step=0.0001,
-    format="%.6f",
-    help="If you have salary_moscow in RUB for this month, this rate is required."
-)
+rates = {}
+for fx_col, currency in zip(st.columns(max(len(foreign), 1)), foreign):
+    existing_fx = get_fx_rate(month, currency) if month else None
+    rates[currency] = fx_col.number_input(
+        f"{currency} → EUR rate (EUR per 1 {currency})",
+        min_value=0.0,
+        value=float(existing_fx) if existing_fx is not None else 0.0,
+        step=0.0001,
+        format="%.6f",
+        help=f"Required if any {currency} category has an amount this month.",
+        key=f"fx_{currency}",
+    )
 
 
 col1, col2 = st.columns(2)
@@ -42,7 +55,8 @@ if month:
 def make_editor_df(categories, existing_df, line_type):
     base = pd.DataFrame({"category": categories, "amount": 0.0})
     if not existing_df.empty:
-        ex = existing_df[existing_df["line_type"] == line_type][["category", "amount"]]
+        ex = existing_df[existing_df["line_type"] == line_type]
+        ex = pd.DataFrame({"category": ex["category"], "amount": ex["amount_cents"] / money.CENTS})
         if not ex.empty:
             base = base.merge(ex, on="category", how="left", suffixes=("", "_old"))
             base["amount"] = base["amount_old"].fillna(base["amount"])
@@ -61,7 +75,7 @@ with col1:
         },
         use_container_width=True,
         key="inc_editor"
-    )
+    ).fillna({"amount": 0.0})  # a cleared cell counts as 0
 
 with col2:
     st.subheader("Expenses")
@@ -83,7 +97,7 @@ with col2:
             },
             use_container_width=True,
             key="exp_tat_editor"
-        )
+        ).fillna({"amount": 0.0})  # a cleared cell counts as 0
 
     with t2:
         st.markdown("**Ben**")
@@ -96,7 +110,7 @@ with col2:
             },
             use_container_width=True,
             key="exp_ben_editor"
-        )
+        ).fillna({"amount": 0.0})  # a cleared cell counts as 0
 
     st.caption("Tip: Use negative values only for corrections/refunds (e.g., -150).")
 
@@ -104,38 +118,27 @@ with col2:
     if neg_exp:
         st.info("You have negative expense entries. These will reduce total expenses (treated as corrections/refunds).")
 
-    # Combined expenses (for totals / later saving if needed)
+    # Combined expenses (for totals / later saving if needed), added in cents
     exp_edit = exp_tat_edit.copy()
-    exp_edit["amount"] = exp_tat_edit["amount"].astype(float) + exp_ben_edit["amount"].astype(float)
-
-
-
-# Raw totals
-total_income_raw = float(inc_edit["amount"].sum())
-total_expense_eur_raw = float(exp_edit["amount"].sum())
-
-def is_rub_income_category(cat: str) -> bool:
-    return "moscow" in (cat or "").strip().lower()
+    exp_edit["amount"] = (to_cents(exp_tat_edit["amount"]) + to_cents(exp_ben_edit["amount"])) / money.CENTS
 
 
-# Sum all RUB incomes (any category containing salary_moscow)
-rub_mask = inc_edit["category"].apply(is_rub_income_category)
-rub_mask_exp = exp_edit["category"].apply(is_rub_income_category)
 
-moscow_rub_inc = float(inc_edit.loc[rub_mask, "amount"].sum())
-moscow_rub_exp = float(exp_edit.loc[rub_mask_exp, "amount"].sum())
+def to_eur_cents(edit: pd.DataFrame) -> pd.Series:
+    currency = edit["category"].map(category_currency).fillna("EUR")
+    rate_e8 = {c: money.to_rate(r) for c, r in rates.items()}
+    rate = currency.map(rate_e8).fillna(money.FX_SCALE).where(currency != "EUR", money.FX_SCALE)
+    return pd.Series(convert_cents(to_cents(edit["amount"]), rate), index=edit.index)
 
-income_ex_moscow_eur = total_income_raw - moscow_rub_inc
-expenses_ex_moscow_eur = total_expense_eur_raw - moscow_rub_exp
 
-# Convert RUB -> EUR
-moscow_eur = moscow_rub_inc * float(rub_to_eur) if rub_to_eur and rub_to_eur > 0 else 0.0
-moscow_exp_eur = moscow_rub_exp * float(rub_to_eur) if rub_to_eur and rub_to_eur > 0 else 0.0
-
-
-total_income_eur = income_ex_moscow_eur + moscow_eur
-total_expense_eur = expenses_ex_moscow_eur + moscow_exp_eur
-net_eur = total_income_eur - total_expense_eur
+# Totals in EUR (foreign-currency categories converted with this month's rates), summed in cents
+income_cents = to_eur_cents(inc_edit)
+total_income_cents = int(income_cents.sum())
+total_expense_cents = int(to_eur_cents(exp_edit).sum())
+total_income_eur = money.from_cents(total_income_cents)
+total_expense_eur = money.from_cents(total_expense_cents)
+net_eur = money.from_cents(total_income_cents - total_expense_cents)
+foreign_income_eur = money.from_cents(int(income_cents[inc_edit["category"].map(category_currency).isin(foreign)].sum()))
 
 st.markdown("---")
 c1, c2, c3, c4 = st.columns(4)
@@ -145,7 +148,7 @@ c2.metric("Total expense (EUR)", f"{total_expense_eur:,.2f} €")
 c3.metric("Net (EUR)", f"{net_eur:,.2f} €")
 
 # Optional but useful transparency:
-c4.metric("Moscow salary (EUR)", f"{moscow_eur:,.2f} €")
+c4.metric("Foreign-currency income (EUR)", f"{foreign_income_eur:,.2f} €")
 
 
 save = st.button("💾 Save month", type="primary", disabled=not bool(month))
@@ -155,6 +158,15 @@ if save:
         st.error("Month must be in format YYYY-MM (e.g., 2025-11).")
         st.stop()
 
+    # A currency that has amounts this month needs a rate
+    entered = pd.concat([inc_edit, exp_tat_edit, exp_ben_edit])
+    entered_currency = entered["category"].map(category_currency)
+    used = set(entered_currency[entered["amount"] != 0]) & set(rates)
+    for currency in sorted(used):
+        if rates[currency] <= 0:
+            st.error(f"You entered {currency} amounts but the {currency}→EUR rate is missing/zero.")
+            st.stop()
+
     inc_lines = [(r["category"], float(r["amount"])) for _, r in inc_edit.iterrows()]
     exp_tat_lines = [(r["category"], float(r["amount"])) for _, r in exp_tat_edit.iterrows()]
     exp_ben_lines = [(r["category"], float(r["amount"])) for _, r in exp_ben_edit.iterrows()]
@@ -165,19 +177,10 @@ if save:
     upsert_month_lines(month, "expense_ben", exp_ben_lines)
     upsert_month_lines(month, "income", inc_lines)
 
-    # Save FX rate if provided
-    # Only enforce if salary_moscow > 0 in the income table
-    # moscow_rub = float(inc_edit.loc[inc_edit["category"] == "salary_moscow", "amount"].sum()) if "salary_moscow" in inc_edit["category"].values else 0.0
-    rub_mask = inc_edit["category"].apply(is_rub_income_category)
-    moscow_rub = float(inc_edit.loc[rub_mask, "amount"].sum())
-
-
-    if moscow_rub > 0 and rub_to_eur <= 0:
-        st.error("You entered salary_moscow (RUB) but the RUB→EUR rate is missing/zero.")
-        st.stop()
-
-    if rub_to_eur > 0:
-        upsert_fx_rate(month, rub_to_eur)
+    # Saving amounts confirms the (prefilled or edited) rate of their currency as
+    # this month's own; rates carried forward for unused currencies stay unset.
+    for currency in sorted(used):
+        upsert_fx_rate(month, rates[currency], currency)
 
     st.success(f"Saved {month}.")
     st.rerun()
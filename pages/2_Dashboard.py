@@ -1,184 +1,172 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
 
-from finance.db import get_settings, load_all_lines, load_all_fx
+from finance import analytics, charts, views
+from finance.aio import dashboard_bundle
+from finance.db import BUDGET_LINE_TYPES, SUMMARY_SORT_COLUMNS
+from finance.instrument import timed
 from finance.auth import require_login
+from finance.ui import missing_fx_warning, pager
 
 # Authentification
 require_login()
 
 
 
-# -----------------------------
-# Helpers
-# -----------------------------
-def is_moscow_category(cat: str) -> bool:
-    return "moscow" in (cat or "").strip().lower()
-
-
-def apply_fx_to_lines(lines: pd.DataFrame) -> pd.DataFrame:
-    """
-    Add amount_eur column:
-      - If category contains 'moscow' => treat amount as RUB and convert using month FX
-      - Else treat amount as already EUR
-    If FX missing for a Moscow line, convert to 0.0 EUR (and we warn in UI).
-    """
-    if lines is None or lines.empty:
-        return pd.DataFrame(columns=list(lines.columns) + ["amount_eur"]) if lines is not None else pd.DataFrame()
-
-    fx = load_all_fx()
-    fx_map = {}
-    if fx is not None and not fx.empty:
-        # Expect fx columns: month, rub_to_eur (or second column storing the rate)
-        if "rub_to_eur" in fx.columns:
-            fx_map = dict(zip(fx["month"], fx["rub_to_eur"]))
-        else:
-            # Fallback: assume second column is the rate
-            rate_col = [c for c in fx.columns if c != "month"][0]
-            fx_map = dict(zip(fx["month"], fx[rate_col]))
-
-    df = lines.copy()
-
-    def to_eur(row):
-        amt = float(row["amount"])
-        if is_moscow_category(row.get("category", "")):
-            rate = float(fx_map.get(row.get("month", ""), 0.0))
-            return amt * rate if rate > 0 else 0.0
-        return amt
-
-    df["amount_eur"] = df.apply(to_eur, axis=1)
-    return df
-
-
-def monthly_summary_eur(lines_eur: pd.DataFrame, starting_savings: float) -> pd.DataFrame:
-    """
-    Compute monthly totals using amount_eur.
-    Uses ONLY line_type == 'expense' (the combined table) to avoid double counting.
-    """
-    if lines_eur.empty:
-        return pd.DataFrame()
-
-    income = (
-        lines_eur[lines_eur["line_type"] == "income"]
-        .groupby("month")["amount_eur"].sum()
-        .rename("total_income")
-    )
-    expense = (
-        lines_eur[lines_eur["line_type"] == "expense"]
-        .groupby("month")["amount_eur"].sum()
-        .rename("total_expense")
-    )
-
-    out = pd.concat([income, expense], axis=1).fillna(0.0).reset_index()
-    out = out.sort_values("month")
-
-    out["net"] = out["total_income"] - out["total_expense"]
-    out["savings_start"] = starting_savings + out["net"].cumsum() - out["net"]
-    out["savings_end"] = starting_savings + out["net"].cumsum()
-
-    # Optional formatting / ordering
-    out = out[["month", "total_income", "total_expense", "net", "savings_start", "savings_end"]]
-    return out
-
-
-def category_breakdown_eur(lines_eur: pd.DataFrame, line_type: str) -> pd.DataFrame:
-    """
-    Pivot monthly category totals using amount_eur.
-    For expenses, pass line_type='expense' (combined) to match your totals.
-    """
-    df = lines_eur[lines_eur["line_type"] == line_type].copy()
-    if df.empty:
-        return pd.DataFrame()
-
-    wide = (
-        df.pivot_table(
-            index="month",
-            columns="category",
-            values="amount_eur",
-            aggfunc="sum",
-            fill_value=0.0,
-        )
-        .reset_index()
-    )
-
-    return wide
-
-
 # -----------------------------
 # UI
 # -----------------------------
 st.title("📊 Dashboard")
 
-settings = get_settings()
-starting_savings = float(settings.get("starting_savings", "0"))
-
-lines = load_all_lines()
-if lines is None or lines.empty:
+# Settings, lines, FX gaps and table sizes are independent: load them concurrently.
+# Derived frames are memoized on the data version, so reruns (e.g. tab switches) reuse them
+bundle = dashboard_bundle()
+starting_savings = bundle.settings.starting_savings
+if bundle.lines_eur.empty:
     st.info("No data yet. Go to **Add Month** and enter your first month.")
     st.stop()
 
-# Convert to EUR the same way as Add Month
-lines_eur = apply_fx_to_lines(lines)
-
-# Warn if any Moscow lines exist but FX missing for that month
-if not lines.empty:
-    fx = load_all_fx()
-    fx_months = set(fx["month"].tolist()) if fx is not None and not fx.empty and "month" in fx.columns else set()
+missing_fx_warning(bundle.missing_rates)
 
-    moscow_months_income = lines[
-        (lines["line_type"] == "income")
-        & (lines["category"].astype(str).str.lower().str.contains("moscow", na=False))
-        & (lines["amount"] > 0)
-    ]["month"].unique().tolist()
+n_months = bundle.n_months
+if not n_months:
+    st.info("No data yet. Go to **Add Month** and enter your first month.")
+    st.stop()
 
-    moscow_months_expense = lines[
-        (lines["line_type"] == "expense")
-        & (lines["category"].astype(str).str.lower().str.contains("moscow", na=False))
-        & (lines["amount"] > 0)
-    ]["month"].unique().tolist()
+# Tables are sorted and paged in SQL: only the visible slice is fetched and sent to the browser
+DEFAULT_COLUMNS = 10
 
-    moscow_months = sorted(set(moscow_months_income + moscow_months_expense))
-    missing = [m for m in moscow_months if m not in fx_months]
 
-    if missing:
+def category_table(line_type: str):
+    categories = bundle.categories[line_type]
+    columns = st.multiselect(
+        "Columns", categories, default=categories[:DEFAULT_COLUMNS], key=f"{line_type}_columns",
+        help="Largest categories first.",
+    )
+    if not columns:
+        st.caption("Pick at least one category to show the table.")
+        return
+    sort_by, descending, limit, offset = pager(
+        f"{line_type}_table", bundle.months[line_type], ["month", "total", *columns]
+    )
+    page = views.category_page(line_type, tuple(columns), sort_by, descending, limit, offset)
+    st.dataframe(page, hide_index=True, use_container_width=True)
+
+
+# Budgets: read from the precomputed budget_status (updated on every save)
+st.subheader("Budgets (EUR)")
+if not bundle.budget_months:
+    st.caption("No budgets yet. Set monthly limits per category in **Settings**.")
+else:
+    budget_month = st.selectbox("Month", bundle.budget_months, key="budget_month")
+    status = views.budget_status(budget_month)
+    over = status[status["over_budget"]]
+    if not over.empty:
         st.warning(
-            "Missing RUB→EUR rate for months: "
-            + ", ".join(missing)
-            + ". Add it in **Add Month** to get correct totals."
+            "Over budget in " + budget_month + ": "
+            + ", ".join(f"{r.category} ({BUDGET_LINE_TYPES[r.line_type]}, {-r.remaining:,.2f} € over)" for r in over.itertuples())
         )
+    st.dataframe(
+        status.assign(owner=status["line_type"].map(BUDGET_LINE_TYPES))[
+            ["owner", "category", "spent", "limit", "remaining", "over_budget"]
+        ],
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            "spent": st.column_config.NumberColumn(format="%.2f"),
+            "limit": st.column_config.NumberColumn(format="%.2f"),
+            "remaining": st.column_config.NumberColumn(format="%.2f"),
+            "over_budget": st.column_config.CheckboxColumn("over budget"),
+        },
+    )
 
-summary = monthly_summary_eur(lines_eur, starting_savings)
-if summary.empty:
-    st.info("No data yet. Go to **Add Month** and enter your first month.")
-    st.stop()
+# Trends: rolling averages, YoY and shares, materialized per month when data is saved
+st.subheader("Trends")
+trends = views.trends()
+if not trends.empty:
+    latest = trends.iloc[-1]
+
+    def _eur(value) -> str:
+        return "–" if value != value else f"{value:,.2f} €"
+
+    def _pct(value) -> str:
+        return "–" if value != value else f"{value:.0%}"
+
+    t1, t2, t3, t4 = st.columns(4)
+    t1.metric(f"Savings rate ({latest['month']})", _pct(latest["savings_rate"]),
+              help="Net / income of the latest month.")
+    t2.metric("Expense, 12-month average", _eur(latest["expense_avg_12"]))
+    t3.metric("Expense", _eur(latest["expense"]),
+              delta=None if latest["expense_yoy"] != latest["expense_yoy"] else f"{latest['expense_yoy']:+,.2f} €",
+              delta_color="inverse", help="Change against the same month a year earlier.")
+    t4.metric("Tatiana / Ben share", "–" if latest["tatiana_share"] != latest["tatiana_share"]
+              else f"{latest['tatiana_share']:.0%} / {1 - latest['tatiana_share']:.0%}",
+              help="Shares of the two personal expense lines.")
+    flow = st.radio("Rolling averages of", ["expense", "income", "net"], horizontal=True, key="trend_flow")
+    with timed("chart.trend"):
+        st.plotly_chart(charts.figure(charts.trend_json(flow)), use_container_width=True)
+
+# Unusual spending: every category/person series scored against its own last 12 months
+UNUSUAL_ROWS = 20
+st.subheader("Unusual spending (EUR)")
+unusual = views.unusual_spending()
+if unusual.empty:
+    st.caption(
+        f"Nothing unusual. Months are compared with the {analytics.WINDOW} months before them, "
+        "so this needs more than a year of history."
+    )
+else:
+    st.caption(
+        f"Category months furthest from their usual level (median of the previous {analytics.WINDOW} months), "
+        f"most unusual first; {len(unusual)} in total."
+    )
+    st.dataframe(
+        unusual.head(UNUSUAL_ROWS).assign(owner=unusual["line_type"].map(BUDGET_LINE_TYPES))[
+            ["month", "owner", "category", "amount", "typical", "deviation", "z"]
+        ],
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            "amount": st.column_config.NumberColumn(format="%.2f"),
+            "typical": st.column_config.NumberColumn(format="%.2f"),
+            "deviation": st.column_config.NumberColumn(format="%+.2f"),
+            "z": st.column_config.NumberColumn("score", format="%.1f"),
+        },
+    )
 
 # Summary table
 st.subheader("Monthly summary (EUR)")
-st.dataframe(summary, use_container_width=True)
+sort_by, descending, limit, offset = pager("summary_table", n_months, SUMMARY_SORT_COLUMNS)
+summary_page = views.summary_page(starting_savings, sort_by, descending, limit, offset)
+st.dataframe(summary_page, hide_index=True, use_container_width=True)
+
+# Charts are cached as JSON per data version; long histories are shown per quarter/year
+grain = charts.granularity(n_months)
+detail = False
+if grain != "month":
+    detail = st.toggle(
+        "Monthly detail", value=False,
+        help=f"{n_months} months of history are shown per {grain}. Turn on to plot every month.",
+    )
 
 # Savings line
 st.subheader("Savings over time")
-fig = px.line(summary, x="month", y="savings_end", markers=True)
-st.plotly_chart(fig, use_container_width=True)
+with timed("chart.savings"):
+    fig = charts.figure(charts.savings_json(starting_savings, detail))
+    st.plotly_chart(fig, use_container_width=True)
 
 # Income/Expense bars
 c1, c2 = st.columns(2)
 with c1:
     st.subheader("Income vs Expense")
-    melt = summary.melt(
-        id_vars=["month"],
-        value_vars=["total_income", "total_expense"],
-        var_name="type",
-        value_name="amount",
-    )
-    fig2 = px.bar(melt, x="month", y="amount", color="type", barmode="group")
-    st.plotly_chart(fig2, use_container_width=True)
+    with timed("chart.income_vs_expense"):
+        fig2 = charts.figure(charts.income_vs_expense_json(starting_savings, detail))
+        st.plotly_chart(fig2, use_container_width=True)
 
 with c2:
     st.subheader("Net cashflow")
-    fig3 = px.bar(summary, x="month", y="net")
-    st.plotly_chart(fig3, use_container_width=True)
+    with timed("chart.net"):
+        fig3 = charts.figure(charts.net_json(starting_savings, detail))
+        st.plotly_chart(fig3, use_container_width=True)
 
 # Category breakdown
 st.subheader("Category breakdown (EUR)")
@@ -186,23 +174,19 @@ tab1, tab2 = st.tabs(["Expenses", "Income"])
 
 with tab1:
     # IMPORTANT: use "expense" (combined) so it matches your totals
-    wide_exp = category_breakdown_eur(lines_eur, "expense")
-    if wide_exp.empty:
+    if not bundle.categories["expense"]:
         st.info("No expenses yet.")
     else:
-        long_exp = wide_exp.melt(id_vars=["month"], var_name="category", value_name="amount")
-        long_exp = long_exp[long_exp["amount"] > 0]
-        fig4 = px.bar(long_exp, x="month", y="amount", color="category", barmode="stack")
-        st.plotly_chart(fig4, use_container_width=True)
-        st.dataframe(wide_exp, use_container_width=True)
+        with timed("chart.expense_categories"):
+            fig4 = charts.figure(charts.categories_json("expense", detail))
+            st.plotly_chart(fig4, use_container_width=True)
+        category_table("expense")
 
 with tab2:
-    wide_inc = category_breakdown_eur(lines_eur, "income")
-    if wide_inc.empty:
+    if not bundle.categories["income"]:
         st.info("No income yet.")
     else:
-        long_inc = wide_inc.melt(id_vars=["month"], var_name="category", value_name="amount")
-        long_inc = long_inc[long_inc["amount"] > 0]
-        fig5 = px.bar(long_inc, x="month", y="amount", color="category", barmode="stack")
-        st.plotly_chart(fig5, use_container_width=True)
-        st.dataframe(wide_inc, use_container_width=True)
+        with timed("chart.income_categories"):
+            fig5 = charts.figure(charts.categories_json("income", detail))
+            st.plotly_chart(fig5, use_container_width=True)
+        category_table("income")
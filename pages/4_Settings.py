@@ -1,7 +1,9 @@
+import pandas as pd
 import streamlit as st
-# from finance.db import get_settings, set_setting
-from finance.db import init_db, get_or_create_settings, set_setting
+from finance.db import CURRENCIES, init_db, get_or_create_settings, get_categories, save_categories, update_settings
+from finance.db import BUDGET_LINE_TYPES, category_names, load_budgets, save_budgets
 from finance.auth import require_login
+from finance.rates import import_rates, rates_dir
 
 # Authentification
 require_login()
@@ -13,46 +15,122 @@ settings = get_or_create_settings()
 
 st.title("⚙️ Settings")
 
-# settings = get_settings()
-
 st.subheader("Starting savings")
 starting = st.number_input(
     "Starting savings (used for the first month running balance)",
-    value=float(settings.get("starting_savings", "0")),
+    value=settings.starting_savings,
     step=100.0
 )
 if st.button("Save starting savings"):
-    set_setting("starting_savings", str(starting))
+    update_settings(starting_savings=float(starting))
     st.success("Saved.")
     st.rerun()
 
 st.markdown("---")
 st.subheader("Categories")
-
-expense_str = st.text_area(
-    "Expense categories (comma-separated)",
-    value=settings.get("expense_categories", "")
+st.caption(
+    "Renaming a category keeps its past months. Archive a category to hide it from **Add Month** "
+    "without losing its history; change **position** to reorder. A category's **currency** applies "
+    "to months entered from now on; saved months keep the currency they were entered in."
 )
 
-income_str = st.text_area(
-    "Income categories (comma-separated)",
-    value=settings.get("income_categories", "")
-)
+
+def category_editor(kind: str, label: str) -> pd.DataFrame:
+    df = pd.DataFrame(
+        [(c.id, c.position, c.name, c.currency, c.archived) for c in get_categories(kind, include_archived=True)],
+        columns=["id", "position", "name", "currency", "archived"],
+    )
+    st.markdown(f"**{label}**")
+    return st.data_editor(
+        df,
+        num_rows="dynamic",
+        hide_index=True,
+        column_order=["position", "name", "currency", "archived"],
+        column_config={
+            "position": st.column_config.NumberColumn(step=1),
+            "currency": st.column_config.SelectboxColumn(options=CURRENCIES),
+        },
+        use_container_width=True,
+        key=f"{kind}_categories_editor",
+    )
+
+
+c1, c2 = st.columns(2)
+with c1:
+    expense_edit = category_editor("expense", "Expense categories")
+with c2:
+    income_edit = category_editor("income", "Income categories")
 
 if st.button("Save categories"):
-    set_setting("expense_categories", expense_str)
-    set_setting("income_categories", income_str)
+    try:
+        for kind, edited in [("expense", expense_edit), ("income", income_edit)]:
+            rows = edited.sort_values("position", kind="stable", na_position="last")
+            save_categories(kind, rows.astype(object).where(rows.notna(), None).to_dict("records"))
+    except ValueError as e:
+        st.error(str(e))
+        st.stop()
     st.success("Saved. Go to **Add Month** to see updated categories.")
     st.rerun()
 
+st.markdown("---")
+st.subheader("Budgets")
+st.caption(
+    "Monthly limits in EUR per expense category, for the household (combined expenses) or one person. "
+    "The **Dashboard** shows what is left of each and flags categories over their limit."
+)
+budgets = load_budgets()
+budget_df = pd.DataFrame({
+    "owner": budgets["line_type"].map(BUDGET_LINE_TYPES),
+    "category": budgets["category"],
+    "limit": budgets["limit"].astype(float),
+})
+budget_edit = st.data_editor(
+    budget_df,
+    num_rows="dynamic",
+    hide_index=True,
+    column_config={
+        "owner": st.column_config.SelectboxColumn(options=list(BUDGET_LINE_TYPES.values()), default="Household"),
+        "category": st.column_config.SelectboxColumn(options=category_names("expense")),
+        "limit": st.column_config.NumberColumn("monthly limit (EUR)", min_value=0.0, step=10.0, format="%.2f"),
+    },
+    use_container_width=True,
+    key="budgets_editor",
+)
+if st.button("Save budgets"):
+    owners = {label: line_type for line_type, label in BUDGET_LINE_TYPES.items()}
+    rows = budget_edit.astype(object).where(budget_edit.notna(), None).to_dict("records")
+    try:
+        save_budgets([
+            {"line_type": owners.get(r["owner"] or "Household"), "category": r["category"], "limit": r["limit"]}
+            for r in rows
+        ])
+    except ValueError as e:
+        st.error(str(e))
+        st.stop()
+    st.success("Saved.")
+    st.rerun()
+
+st.markdown("---")
+st.subheader("Exchange rates")
+st.caption(
+    f"Import historical rates from ECB files (eurofxref-hist CSV/XML/ZIP or ECB Data Portal CSV exports) "
+    f"placed in `{rates_dir()}`. Daily quotes are averaged per month; imported months replace typed-in rates."
+)
+if st.button("Import rate files"):
+    try:
+        n = import_rates()
+    except ValueError as e:
+        st.error(str(e))
+        st.stop()
+    st.success(f"Imported {n} monthly rates.")
+
 st.markdown("---")
 st.subheader("Simple passcode protection (for sharing)")
 
-enabled = st.checkbox("Enable passcode", value=(settings.get("app_passcode_enabled", "0") == "1"))
-passcode = st.text_input("Passcode", type="password", value=settings.get("app_passcode", ""))
+enabled = st.checkbox("Enable passcode", value=settings.passcode_enabled)
+passcode = st.text_input("Passcode", type="password", value=settings.passcode)
 
 if st.button("Save passcode settings"):
-    set_setting("app_passcode_enabled", "1" if enabled else "0")
-    set_setting("app_passcode", passcode)
+    update_settings(passcode_enabled=enabled, passcode=passcode)
     st.success("Saved.")
     st.rerun()
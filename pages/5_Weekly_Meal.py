@@ -1,162 +1,84 @@
 import json
-import os
-from datetime import date, timedelta
+from datetime import date
 from dotenv import load_dotenv
 
 import streamlit as st
-from openai import OpenAI
 
 st.set_page_config(page_title="Weekly Meal Ideas", page_icon="🥗", layout="wide")
+from finance import db, views
 from finance.auth import require_login
+from finance.context import get_context
+from finance.ui import render_llm_usage
+from finance.meals import PlanRequest, PlanResult, build_prompt, generate_plans_sync, next_monday, week_starts
 
 # Authentification
 require_login()
+db.init_db()
 
 
 load_dotenv()
 
-# client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
-client = OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
-
-DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-
-def next_monday(d: date) -> date:
-    return d + timedelta(days=(7 - d.weekday()) % 7)  # weekday: Mon=0
-
-def build_prompt(
-    family_size: int,
-    dietary_style: str,
-    exclusions: str,
-    time_budget: str,
-    budget_level: str,
-    extra_notes: str,
-    week_start: str,
-) -> str:
-    return f"""
-You are a nutrition-focused meal planner.
-
-Create a 7-day meal plan starting on {week_start} (Monday to Sunday).
-The plan must be:
-- Low-fat overall (avoid frying; prefer grilling/baking/steaming; minimal added oils; lean proteins).
-- Highly nutritious (whole foods; vegetables; legumes; whole grains; lean proteins).
-- Include fruit every day (at least 1 serving/day; can be part of breakfast or meal).
-- Practical for a household of {family_size} people.
-- Dietary style preference: {dietary_style}.
-- Exclusions/allergies: {exclusions if exclusions.strip() else "none"}.
-- Time budget: {time_budget}.
-- Budget level: {budget_level}.
-- Notes: {extra_notes if extra_notes.strip() else "none"}.
-
-Return ONLY valid JSON that matches exactly this schema:
-
-{{
-  "week_start": "{week_start}",
-  "days": [
-    {{
-      "day": "Monday",
-      "breakfast": {{
-        "name": "...",
-        "key_ingredients": ["...", "..."],
-        "fruit_included": ["..."],
-        "prep_time_minutes": 0
-      }},
-      "lunch": {{
-        "name": "...",
-        "key_ingredients": ["...", "..."],
-        "fruit_included": ["..."],
-        "prep_time_minutes": 0
-      }},
-      "dinner": {{
-        "name": "...",
-        "key_ingredients": ["...", "..."],
-        "fruit_included": ["..."],
-        "prep_time_minutes": 0
-      }},
-      "nutrition_notes": ["1 short bullet", "1 short bullet"]
-    }}
-  ],
-  "overall_tips": ["...", "..."]
-}}
-
-Rules:
-- Exactly 7 elements in "days", in order Monday..Sunday.
-- Each day must include fruit in at least one meal. Put fruit items in that meal’s fruit_included list.
-- Keep names simple and family-friendly.
-- Keep prep_time_minutes realistic (5–45 typically).
-- Do NOT include any text before or after the JSON.
-- Do NOT wrap JSON in ``` fences.
-""".strip()
-
-def validate_plan(plan: dict) -> tuple[bool, str]:
-    if "days" not in plan or not isinstance(plan["days"], list) or len(plan["days"]) != 7:
-        return False, "Plan must contain exactly 7 days."
-    for i, day in enumerate(plan["days"]):
-        expected_day = DAYS[i]
-        if day.get("day") != expected_day:
-            return False, f"Day {i+1} should be {expected_day}."
-        for meal in ["breakfast", "lunch", "dinner"]:
-            if meal not in day:
-                return False, f"Missing {meal} for {expected_day}."
-            fruit = day[meal].get("fruit_included", [])
-            # fruit can be empty for a meal, but we need at least one fruit serving in the day overall
-        day_fruit = (
-            day["breakfast"].get("fruit_included", [])
-            + day["lunch"].get("fruit_included", [])
-            + day["dinner"].get("fruit_included", [])
+def plan_requests(prompt_args: dict, weeks: list[str], styles: list[str]) -> dict[tuple[str, str], PlanRequest]:
+    """One request per (week, dietary style); labels name the week, plus the style when there are several."""
+    return {
+        (week, style): PlanRequest(
+            f"{week} · {style}" if len(styles) > 1 else week,
+            build_prompt(**prompt_args, dietary_style=style, week_start=week),
         )
-        if not day_fruit:
-            return False, f"No fruit included on {expected_day}."
-    return True, "OK"
-
-# @st.cache_data(ttl=60 * 60 * 24, show_spinner=False)
-# def generate_weekly_plan(prompt: str, model: str) -> dict:
-#     # Using Responses API style via the OpenAI python client
-#     resp = client.responses.create(
-#         model=model,
-#         input=prompt,
-#         # You can set temperature lower for more consistent formatting
-#         temperature=0.3,
-#     )
-#     text = resp.output_text
-#     return json.loads(text)
-
-def try_parse_json(text: str) -> dict | None:
-    try:
-        return json.loads(text)
-    except Exception:
-        return None
-
-def repair_to_json(bad_text: str, model: str) -> dict:
-    repair_prompt = f"""
-Fix the following so it becomes VALID JSON matching the schema.
-Return ONLY the corrected JSON.
-
-BAD OUTPUT:
-{bad_text}
-""".strip()
-
-    resp = client.responses.create(
-        model=model,
-        input=repair_prompt,
-        temperature=0,
-        response_format={"type": "json_object"},
+        for week in weeks
+        for style in styles
+    }
+
+
+def render_shopping_list(plans: tuple[tuple[str, str], ...], key: str):
+    items = views.shopping_list(plans)
+    if items.empty:
+        st.caption("No ingredients indexed for this selection.")
+        return
+    st.dataframe(
+        items,
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            "ingredient": "Ingredient",
+            "meals": st.column_config.NumberColumn("Meals", help="Meals using it"),
+            "days": "Days",
+            "as_written": "As written in the plans",
+        },
     )
-    return json.loads(resp.output_text)
-
-@st.cache_data(ttl=60 * 60 * 24, show_spinner=False)
-def generate_weekly_plan(prompt: str, model: str) -> dict:
-    resp = client.chat.completions.create(
-        model=model,
-        messages=[
-            {"role": "system", "content": "You output only valid JSON."},
-            {"role": "user", "content": prompt},
-        ],
-        temperature=0.3,
-        response_format={"type": "json_object"},
+    st.download_button(
+        "Download shopping list (CSV)",
+        data=items.to_csv(index=False),
+        file_name=f"shopping_list_{key.split('_', 1)[1].replace(' · ', '_')}.csv",
+        mime="text/csv",
+        key=f"shopping_{key}",
     )
 
-    text = resp.choices[0].message.content
-    return json.loads(text)
+
+def render_plan(label: str, plan: dict, saved: tuple[str, str] | None = None):
+    st.markdown("## Week overview")
+    if "overall_tips" in plan:
+        for tip in plan["overall_tips"]:
+            st.write(f"- {tip}")
+
+    if saved is not None:
+        with st.expander("🛒 Shopping list"):
+            render_shopping_list((saved,), key=f"plan_{saved[0]}_{saved[1]}_{label}")
+
+    st.markdown("---")
+
+    for d in plan["days"]:
+        render_day(d)
+        st.markdown("---")
+
+    # Download JSON
+    st.download_button(
+        "Download plan as JSON",
+        data=json.dumps(plan, indent=2),
+        file_name=f"meal_plan_{label.replace(' · ', '_')}.json",
+        mime="application/json",
+        key=f"download_{label}",
+    )
 
 
 def render_day(day_obj: dict):
@@ -177,6 +99,8 @@ def render_day(day_obj: dict):
 # ---------------- UI ----------------
 st.title("🥗 Weekly Meal Ideas (Low-fat, Nutritious, Fruit daily)")
 
+DIETARY_STYLES = ["Balanced", "Mediterranean", "High-protein", "Vegetarian", "Pescatarian", "Dairy-free", "Gluten-free"]
+
 today = date.today()
 week_start = next_monday(today)
 week_start_str = week_start.isoformat()
@@ -184,74 +108,129 @@ week_start_str = week_start.isoformat()
 with st.sidebar:
     st.header("Preferences")
     family_size = st.number_input("Family size", min_value=1, max_value=12, value=4)
-    dietary_style = st.selectbox(
-        "Dietary style",
-        ["Balanced", "Mediterranean", "High-protein", "Vegetarian", "Pescatarian", "Dairy-free", "Gluten-free"],
-        index=1,
+    dietary_style = st.selectbox("Dietary style", DIETARY_STYLES, index=1)
+    variants = st.multiselect(
+        "Also plan these styles", [s for s in DIETARY_STYLES if s != dietary_style],
+        help="Each extra style is generated alongside, for every week.",
     )
     exclusions = st.text_input("Exclusions / allergies (comma-separated)", "")
     time_budget = st.selectbox("Time budget", ["Quick (≤20 min)", "Normal (20–40 min)", "Batch-cook friendly"], index=1)
     budget_level = st.selectbox("Budget level", ["Low", "Medium", "Flexible"], index=1)
     extra_notes = st.text_area("Extra notes", "Prefer simple ingredients and repeat some lunches as leftovers.")
+    n_weeks = st.number_input("Weeks to plan", min_value=1, max_value=8, value=1)
     model = st.selectbox("Model", ["gpt-4.1-mini", "gpt-4.1"], index=0)
 
-st.info(f"Generating a plan for week starting **{week_start_str}** (Monday).")
-
-generate = st.button("Generate weekly meal plan", type="primary")
-
-if generate:
-    prompt = build_prompt(
-        family_size=family_size,
-        dietary_style=dietary_style,
-        exclusions=exclusions,
-        time_budget=time_budget,
-        budget_level=budget_level,
-        extra_notes=extra_notes,
-        week_start=week_start_str,
-    )
-
-    # with st.spinner("Creating your weekly plan..."):
-    #     try:
-    #         plan = generate_weekly_plan(prompt, model=model)
-    #     except json.JSONDecodeError:
-    #         st.error("The model response wasn't valid JSON. Try again (or lower temperature).")
-    #         st.stop()
-    #     except Exception as e:
-    #         st.error(f"Error generating plan: {e}")
-    #         st.stop()
-
-    with st.spinner("Creating your weekly plan..."):
-        try:
-            plan = generate_weekly_plan(prompt, model=model)
-        except Exception as e:
-            st.error(f"Error generating plan: {e}")
-            st.stop()
-
-
-    ok, msg = validate_plan(plan)
-    if not ok:
-        st.error(f"Plan failed validation: {msg}")
-        st.json(plan)
+weeks = week_starts(today, int(n_weeks))
+styles = [dietary_style, *variants]
+if len(weeks) == 1:
+    st.info(f"Generating a plan for week starting **{week_start_str}** (Monday).")
+else:
+    st.info(f"Generating plans for {len(weeks)} weeks starting **{week_start_str}** (Mondays) to **{weeks[-1]}**.")
+
+by_key = plan_requests(
+    dict(
+        family_size=family_size, exclusions=exclusions, time_budget=time_budget,
+        budget_level=budget_level, extra_notes=extra_notes,
+    ),
+    weeks,
+    styles,
+)
+requests = list(by_key.values())
+batch_key = (model, tuple(r.prompt for r in requests))
+
+label = "Generate weekly meal plan" if len(requests) == 1 else f"Generate {len(requests)} meal plans"
+if st.button(label, type="primary"):
+    # Requests run concurrently and stream (finance.meals): days are validated as they arrive and
+    # only rejected days are asked for again; the bar moves as each plan comes back complete
+    progress = st.progress(0.0, text=f"Creating {len(requests)} plan(s)...")
+    finished = []
+
+    def on_result(result: PlanResult):
+        finished.append(result)
+        progress.progress(len(finished) / len(requests), text=f"{result.label}: {result.message}")
+
+    calls = []
+    try:
+        results = generate_plans_sync(
+            requests, model, api_key=st.secrets["OPENAI_API_KEY"], on_result=on_result, calls=calls,
+        )
+    except Exception as e:
+        st.error(f"Error generating plans: {e}")
         st.stop()
-
-    st.success("Meal plan ready!")
-
-    # Display
-    st.markdown("## Week overview")
-    if "overall_tips" in plan:
-        for tip in plan["overall_tips"]:
-            st.write(f"- {tip}")
-
-    st.markdown("---")
-
-    for d in plan["days"]:
-        render_day(d)
-        st.markdown("---")
-
-    # Download JSON
-    st.download_button(
-        "Download plan as JSON",
-        data=json.dumps(plan, indent=2),
-        file_name=f"meal_plan_{week_start_str}.json",
-        mime="application/json",
+    finally:
+        db.record_llm_calls(calls)
+    progress.empty()
+    # Valid plans are kept (and indexed by ingredient) for the shopping list and search below
+    for (week, style), result in zip(by_key, results):
+        if result.ok:
+            db.save_meal_plan(week, style, result.plan)
+    st.session_state["meal_plans"] = (batch_key, results)
+
+stored = st.session_state.get("meal_plans")
+if stored is not None and stored[0] == batch_key:
+    results = stored[1]
+    n_ok = sum(r.ok for r in results)
+    if n_ok == len(results):
+        st.success("Meal plan ready!" if n_ok == 1 else f"{n_ok} meal plans ready!")
+    else:
+        st.warning(f"{n_ok} of {len(results)} plans ready.")
+
+    def show(saved: tuple[str, str], result: PlanResult):
+        if result.redone:
+            st.caption(f"Re-requested on their own: {', '.join(result.redone)}")
+        if result.ok:
+            render_plan(result.label, result.plan, saved)
+        else:
+            st.error(f"Plan failed: {result.message}")
+            if result.plan is not None:
+                st.json(result.plan)
+
+    if len(results) == 1:
+        show(next(iter(by_key)), results[0])
+    else:
+        tabs = st.tabs([("✅ " if r.ok else "⚠️ ") + r.label for r in results])
+        for tab, saved, result in zip(tabs, by_key, results):
+            with tab:
+                show(saved, result)
+
+# ---------------- Saved plans ----------------
+st.markdown("---")
+st.header("🗂️ Saved plans")
+saved_plans = views.saved_meal_plans()
+if saved_plans.empty:
+    st.caption("Generated plans are saved here, with a shopping list and an ingredient search.")
+else:
+    options = list(zip(saved_plans["week_start"], saved_plans["dietary_style"]))
+    chosen = st.multiselect(
+        "Plans", options, default=options[:1], format_func=lambda k: f"{k[0]} · {k[1]}",
+        help="The shopping list adds up the ingredients of every selected plan.",
     )
+    if chosen:
+        st.subheader("🛒 Shopping list")
+        render_shopping_list(tuple(chosen), key="saved_" + "_".join(f"{w}_{d}" for w, d in chosen))
+        if len(chosen) == 1:
+            with st.expander("Show plan"):
+                week, style = chosen[0]
+                render_plan(f"{week} · {style} (saved)", db.load_meal_plan(week, style))
+
+    st.subheader("🔎 Find meals by ingredient")
+    query = st.text_input("Ingredient", placeholder="e.g. chickpeas")
+    if query.strip():
+        hits = views.meal_search(query)
+        if hits.empty:
+            st.caption(f"No saved meal uses {query.strip()!r}.")
+        else:
+            st.caption(f"{len(hits)} meal(s) in {hits[['week_start', 'dietary_style']].drop_duplicates().shape[0]} plan(s).")
+            st.dataframe(
+                hits.drop(columns=["ingredient"]),
+                hide_index=True,
+                use_container_width=True,
+                column_config={
+                    "week_start": "Week", "dietary_style": "Style", "day": "Day", "meal": "Meal",
+                    "dish": "Dish", "as_written": "Ingredient",
+                },
+            )
+
+if get_context().is_admin(st.session_state.get("user_email")):
+    st.markdown("---")
+    render_llm_usage()
@@ -1,6 +1,6 @@
 import streamlit as st
-import pandas as pd
-from finance.db import init_db, load_weekly_plan, upsert_weekly_plan, clear_weekly_plan
+from finance import views
+from finance.db import init_db, upsert_weekly_plan, clear_weekly_plan
 from finance.auth import require_login
 st.set_page_config(page_title="Weekly Plan", layout="wide")
 st.title("Weekly Plan")
@@ -10,30 +10,31 @@ require_login()
 
 init_db()
 
-
-# Load once into session state
-if "weekly_plan_df" not in st.session_state:
-    st.session_state.weekly_plan_df = load_weekly_plan()
+# The plan frame is shared by all sessions (finance.views); the editor widget
+# only keeps this session's edits on top of it. Clearing starts a new editor.
+editor_key = f"weekly_plan_editor_{st.session_state.get('weekly_plan_cleared', 0)}"
 
 left, _ = st.columns([1, 4])
 with left:
     if st.button("Clear plans", type="secondary"):
         clear_weekly_plan()
-        st.session_state.weekly_plan_df = load_weekly_plan()
+        st.session_state.pop(editor_key, None)
+        st.session_state.weekly_plan_cleared = st.session_state.get("weekly_plan_cleared", 0) + 1
+        editor_key = f"weekly_plan_editor_{st.session_state.weekly_plan_cleared}"
         st.toast("Plans cleared ✅")
 
 st.caption("Fill in the boxes for Monday to Friday. Everything here is text.")
 
+plan = views.weekly_plan()
 edited = st.data_editor(
-    st.session_state.weekly_plan_df,
+    plan,
     use_container_width=True,
     hide_index=True,
     disabled=["Day"],
-    key="weekly_plan_editor",
+    key=editor_key,
 )
 
 # Only write to DB when something changed (prevents constant writes)
-if not edited.equals(st.session_state.weekly_plan_df):
-    st.session_state.weekly_plan_df = edited
+if edited.fillna("").to_dict("records") != plan.fillna("").to_dict("records"):
     upsert_weekly_plan(edited)
     st.toast("Saved ✅")